@@ -0,0 +1,139 @@
+# app/archives.py
+"""
+Leitura de arquivos de caixa postal (.mbox e .zip) mensagem a mensagem.
+
+Os geradores abrem o arquivo (bytes ou caminho em disco) e entregam um item
+por vez, então a memória é a de uma mensagem, qualquer que seja o tamanho do
+arquivo. Cada item é (nome, bytes); o nome (.eml/.pdf/.txt) decide o extrator.
+
+Limites por arquivo: ARCHIVE_MAX_MESSAGES itens e ARCHIVE_MAX_BYTES lidos
+(descompactados, no caso do zip, contando também os bytes de itens pulados);
+ao atingir, a leitura para com aviso. O mbox é lido em pedaços de no máximo
+_LINE_CHUNK bytes: uma "linha" gigante (sem \n) não vai inteira para a memória.
+"""
+from __future__ import annotations
+import io, os, zipfile
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+ARCHIVE_EXTS         = (".mbox", ".zip")
+ARCHIVE_MAX_MESSAGES = int(os.getenv("ARCHIVE_MAX_MESSAGES", "10000"))
+ARCHIVE_MAX_BYTES    = int(os.getenv("ARCHIVE_MAX_BYTES", str(512 * 1024 * 1024)))
+# por mensagem/membro; acima disso o item é pulado
+ARCHIVE_ITEM_MAX_BYTES = int(os.getenv("ARCHIVE_ITEM_MAX_BYTES", os.getenv("MAX_BYTES", str(10 * 1024 * 1024))))
+
+_MEMBER_EXTS = (".eml", ".pdf", ".txt")
+_LINE_CHUNK = 64 * 1024
+
+
+class ArchiveLimit(Exception):
+    pass
+
+
+class _Budget:
+    """Bytes lidos do arquivo inteiro (todos os membros, pulados ou não) contra ARCHIVE_MAX_BYTES."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    def take(self, data: bytes) -> bytes:
+        self.used += len(data)
+        if self.used > self.limit:
+            raise ArchiveLimit(f"mais de {self.limit} bytes lidos")
+        return data
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTS)
+
+
+def _open(source: Union[bytes, str]) -> BinaryIO:
+    return io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb")
+
+
+def iter_mbox(fh: BinaryIO, budget: Optional[_Budget] = None) -> Iterator[bytes]:
+    """
+    Separa as mensagens pelas linhas "From " do formato mbox. O texto antes da
+    primeira linha "From " (export sem separador inicial) vira uma mensagem.
+    Levanta ArchiveLimit quando o `budget` se esgota.
+    """
+    budget = budget or _Budget(ARCHIVE_MAX_BYTES)
+    buf: list = []
+    size = 0
+    skipping = False
+    line_start = True       # o pedaço anterior terminou em \n
+    in_separator = False    # resto de uma linha "From " maior que _LINE_CHUNK
+    while True:
+        line = budget.take(fh.readline(_LINE_CHUNK))
+        if not line:
+            break
+        at_start, line_start = line_start, line.endswith(b"\n")
+        if in_separator:
+            in_separator = not line_start
+            continue
+        if at_start and line.startswith(b"From "):
+            if buf and not skipping:
+                yield b"".join(buf)
+            buf, size, skipping = [], 0, False
+            in_separator = not line_start
+            continue
+        if skipping:
+            continue
+        size += len(line)
+        if size > ARCHIVE_ITEM_MAX_BYTES:
+            print(f"[archive] mensagem acima de {ARCHIVE_ITEM_MAX_BYTES} bytes, pulada")
+            buf, skipping = [], True
+            continue
+        buf.append(line)
+    if buf and not skipping and any(l.strip() for l in buf):
+        yield b"".join(buf)
+
+
+def iter_zip(fh: BinaryIO, budget: Optional[_Budget] = None) -> Iterator[Tuple[str, bytes]]:
+    """Membros .eml/.pdf/.txt do zip (em qualquer pasta) e mensagens de .mbox internos."""
+    budget = budget or _Budget(ARCHIVE_MAX_BYTES)
+    with zipfile.ZipFile(fh) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename
+            low = name.lower()
+            if low.endswith(".mbox"):
+                with zf.open(info) as member:
+                    for i, raw in enumerate(iter_mbox(member, budget)):
+                        yield f"{name}#{i}.eml", raw
+            elif low.endswith(_MEMBER_EXTS):
+                # file_size vem do cabeçalho (pode mentir): lê no máximo o limite + 1
+                if info.file_size > ARCHIVE_ITEM_MAX_BYTES:
+                    print(f"[archive] {name} acima de {ARCHIVE_ITEM_MAX_BYTES} bytes, pulado")
+                    continue
+                with zf.open(info) as member:
+                    data = budget.take(member.read(ARCHIVE_ITEM_MAX_BYTES + 1))
+                if len(data) > ARCHIVE_ITEM_MAX_BYTES:
+                    print(f"[archive] {name} acima de {ARCHIVE_ITEM_MAX_BYTES} bytes, pulado")
+                    continue
+                yield name, data
+
+
+def iter_archive(filename: str, source: Union[bytes, str]) -> Iterator[Tuple[str, bytes]]:
+    """Itens de um .mbox ou .zip, respeitando os limites por arquivo."""
+    count = 0
+    budget = _Budget(ARCHIVE_MAX_BYTES)
+    with _open(source) as fh:
+        if filename.lower().endswith(".zip"):
+            items = iter_zip(fh, budget)
+        else:
+            items = ((f"{filename}#{i}.eml", raw) for i, raw in enumerate(iter_mbox(fh, budget)))
+        try:
+            for name, data in items:
+                count += 1
+                if count > ARCHIVE_MAX_MESSAGES:
+                    print(f"[archive] {filename}: limite de {ARCHIVE_MAX_MESSAGES} itens atingido, restante ignorado")
+                    break
+                yield name, data
+        except ArchiveLimit as e:
+            print(f"[archive] {filename}: {e} (ARCHIVE_MAX_BYTES), restante ignorado")
+        except zipfile.BadZipFile as e:
+            print(f"[archive] {filename} inválido:", repr(e))
+        finally:
+            items.close()
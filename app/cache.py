@@ -0,0 +1,140 @@
+# app/cache.py
+"""
+Cache de resultados (ProcessOut inteiro) endereçado por conteúdo.
+
+- chave: sha256 do texto normalizado + observações + modelos/config que
+  determinam a categoria e a resposta
+- 1º nível: LRU em memória com TTL e limite de entradas/bytes
+- 2º nível (opcional, CACHE_SQLITE_PATH): SQLite em modo WAL, sobrevive a
+  restarts e é compartilhado pelos workers do uvicorn no mesmo host
+"""
+from __future__ import annotations
+import asyncio, hashlib, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .schemas import ProcessOut
+
+CACHE_ENABLED        = os.getenv("CACHE_ENABLED", "1") in {"1", "true", "True"}
+CACHE_TTL            = float(os.getenv("CACHE_TTL", str(24 * 3600)))   # segundos
+CACHE_MAX_ENTRIES    = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES      = int(os.getenv("CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_SQLITE_PATH    = os.getenv("CACHE_SQLITE_PATH")                  # vazio = só memória
+CACHE_SQLITE_MAX_ENTRIES = int(os.getenv("CACHE_SQLITE_MAX_ENTRIES", "100000"))
+
+
+def make_key(text: str, observacoes: Optional[str], *config: str) -> str:
+    norm = " ".join((text or "").lower().split())
+    obs = " ".join((observacoes or "").split())
+    h = hashlib.sha256()
+    for piece in (norm, obs, *config):
+        h.update(piece.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class _SqliteTier:
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._conn.commit()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, expires: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)", (key, value, expires)
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                # limpeza periódica: expirados e excesso (os que vencem primeiro saem)
+                self._conn.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl: float = CACHE_TTL,
+        sqlite_path: Optional[str] = CACHE_SQLITE_PATH,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (json, expira_em)
+        self._bytes = 0
+        self._sqlite = _SqliteTier(sqlite_path, CACHE_SQLITE_MAX_ENTRIES) if sqlite_path else None
+        self.hits = 0
+        self.misses = 0
+        self.sqlite_hits = 0
+
+    def _mem_put(self, key: str, value: str, expires: float) -> None:
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[0])
+        self._mem[key] = (value, expires)
+        self._bytes += len(value)
+        while self._mem and (len(self._mem) > self.max_entries or self._bytes > self.max_bytes):
+            _, (v, _) = self._mem.popitem(last=False)
+            self._bytes -= len(v)
+
+    async def get(self, key: str) -> Optional[ProcessOut]:
+        entry = self._mem.get(key)
+        if entry is not None:
+            if entry[1] >= time.time():
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return ProcessOut.model_validate_json(entry[0])
+            self._bytes -= len(self._mem.pop(key)[0])
+        if self._sqlite is not None:
+            row = await asyncio.to_thread(self._sqlite.get, key)
+            if row is not None:
+                self._mem_put(key, row[0], row[1])
+                self.hits += 1
+                self.sqlite_hits += 1
+                return ProcessOut.model_validate_json(row[0])
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: ProcessOut) -> None:
+        data = value.model_dump_json()
+        expires = time.time() + self.ttl
+        self._mem_put(key, data, expires)
+        if self._sqlite is not None:
+            await asyncio.to_thread(self._sqlite.set, key, data, expires)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": CACHE_ENABLED,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sqlite_hits": self.sqlite_hits,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._mem),
+            "bytes": self._bytes,
+            "sqlite": bool(self._sqlite),
+        }
+
+
+result_cache = ResultCache()
@@ -1,9 +1,24 @@
 from __future__ import annotations
-import os, re
+import asyncio, os, re
 from dataclasses import dataclass
-from typing import Tuple, List, Optional
+from typing import Iterable, Tuple, List, Optional, Sequence
+
+from .llm import get_client
+from .matcher import KeywordMatcher
+from .metrics import CLASSIFIER_TIEBREAKS, observe_usage
+from .model import LABELS, LOCAL_MODEL_BLEND, LOCAL_MODEL_MODE, get_model
+from .ratelimit import estimate_tokens, openai_gate
+from .tracing import span
 
 USE_OPENAI_CLASSIFIER = os.getenv("USE_OPENAI_CLASSIFIER", "0") in {"1", "true", "True"}
+OPENAI_CLASSIFIER_MODEL = os.getenv("OPENAI_CLASSIFIER_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+# micro-lote da zona morta: dispara com N itens ou após X ms do primeiro
+CLASSIFIER_BATCH_SIZE    = int(os.getenv("CLASSIFIER_BATCH_SIZE", "16"))
+CLASSIFIER_BATCH_WAIT_MS = float(os.getenv("CLASSIFIER_BATCH_WAIT_MS", "25"))
+CLASSIFIER_ITEM_CHARS    = int(os.getenv("CLASSIFIER_ITEM_CHARS", "2000"))  # corpo enviado por item
+
+_TIEBREAK_LOCAL = CLASSIFIER_TIEBREAKS.labels("modelo_local")
+_TIEBREAK_LLM = CLASSIFIER_TIEBREAKS.labels("llm")
 
 # ——— Palavras-chave (pt-br) ———
 ASK_TOKENS = [
@@ -40,6 +55,22 @@ SMALL_TALK_TOKENS = [
 
 RE_QUESTION = re.compile(r"[?]+")
 RE_NUMBER   = re.compile(r"\b\d{3,}\b")  # protocolos/ids simples
+RE_SUBJECT  = re.compile(r"^subject:\s*(.+)$", re.I | re.M)
+
+# pesos por grupo (a ordem define a ordem dos termos exibidos)
+POS_WEIGHTS = {"ask": 1.2, "action": 1.2, "status": 1.0, "attach": 1.0, "date": 0.6}
+NEG_WEIGHTS = {"greet": 1.0, "small_talk": 1.0}
+
+# todos os léxicos compilados uma vez, numa varredura só
+_MATCHER = KeywordMatcher({
+    "ask": ASK_TOKENS,
+    "action": ACTION_TOKENS,
+    "status": STATUS_TOKENS,
+    "attach": ATTACH_TOKENS,
+    "date": DATE_TOKENS,
+    "greet": GREET_TOKENS,
+    "small_talk": SMALL_TALK_TOKENS,
+})
 
 @dataclass
 class RuleResult:
@@ -56,37 +87,24 @@ def _heuristic_score(subject: str, body: str) -> RuleResult:
     subj = _normalize(subject or "")
     text = _normalize(body or "")
 
-    # ——— contagem de sinais ———
-    pos_terms: List[str] = []
-    neg_terms: List[str] = []
-
-    def count_tokens(tokens: List[str], where: str, bucket: List[str]) -> int:
-        c = 0
-        for t in tokens:
-            if t in where:
-                c += 1; bucket.append(t)
-        return c
+    # ——— contagem de sinais (uma varredura para todos os léxicos) ———
+    hits = _MATCHER.scan(text, subj)
+    pos_terms: List[str] = [t for g in POS_WEIGHTS for t in hits[g]]
+    neg_terms: List[str] = [t for g in NEG_WEIGHTS for t in hits[g]]
 
     q_marks = 1 if RE_QUESTION.search(subject or "") or RE_QUESTION.search(body or "") else 0
     has_number = 1 if RE_NUMBER.search(body or "") or RE_NUMBER.search(subject or "") else 0
 
     # sinais “produtivos”
-    pos = 0
-    pos += count_tokens(ASK_TOKENS, text + " " + subj, pos_terms) * 1.2
-    pos += count_tokens(ACTION_TOKENS, text + " " + subj, pos_terms) * 1.2
-    pos += count_tokens(STATUS_TOKENS, text + " " + subj, pos_terms) * 1.0
-    pos += count_tokens(ATTACH_TOKENS, text + " " + subj, pos_terms) * 1.0
-    pos += count_tokens(DATE_TOKENS,  text + " " + subj, pos_terms) * 0.6
+    pos = sum(len(hits[g]) * w for g, w in POS_WEIGHTS.items())
     pos += q_marks * 1.0
     pos += has_number * 0.5
 
     # sinais “improdutivos”
-    neg = 0
-    neg += count_tokens(GREET_TOKENS, text + " " + subj, neg_terms) * 1.0
-    neg += count_tokens(SMALL_TALK_TOKENS, text + " " + subj, neg_terms) * 1.0
+    neg = sum(len(hits[g]) * w for g, w in NEG_WEIGHTS.items())
 
     # bônus/penalidade por densidade de texto
-    length = max(1, len(text.split()))
+    length = text.count(" ") + 1 if text else 1   # texto já normalizado: espaços simples
     if length > 8 and (q_marks or pos > 0):   # emails minimamente descritivos + pergunta/ação
         pos += 0.4
     if length < 5 and neg > 0 and pos == 0:   # curtíssimo e só cumprimento
@@ -103,6 +121,156 @@ def _heuristic_score(subject: str, body: str) -> RuleResult:
     return RuleResult(categoria=categoria, score=score, termos=termos)
 
 
+def score_many(items: Iterable[Tuple[str, str]]) -> List[RuleResult]:
+    """Heurística em lote: recebe [(assunto, corpo)] e devolve um RuleResult por item."""
+    return [_heuristic_score(subject, body) for subject, body in items]
+
+
+def _subject_of(subject: Optional[str], raw_text: str) -> str:
+    # se o raw_text contém um header “Subject:” (de .eml) usa ele
+    if subject:
+        return subject
+    m = RE_SUBJECT.search(raw_text)
+    return m.group(1).strip() if m else ""
+
+
+def classify_many(items: Sequence[Tuple[str, str]], clean_texts: Sequence[str]) -> List[RuleResult]:
+    """
+    classify_email em lote e sem LLM (POST /classify): heurística por item e o
+    modelo local numa multiplicação só, para os itens que precisam dele.
+    """
+    results = score_many((_subject_of(subj, body), body) for subj, body in items)
+    model = get_model()
+    if model is None:
+        return results
+    if LOCAL_MODEL_MODE == "blend":
+        for rr, p in zip(results, model.score_many(clean_texts)):
+            _blend(rr, p)
+    elif LOCAL_MODEL_MODE == "tiebreak":
+        dead = [i for i, rr in enumerate(results) if 0.45 <= rr.score <= 0.55]
+        if dead:
+            _TIEBREAK_LOCAL.inc(len(dead))
+            for i, p in zip(dead, model.score_many([clean_texts[i] for i in dead])):
+                _pull(results[i], LABELS[p >= 0.5])
+    return results
+
+
+# ——— Zona morta: classificação em micro-lote pelo GPT ———
+_BATCH_SYSTEM = (
+    "Você é um classificador de e-mails. Para cada e-mail numerado, responda uma linha "
+    "no formato '<número>: Produtivo' ou '<número>: Improdutivo', sem mais nada. "
+    "Produtivo = requer ação, informação específica, acompanhamento, status, envio de documentos. "
+    "Improdutivo = felicitações, agradecimentos, mensagens sociais sem ação."
+)
+_RE_BATCH_LINE = re.compile(r"^\W*(\d+)\W+(improdutivo|produtivo)", re.I | re.M)
+
+
+def _parse_batch_labels(content: str, n: int) -> dict:
+    labels = {}
+    for m in _RE_BATCH_LINE.finditer(content or ""):
+        i = int(m.group(1)) - 1
+        if 0 <= i < n and i not in labels:
+            labels[i] = "Improdutivo" if m.group(2).lower().startswith("improd") else "Produtivo"
+    if n == 1 and not labels:
+        # lote de um item: o modelo às vezes responde só a palavra
+        low = (content or "").strip().lower()
+        if "improdut" in low:
+            labels[0] = "Improdutivo"
+        elif "produt" in low:
+            labels[0] = "Produtivo"
+    return labels
+
+
+async def _classify_batch_llm(items: List[Tuple[str, str]]) -> dict:
+    """Um único chat completion para o lote; devolve {índice: rótulo} (pode faltar item)."""
+    client = get_client()
+    if client is None:
+        return {}
+    blocks = [
+        f"### E-mail {i}\nAssunto: {subj}\nCorpo:\n{body[:CLASSIFIER_ITEM_CHARS]}"
+        for i, (subj, body) in enumerate(items, 1)
+    ]
+    messages = [
+        {"role": "system", "content": _BATCH_SYSTEM},
+        {"role": "user", "content": "\n\n".join(blocks) + "\n\nResponda:"},
+    ]
+    max_tokens = 8 * len(items) + 8
+    res = await openai_gate.call(
+        "classify",
+        lambda: client.chat.completions.create(
+            model=OPENAI_CLASSIFIER_MODEL,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=0.0,
+        ),
+        estimate_tokens(messages, max_tokens),
+    )
+    observe_usage("classify", res.usage)
+    return _parse_batch_labels(res.choices[0].message.content or "", len(items))
+
+
+class _DeadZoneBatcher:
+    """
+    Junta as classificações de zona morta de todos os requests em andamento e
+    dispara um único prompt quando o lote enche (CLASSIFIER_BATCH_SIZE) ou o
+    primeiro item espera CLASSIFIER_BATCH_WAIT_MS. Cada chamador recebe o seu
+    rótulo, ou None se o lote falhar ou a resposta não trouxer o item.
+    """
+
+    def __init__(self, max_size: int, max_wait: float):
+        self.max_size = max(1, max_size)
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set = set()
+
+    async def classify(self, subject: str, body: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((subject, body, fut))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            labels = await _classify_batch_llm([(s, b) for s, b, _ in batch])
+        except Exception as e:
+            # se falhar, todos ficam com a heurística
+            # (tentativas, falhas e rejeições já contadas no gate)
+            print(f"[classify] fallback heurístico para lote de {len(batch)} (GPT indisponível):", repr(e))
+            labels = {}
+        for i, (_, _, fut) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(labels.get(i))
+
+
+_batcher: Optional[_DeadZoneBatcher] = None
+_batcher_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_batcher() -> _DeadZoneBatcher:
+    # um batcher por event loop (futures não atravessam loops)
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher_loop is not loop:
+        _batcher = _DeadZoneBatcher(CLASSIFIER_BATCH_SIZE, CLASSIFIER_BATCH_WAIT_MS / 1000)
+        _batcher_loop = loop
+    return _batcher
+
+
 # ——— Classificador público ———
 async def classify_email(raw_text: str, clean_text: str, subject: Optional[str] = None) -> Tuple[str, float, List[str]]:
     """
@@ -110,43 +278,47 @@ async def classify_email(raw_text: str, clean_text: str, subject: Optional[str]
     score é confiança de PRODUTIVO em 0..1
     """
     # tenta detectar um assunto simples (quando vier texto “chato”)
-    subj = subject or ""
-    # se o raw_text contém um header “Subject:” (de .eml) tente extrair
-    m = re.search(r"^subject:\s*(.+)$", raw_text, flags=re.I | re.M)
-    if m and not subj:
-        subj = m.group(1).strip()
+    subj = _subject_of(subject, raw_text)
 
     # heurística local
-    rr = _heuristic_score(subj, raw_text)
+    with span("heuristic_score"):
+        rr = _heuristic_score(subj, raw_text)
 
-    # zona morta → opcionalmente pergunta pro GPT (se habilitado)
-    if 0.45 <= rr.score <= 0.55 and USE_OPENAI_CLASSIFIER:
-        try:
-            from openai import OpenAI
-            client = OpenAI()
-
-            sys = (
-                "Você é um classificador. Responda apenas uma palavra: 'Produtivo' ou 'Improdutivo'. "
-                "Produtivo = requer ação, informação específica, acompanhamento, status, envio de documentos. "
-                "Improdutivo = felicitações, agradecimentos, mensagens sociais sem ação."
-            )
-            user = f"Assunto: {subj}\n\nCorpo:\n{raw_text}\n\nResponda:"
-
-            res = client.chat.completions.create(
-                model=os.getenv("OPENAI_CLASSIFIER_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini")),
-                messages=[{"role":"system","content":sys},{"role":"user","content":user}],
-                max_tokens=3,
-                temperature=0.0,
-            )
-            label = (res.choices[0].message.content or "").strip().lower()
-            if "produt" in label:
-                rr.categoria = "Produtivo"
-                rr.score = max(rr.score, 0.62)  # puxa para cima
-            elif "improdut" in label:
-                rr.categoria = "Improdutivo"
-                rr.score = min(rr.score, 0.38)  # puxa para baixo
-        except Exception as e:
-            # se falhar, fica com a heurística
-            print("[classify] fallback heurístico (GPT indisponível):", repr(e))
+    # modelo local (app/model.py): mistura com a heurística ou só desempata
+    model = get_model()
+    if model is not None and LOCAL_MODEL_MODE == "blend":
+        with span("local_model"):
+            p = model.score(clean_text)
+        _blend(rr, p)
+
+    # zona morta → modelo local; sem ele, opcionalmente o GPT (se habilitado), em micro-lote
+    if 0.45 <= rr.score <= 0.55:
+        if model is not None and LOCAL_MODEL_MODE == "tiebreak":
+            with span("local_model"):
+                p = model.score(clean_text)
+            _TIEBREAK_LOCAL.inc()
+            _pull(rr, LABELS[p >= 0.5])
+        elif USE_OPENAI_CLASSIFIER and get_client() is not None:
+            _TIEBREAK_LLM.inc()
+            # None → item ausente/falha no lote: fica com a heurística
+            _pull(rr, await _get_batcher().classify(subj, raw_text))
 
     return rr.categoria, float(round(rr.score, 4)), rr.termos
+
+
+def _pull(rr: RuleResult, label: Optional[str]) -> None:
+    """Aplica o rótulo do desempate puxando o score para fora da zona morta."""
+    if label == "Produtivo":
+        rr.categoria = "Produtivo"
+        rr.score = max(rr.score, 0.62)  # puxa para cima
+    elif label == "Improdutivo":
+        rr.categoria = "Improdutivo"
+        rr.score = min(rr.score, 0.38)  # puxa para baixo
+
+
+def _blend(rr: RuleResult, p: float) -> None:
+    """Média ponderada heurística × modelo; se a categoria vira, os termos da heurística não valem mais."""
+    rr.score = (1 - LOCAL_MODEL_BLEND) * rr.score + LOCAL_MODEL_BLEND * p
+    categoria = "Produtivo" if rr.score >= 0.5 else "Improdutivo"
+    if categoria != rr.categoria:
+        rr.categoria, rr.termos = categoria, []
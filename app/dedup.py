@@ -0,0 +1,168 @@
+# app/dedup.py
+"""
+Detecção de quase-duplicatas (reclamações em massa, encaminhamentos copiados).
+
+- impressão digital: SimHash de 64 bits sobre os bigramas do texto já
+  preprocessado (sem stopwords, sem acento)
+- duas partes são "iguais" se a distância de Hamming ≤ DEDUP_MAX_DISTANCE,
+  derivada de DEDUP_SIMILARITY (0.95 → até 3 bits diferentes)
+- índice em memória, limitado (DEDUP_MAX_ENTRIES, DEDUP_TTL), com busca por
+  bandas: com k bits de tolerância, k+1 bandas garantem que duplicatas
+  dividem ao menos uma banda idêntica (pigeonhole)
+- partes em processamento também ficam no índice (como futures): quase-
+  duplicatas que chegam em paralelo esperam o resultado da primeira
+- `duplicado_de` é o índice da parte de origem no mesmo envio (Batch);
+  reaproveitado de um envio anterior, fica vazio, como um hit de cache
+"""
+from __future__ import annotations
+import asyncio, hashlib, os, time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from .schemas import ProcessOut
+
+DEDUP_ENABLED     = os.getenv("DEDUP_ENABLED", "1") in {"1", "true", "True"}
+DEDUP_SIMILARITY  = float(os.getenv("DEDUP_SIMILARITY", "0.95"))       # 0..1 (fração de bits iguais)
+DEDUP_MIN_TOKENS  = int(os.getenv("DEDUP_MIN_TOKENS", "8"))            # textos curtos demais não entram
+DEDUP_MAX_ENTRIES = int(os.getenv("DEDUP_MAX_ENTRIES", "20000"))
+DEDUP_TTL         = float(os.getenv("DEDUP_TTL", str(3600)))           # segundos
+
+BITS = 64
+DEDUP_MAX_DISTANCE = max(0, min(BITS // 2, int(round((1 - DEDUP_SIMILARITY) * BITS))))
+
+Entry = Union[ProcessOut, "asyncio.Future[Optional[ProcessOut]]"]
+# por envio: fingerprint → índice da parte que deu origem ao resultado
+# (é o que sai em `duplicado_de`; o fingerprint não sai da API)
+Batch = Dict[int, int]
+
+
+# bits ligados de cada valor de byte
+_BYTE_BITS = [tuple(b for b in range(8) if v >> b & 1) for v in range(256)]
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> bytes:
+    return hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+
+
+def simhash(tokens: Sequence[str]) -> int:
+    """
+    SimHash ponderado pela frequência dos bigramas (unigramas se houver 1 token).
+    Acumula por byte do hash (8 somas por feature em vez de 64) e resolve os
+    bits no fim, numa tabela de 8 × 256.
+    """
+    feats = Counter(zip(tokens, tokens[1:])) if len(tokens) > 1 else Counter((t,) for t in tokens)
+    tables = [[0] * 256 for _ in range(8)]
+    total = 0
+    for feat, weight in feats.items():
+        digest = _feature_hash(" ".join(feat))
+        for pos in range(8):
+            tables[pos][digest[pos]] += weight
+        total += weight
+    fp = 0
+    for pos, table in enumerate(tables):
+        acc = [0] * 8
+        for v, w in enumerate(table):
+            if w:
+                for bit in _BYTE_BITS[v]:
+                    acc[bit] += w
+        for bit, on in enumerate(acc):
+            if 2 * on > total:
+                fp |= 1 << (pos * 8 + bit)
+    return fp
+
+
+def _bands(max_distance: int) -> List[Tuple[int, int]]:
+    """(deslocamento, máscara) de k+1 bandas cobrindo os 64 bits."""
+    n = max_distance + 1
+    width, extra = divmod(BITS, n)
+    out, shift = [], 0
+    for i in range(n):
+        w = width + (1 if i < extra else 0)
+        out.append((shift, (1 << w) - 1))
+        shift += w
+    return out
+
+
+class NearDupIndex:
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE, max_entries: int = DEDUP_MAX_ENTRIES,
+                 ttl: float = DEDUP_TTL):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._bands = _bands(max_distance)
+        # (ctx, fp) → (resultado ou future, expira_em); ordem = inserção (LRU simples)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[Entry, float]]" = OrderedDict()
+        self._index: Dict[Tuple[str, int, int], Set[int]] = {}
+
+    def _band_keys(self, ctx: str, fp: int):
+        return [(ctx, i, (fp >> shift) & mask) for i, (shift, mask) in enumerate(self._bands)]
+
+    def _drop(self, key: Tuple[str, int]) -> None:
+        self._entries.pop(key, None)
+        ctx, fp = key
+        for bk in self._band_keys(ctx, fp):
+            fps = self._index.get(bk)
+            if fps is not None:
+                fps.discard(fp)
+                if not fps:
+                    del self._index[bk]
+
+    def find(self, fp: int, ctx: str) -> Optional[Tuple[int, Entry]]:
+        """Entrada mais próxima dentro da distância (resultado pronto ou em processamento)."""
+        now = time.time()
+        best: Optional[Tuple[int, int]] = None
+        for bk in self._band_keys(ctx, fp):
+            for cand in self._index.get(bk, ()):
+                dist = (cand ^ fp).bit_count()
+                if dist <= self.max_distance and (best is None or dist < best[0]):
+                    best = (dist, cand)
+        if best is None:
+            return None
+        key = (ctx, best[1])
+        value, expires = self._entries[key]
+        if isinstance(value, asyncio.Future):
+            if value.get_loop() is not asyncio.get_running_loop():
+                self._drop(key)     # sobra de outro event loop (testes/reload)
+                return None
+        elif expires < now:
+            self._drop(key)
+            return None
+        return best[1], value
+
+    def _put(self, fp: int, ctx: str, value: Entry) -> None:
+        key = (ctx, fp)
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, time.time() + self.ttl)
+        for bk in self._band_keys(ctx, fp):
+            self._index.setdefault(bk, set()).add(fp)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def reserve(self, fp: int, ctx: str) -> "asyncio.Future[Optional[ProcessOut]]":
+        fut = asyncio.get_running_loop().create_future()
+        self._put(fp, ctx, fut)
+        return fut
+
+    def publish(self, fp: int, ctx: str, fut: "asyncio.Future[Optional[ProcessOut]]",
+                out: Optional[ProcessOut], keep: bool) -> None:
+        """
+        Entrega o resultado a quem esperava. `keep=False` (falha, template de
+        fallback) libera as esperas mas não deixa o resultado no índice.
+        """
+        if not fut.done():
+            fut.set_result(out)
+        entry = self._entries.get((ctx, fp))
+        if entry is not None and entry[0] is fut:
+            if keep and out is not None:
+                self._put(fp, ctx, out)
+            else:
+                self._drop((ctx, fp))
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "max_distance": self.max_distance}
+
+
+dedup_index = NearDupIndex()
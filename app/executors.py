@@ -0,0 +1,222 @@
+# app/executors.py
+"""
+Camada de execução da extração (PDF, EML, HTML) fora do event loop.
+
+- entradas grandes (>= EXTRACT_PROCESS_MIN_BYTES) vão para um pool de processos
+- entradas pequenas vão para um pool de threads (sem custo de pickle/IPC)
+- cada tarefa tem timeout e orçamento de páginas/caracteres; o PDF para de
+  ler páginas ao fim de EXTRACT_TIMEOUT e devolve o texto parcial. Se a tarefa
+  não voltar nem após EXTRACT_TIMEOUT_GRACE, é abandonada com resultado vazio.
+  O .eml faz o mesmo (texto lido até o prazo)
+- worker que morre (segfault, OOM) perde só aquela entrada (resultado vazio)
+  e o pool é refeito; a entrada não é repetida no processo do servidor
+- PDF tem orçamento próprio (PDF_MAX_CHARS): a resposta só vê ~3.500
+  caracteres, então um contrato de 300 páginas para nas primeiras páginas
+- texto de PDF fica num LRU pelo sha256 dos bytes: o mesmo anexo repetido em
+  várias threads (ou em paralelo no mesmo lote) é lido uma vez só
+"""
+from __future__ import annotations
+import asyncio, contextvars, hashlib, os
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple, TypeVar, Union
+
+from . import nlp
+from .metrics import PDF_CACHE
+from .tracing import span
+
+T = TypeVar("T")
+
+EXTRACT_PROCESS_WORKERS   = int(os.getenv("EXTRACT_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = só threads
+EXTRACT_THREAD_WORKERS    = int(os.getenv("EXTRACT_THREAD_WORKERS", "4"))
+EXTRACT_PROCESS_MIN_BYTES = int(os.getenv("EXTRACT_PROCESS_MIN_BYTES", str(256 * 1024)))
+EXTRACT_TIMEOUT           = float(os.getenv("EXTRACT_TIMEOUT", "20"))      # segundos por tarefa
+EXTRACT_TIMEOUT_GRACE     = float(os.getenv("EXTRACT_TIMEOUT_GRACE", "2"))  # folga antes de abandonar a tarefa
+EXTRACT_MAX_PAGES         = int(os.getenv("EXTRACT_MAX_PAGES", "50"))      # páginas por PDF
+EXTRACT_MAX_CHARS         = int(os.getenv("EXTRACT_MAX_CHARS", "200000"))  # texto por tarefa
+PDF_MAX_CHARS             = int(os.getenv("PDF_MAX_CHARS", "20000"))       # texto por PDF (para de ler páginas)
+PDF_CACHE_MAX_ENTRIES     = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "512"))  # 0 = sem cache
+PDF_CACHE_MAX_BYTES       = int(os.getenv("PDF_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))  # texto em cache
+
+_PDF_CACHE_HITS = PDF_CACHE.labels("hit")
+_PDF_CACHE_MISSES = PDF_CACHE.labels("miss")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_thread_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if EXTRACT_PROCESS_WORKERS <= 0:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_PROCESS_WORKERS,
+            mp_context=mp.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=EXTRACT_THREAD_WORKERS, thread_name_prefix="extract")
+    return _thread_pool
+
+
+def _pick_executor(size: int) -> Executor:
+    if size >= EXTRACT_PROCESS_MIN_BYTES:
+        pool = _get_process_pool()
+        if pool is not None:
+            return pool
+    return _get_thread_pool()
+
+
+async def _run(fn: Callable[[], T], size: int, on_timeout: T) -> T:
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    executor = _pick_executor(size)
+    try:
+        if isinstance(executor, ThreadPoolExecutor):
+            # leva o trace da request para os spans do nlp (pdfplumber, bs4) na thread
+            fn = partial(contextvars.copy_context().run, fn)
+        return await asyncio.wait_for(loop.run_in_executor(executor, fn), EXTRACT_TIMEOUT + EXTRACT_TIMEOUT_GRACE)
+    except asyncio.TimeoutError:
+        print(f"[extract] tarefa excedeu {EXTRACT_TIMEOUT + EXTRACT_TIMEOUT_GRACE}s, abandonada")
+        return on_timeout
+    except BrokenProcessPool:
+        # worker morreu (OOM, segfault no parser): a entrada fica vazia e o pool é refeito
+        # na próxima tarefa. Nada de repetir em thread: derrubaria o servidor junto
+        print("[extract] pool de processos quebrado, entrada descartada")
+        if _process_pool is executor:
+            _process_pool = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        return on_timeout
+
+
+def _size(src: Union[bytes, str]) -> int:
+    return len(src) if isinstance(src, bytes) else os.path.getsize(src)
+
+
+def _sha256(src: Union[bytes, str]) -> str:
+    if isinstance(src, bytes):
+        return hashlib.sha256(src).hexdigest()
+    h = hashlib.sha256()
+    with open(src, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _TextCache:
+    """LRU de texto extraído (limite de entradas e de caracteres) + extrações em andamento."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self.pending: Dict[str, "asyncio.Future[str]"] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        text = self._items.get(key)
+        if text is not None:
+            self._items.move_to_end(key)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        if self.max_entries <= 0 or len(text) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._items[key] = text
+        self._bytes += len(text)
+        while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+            _, dropped = self._items.popitem(last=False)
+            self._bytes -= len(dropped)
+
+
+_pdf_cache = _TextCache(PDF_CACHE_MAX_ENTRIES, PDF_CACHE_MAX_BYTES)
+
+
+async def _extract_pdf_uncached(raw: Union[bytes, str], size: int) -> Optional[Tuple[str, bool]]:
+    fn = partial(
+        nlp.extract_text_from_pdf, raw,
+        max_pages=EXTRACT_MAX_PAGES,
+        max_chars=min(PDF_MAX_CHARS, EXTRACT_MAX_CHARS),
+        time_budget=EXTRACT_TIMEOUT,
+    )
+    with span("extract_text_from_pdf"):
+        return await _run(fn, size, None)
+
+
+async def extract_pdf(raw: Union[bytes, str]) -> str:
+    """`raw`: bytes ou caminho (upload em disco: o pool de processos recebe só o caminho)."""
+    size = _size(raw)
+    if PDF_CACHE_MAX_ENTRIES <= 0:
+        return (await _extract_pdf_uncached(raw, size) or ("", False))[0]
+    if size >= EXTRACT_PROCESS_MIN_BYTES:
+        digest = await asyncio.to_thread(_sha256, raw)
+    else:
+        digest = _sha256(raw)
+
+    while True:
+        text = _pdf_cache.get(digest)
+        if text is not None:
+            _PDF_CACHE_HITS.inc()
+            return text
+        pending = _pdf_cache.pending.get(digest)
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            break
+        _PDF_CACHE_HITS.inc()
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            # quem extraía foi cancelado (não este): tenta de novo, talvez como o novo extrator
+
+    _PDF_CACHE_MISSES.inc()
+    fut = _pdf_cache.pending[digest] = asyncio.get_running_loop().create_future()
+    try:
+        result = await _extract_pdf_uncached(raw, size)
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except BaseException as e:
+        # os que esperavam recebem o mesmo erro, não um "" como se o PDF fosse vazio
+        fut.set_exception(e)
+        fut.exception()     # marca como lida: sem "exception was never retrieved" se ninguém esperava
+        raise
+    else:
+        fut.set_result(result[0] if result else "")
+    finally:
+        _pdf_cache.pending.pop(digest, None)
+    if result is None:
+        return ""
+    # só entra no cache o texto completo ou cortado por páginas/caracteres; o corte por
+    # tempo (ou a tarefa abandonada, None) depende da carga: a próxima tentativa pode ir além
+    text, timed_out = result
+    if not timed_out:
+        _pdf_cache.put(digest, text)
+    return text
+
+
+async def extract_eml(raw: Union[bytes, str]) -> tuple[str, list[tuple[str, bytes]]]:
+    fn = partial(nlp.extract_text_from_eml, raw, max_chars=EXTRACT_MAX_CHARS, time_budget=EXTRACT_TIMEOUT)
+    with span("extract_text_from_eml"):
+        return await _run(fn, _size(raw), ("", []))
+
+
+def shutdown() -> None:
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
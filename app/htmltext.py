@@ -0,0 +1,132 @@
+# app/htmltext.py
+"""
+HTML → texto por eventos (html.parser da stdlib), sem montar árvore: o
+BeautifulSoup usa o mesmo parser por baixo e ainda cria um objeto por tag,
+o que domina o custo em newsletters de centenas de KB.
+
+- mesma saída do caminho antigo (get_text(" ", strip=True) + espaços
+  colapsados): cada trecho entre tags vira uma peça, sem bordas
+- descarta script, style, noscript e conteúdo oculto (atributo `hidden`,
+  display:none, visibility:hidden — o "preheader" dos e-mails de marketing)
+- para de ler ao juntar `max_chars` caracteres (o HTML restante nem é parseado)
+
+HTML_EXTRACTOR=bs4 volta ao BeautifulSoup (que também é o fallback se o
+parser falhar).
+"""
+from __future__ import annotations
+import os
+import re
+from html.parser import HTMLParser
+from typing import List, Optional
+
+HTML_EXTRACTOR  = os.getenv("HTML_EXTRACTOR", "stdlib")              # stdlib | bs4
+HTML_MAX_CHARS  = int(os.getenv("HTML_MAX_CHARS", "50000"))         # texto por corpo HTML (0 = sem limite)
+_FEED_CHUNK = 32 * 1024   # o orçamento é conferido entre um bloco e outro
+
+_SKIP = frozenset({"script", "style", "noscript"})
+# elementos sem conteúdo (não entram na pilha; mesma lista do BeautifulSoup)
+_VOID = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+    "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "keygen",
+    "menuitem", "nextid", "spacer",
+})
+_RE_HIDDEN_STYLE = re.compile(r"(?i)display\s*:\s*none|visibility\s*:\s*hidden")
+_RE_SPACES = re.compile(r"\s{2,}")
+
+
+class _TextCollector(HTMLParser):
+    def __init__(self, max_chars: Optional[int]):
+        super().__init__(convert_charrefs=True)
+        self.pieces: List[str] = []
+        self.size = 0
+        self.max_chars = max_chars
+        self.done = False
+        self._buf: List[str] = []
+        self._stack: List[str] = []       # tags abertas
+        self._hiding: List[bool] = []     # a tag correspondente (ou uma acima) esconde o conteúdo
+        self._hidden = 0
+
+    def _flush(self) -> None:
+        # fim de um trecho de texto (o BeautifulSoup fecha a string nas mesmas fronteiras)
+        if not self._buf:
+            return
+        text = "".join(self._buf).strip()
+        self._buf.clear()
+        if text:
+            text = _RE_SPACES.sub(" ", text)
+            self.pieces.append(text)
+            self.size += len(text) + 1
+            if self.max_chars is not None and self.size >= self.max_chars:
+                self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in _VOID:
+            return
+        hide = tag in _SKIP
+        if not hide and attrs:
+            for name, value in attrs:
+                if name == "hidden" or (name == "style" and value and _RE_HIDDEN_STYLE.search(value)):
+                    hide = True
+                    break
+        self._stack.append(tag)
+        self._hiding.append(hide)
+        self._hidden += hide
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_endtag(self, tag):
+        self._flush()
+        stack = self._stack
+        # fecha até a tag aberta mais recente com o mesmo nome; sem ela, ignora
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i] == tag:
+                self._hidden -= sum(self._hiding[i:])
+                del stack[i:], self._hiding[i:]
+                return
+
+    def handle_data(self, data):
+        if not self._hidden:
+            self._buf.append(data)
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> fora de script/style conta como texto (como no BeautifulSoup)
+        self._flush()
+        if data.startswith("CDATA[") and not self._hidden:
+            self._buf.append(data[6:])
+            self._flush()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+
+def html_to_text(html: str, max_chars: Optional[int] = None) -> str:
+    """Texto visível do HTML, com no máximo `max_chars` caracteres."""
+    parser = _TextCollector(max_chars)
+    for i in range(0, len(html), _FEED_CHUNK):
+        parser.feed(html[i:i + _FEED_CHUNK])
+        if parser.done:
+            break
+    else:
+        parser.close()
+    parser._flush()
+    text = " ".join(parser.pieces)
+    return text[:max_chars] if max_chars is not None else text
+
+
+def html_to_text_bs4(html: str, max_chars: Optional[int] = None) -> str:
+    """Caminho antigo (árvore do BeautifulSoup); fallback e referência do bench."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = _RE_SPACES.sub(" ", soup.get_text(separator=" ", strip=True)).strip()
+    return text[:max_chars] if max_chars is not None else text
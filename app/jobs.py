@@ -0,0 +1,338 @@
+# app/jobs.py
+"""
+Jobs assíncronos para lotes grandes (POST /jobs): o request só grava os
+arquivos e devolve o id; workers no próprio processo rodam o pipeline.
+
+- estado em SQLite (JOBS_DB_PATH): job, arquivos recebidos e uma linha por
+  parte com o resultado. Após um restart, jobs inacabados voltam para a fila
+  e só as partes sem resultado são processadas de novo
+- banco e arquivos ficam em DATA_DIR (padrão: <tmp do sistema>/autou), não
+  no diretório de trabalho
+- fila limitada (JOBS_QUEUE_SIZE): cheia → 429 para novos jobs
+- fases: queued → extracting → running → done | failed | cancelled
+"""
+from __future__ import annotations
+import asyncio, os, shutil, sqlite3, tempfile, threading, time, uuid
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .dedup import Batch
+from .schemas import JobItemOut, JobOut, ProcessOut
+from .uploads import Upload
+
+DATA_DIR        = os.getenv("DATA_DIR") or os.path.join(tempfile.gettempdir(), "autou")
+JOBS_DB_PATH    = os.getenv("JOBS_DB_PATH") or os.path.join(DATA_DIR, "jobs.sqlite3")
+JOBS_DIR        = os.getenv("JOBS_DIR") or os.path.join(DATA_DIR, "jobs_data")   # arquivos aguardando extração
+JOBS_WORKERS    = int(os.getenv("JOBS_WORKERS", "2"))       # jobs rodando ao mesmo tempo
+JOBS_QUEUE_SIZE = int(os.getenv("JOBS_QUEUE_SIZE", "100"))  # jobs aguardando na fila
+JOBS_TTL        = float(os.getenv("JOBS_TTL", str(24 * 3600)))  # jobs finalizados são apagados depois disso
+# limites de upload próprios (lotes grandes); o por-arquivo continua MAX_BYTES
+JOBS_MAX_FILES         = int(os.getenv("JOBS_MAX_FILES", "1000"))
+JOBS_MAX_REQUEST_BYTES = int(os.getenv("JOBS_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+
+_EXTRACT_FLUSH = 100   # partes por INSERT durante a extração
+_PAGE_MIN = 32         # partes carregadas do SQLite por vez no processamento
+
+FINAL = ("done", "failed", "cancelled")
+_FINAL_SQL = "('done', 'failed', 'cancelled')"
+
+# pipeline injetado pelo main (evita import circular)
+Extractor = Callable[[List[Upload], Optional[str]], AsyncIterator[str]]
+# (parte, observações, semáforo, use_cache, debug, envio, índice)
+Processor = Callable[[str, Optional[str], asyncio.Semaphore, bool, bool, Batch, int], Awaitable[ProcessOut]]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Store:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL,
+                    email_text TEXT, observacoes TEXT, use_cache INTEGER NOT NULL,
+                    total INTEGER, error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS job_files (
+                    job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT NOT NULL,
+                    path TEXT NOT NULL, size INTEGER NOT NULL, PRIMARY KEY (job_id, idx)
+                );
+                CREATE TABLE IF NOT EXISTS job_items (
+                    job_id TEXT NOT NULL, idx INTEGER NOT NULL, text TEXT NOT NULL, result TEXT,
+                    PRIMARY KEY (job_id, idx)
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated);
+            """)
+            self._conn.commit()
+
+    def _exec(self, fn):
+        with self._lock:
+            try:
+                out = fn(self._conn)
+                self._conn.commit()
+                return out
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def create(self, job_id: str, files: List[Tuple[str, str, int]], email_text: Optional[str],
+               observacoes: Optional[str], use_cache: bool) -> None:
+        now = time.time()
+
+        def fn(c):
+            c.execute("INSERT INTO jobs (id, status, created, updated, email_text, observacoes, use_cache) "
+                      "VALUES (?, 'queued', ?, ?, ?, ?, ?)", (job_id, now, now, email_text, observacoes, int(use_cache)))
+            c.executemany("INSERT INTO job_files (job_id, idx, filename, path, size) VALUES (?, ?, ?, ?, ?)",
+                          [(job_id, i, name, path, size) for i, (name, path, size) in enumerate(files)])
+        self._exec(fn)
+
+    def job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, email_text, observacoes, use_cache, total, error FROM jobs WHERE id = ?",
+                (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "status", "email_text", "observacoes", "use_cache", "total", "error")
+        return dict(zip(keys, row))
+
+    def files(self, job_id: str) -> List[Upload]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, path, size FROM job_files WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        return [Upload(name, path, size) for name, path, size in rows]
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> bool:
+        """Muda o status, exceto de job já finalizado (ex.: cancelado no meio)."""
+        def fn(c):
+            cur = c.execute(
+                f"UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND status NOT IN {_FINAL_SQL}",
+                (status, error, time.time(), job_id))
+            return cur.rowcount > 0
+        return self._exec(fn)
+
+    def reset_items(self, job_id: str) -> None:
+        self._exec(lambda c: c.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,)))
+
+    def append_items(self, job_id: str, start: int, texts: List[str]) -> None:
+        self._exec(lambda c: c.executemany(
+            "INSERT INTO job_items (job_id, idx, text) VALUES (?, ?, ?)",
+            [(job_id, start + i, t) for i, t in enumerate(texts)]))
+
+    def finish_extraction(self, job_id: str, total: int) -> None:
+        def fn(c):
+            c.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            c.execute("UPDATE jobs SET total = ?, status = 'running', updated = ? WHERE id = ? AND status = 'extracting'",
+                      (total, time.time(), job_id))
+        self._exec(fn)
+
+    def pending(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT idx, text FROM job_items WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?",
+                (job_id, limit)).fetchall()
+
+    def finish_item(self, job_id: str, idx: int, result: str) -> None:
+        self._exec(lambda c: c.execute(
+            "UPDATE job_items SET result = ? WHERE job_id = ? AND idx = ?", (result, job_id, idx)))
+
+    def results(self, job_id: str) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT idx, result FROM job_items WHERE job_id = ? AND result IS NOT NULL ORDER BY idx",
+                (job_id,)).fetchall()
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status NOT IN {_FINAL_SQL} ORDER BY created").fetchall()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _delete(c, ids: List[str]) -> None:
+        for table, col in (("job_items", "job_id"), ("job_files", "job_id"), ("jobs", "id")):
+            c.executemany(f"DELETE FROM {table} WHERE {col} = ?", [(i,) for i in ids])
+
+    def delete(self, job_id: str) -> None:
+        self._exec(lambda c: self._delete(c, [job_id]))
+
+    def purge(self, older_than: float) -> List[str]:
+        def fn(c):
+            ids = [r[0] for r in c.execute(
+                f"SELECT id FROM jobs WHERE status IN {_FINAL_SQL} AND updated < ?", (older_than,)).fetchall()]
+            self._delete(c, ids)
+            return ids
+        return self._exec(fn)
+
+
+class JobRunner:
+    def __init__(self, extract: Extractor, process: Processor, part_concurrency: int,
+                 db_path: str = JOBS_DB_PATH, jobs_dir: str = JOBS_DIR):
+        self._extract = extract
+        self._process = process
+        self._part_concurrency = part_concurrency
+        self._db_path = db_path
+        self._dir = Path(jobs_dir)
+        self._store: Optional[_Store] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    @property
+    def store(self) -> _Store:
+        if self._store is None:
+            self._store = _Store(self._db_path)
+        return self._store
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._dir.mkdir(parents=True, exist_ok=True)
+        resumed = await asyncio.to_thread(self.store.unfinished)
+        # os retomados sempre cabem; novos jobs esperam a fila baixar de JOBS_QUEUE_SIZE
+        self._queue = asyncio.Queue(max(1, JOBS_QUEUE_SIZE, len(resumed)))
+        for job_id in resumed:
+            self._queue.put_nowait(job_id)
+        if resumed:
+            print(f"[jobs] retomando {len(resumed)} job(s) inacabado(s)")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, JOBS_WORKERS))]
+
+    async def stop(self) -> None:
+        # jobs interrompidos ficam como estão no SQLite e são retomados no próximo start
+        self._stopping = True
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, uploads: List[Upload], email_text: Optional[str],
+                     observacoes: Optional[str], use_cache: bool) -> str:
+        if self._queue is None:
+            raise RuntimeError("JobRunner não iniciado")
+        if self._queue.full():
+            raise QueueFull()     # atalho: nem grava os arquivos
+        job_id = uuid.uuid4().hex
+        files = await asyncio.to_thread(self._spool, job_id, uploads)
+        await asyncio.to_thread(self.store.create, job_id, files, email_text, observacoes, use_cache)
+        # a vaga só é garantida aqui (outros submits correram durante os awaits)
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            await asyncio.to_thread(self.store.delete, job_id)
+            await asyncio.to_thread(shutil.rmtree, self._dir / job_id, True)
+            raise QueueFull()
+        await asyncio.to_thread(self._purge)
+        return job_id
+
+    def _spool(self, job_id: str, uploads: List[Upload]) -> List[Tuple[str, str, int]]:
+        """Copia os uploads para JOBS_DIR/<id>/ (sobrevivem ao request e a restarts)."""
+        job_dir = self._dir / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+        out = []
+        for i, up in enumerate(uploads):
+            dest = job_dir / f"{i:05d}{Path(up.filename).suffix.lower()}"
+            if isinstance(up.source, bytes):
+                dest.write_bytes(up.source)
+            else:
+                shutil.move(up.source, dest)
+            out.append((up.filename, str(dest), up.size))
+        return out
+
+    def _purge(self) -> None:
+        for job_id in self.store.purge(time.time() - JOBS_TTL):
+            shutil.rmtree(self._dir / job_id, ignore_errors=True)
+
+    async def cancel(self, job_id: str) -> bool:
+        changed = await asyncio.to_thread(self.store.set_status, job_id, "cancelled")
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        if changed:
+            await asyncio.to_thread(shutil.rmtree, self._dir / job_id, True)
+        return changed
+
+    async def status(self, job_id: str) -> Optional[JobOut]:
+        job = await asyncio.to_thread(self.store.job, job_id)
+        if job is None:
+            return None
+        rows = await asyncio.to_thread(self.store.results, job_id)
+        return JobOut(
+            id=job_id,
+            status=job["status"],
+            total=job["total"],
+            concluidos=len(rows),
+            erro=job["error"],
+            resultados=[JobItemOut(indice=i, resultado=ProcessOut.model_validate_json(r)) for i, r in rows],
+        )
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            task = asyncio.create_task(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                await task
+            except asyncio.CancelledError:
+                if self._stopping:
+                    raise          # shutdown; senão foi o job que foi cancelado
+            except Exception as e:
+                print(f"[jobs] job {job_id} falhou:", repr(e))
+                await asyncio.to_thread(self.store.set_status, job_id, "failed", "Falha ao processar o job.")
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _run(self, job_id: str) -> None:
+        store = self.store
+        job = await asyncio.to_thread(store.job, job_id)
+        if job is None or job["status"] in FINAL:
+            return
+        if job["total"] is None:
+            # extração ainda não concluída (job novo ou interrompido nela): refaz.
+            # As partes vão para o SQLite em blocos, sem juntar o lote em memória
+            if not await asyncio.to_thread(store.set_status, job_id, "extracting"):
+                return
+            await asyncio.to_thread(store.reset_items, job_id)
+            uploads = await asyncio.to_thread(store.files, job_id)
+            batch: List[str] = []
+            total = 0
+            async for part in self._extract(uploads, job["email_text"]):
+                if not (part and part.strip()):
+                    continue
+                batch.append(part)
+                if len(batch) >= _EXTRACT_FLUSH:
+                    await asyncio.to_thread(store.append_items, job_id, total, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                await asyncio.to_thread(store.append_items, job_id, total, batch)
+                total += len(batch)
+            await asyncio.to_thread(store.finish_extraction, job_id, total)
+            shutil.rmtree(self._dir / job_id, ignore_errors=True)
+            if not total:
+                await asyncio.to_thread(store.set_status, job_id, "failed", "Não foi possível extrair texto válido.")
+                return
+
+        sem = asyncio.Semaphore(self._part_concurrency)
+        observacoes, use_cache = job["observacoes"], bool(job["use_cache"])
+        batch: Batch = {}   # só em memória: partes de antes de um restart não viram origem
+
+        async def one(idx: int, text: str) -> None:
+            out = await self._process(text, observacoes, sem, use_cache, False, batch, idx)
+            await asyncio.to_thread(store.finish_item, job_id, idx, out.model_dump_json())
+
+        # processa em páginas: só uma página de textos fica em memória
+        page_size = max(_PAGE_MIN, self._part_concurrency * 8)
+        while True:
+            page = await asyncio.to_thread(store.pending, job_id, page_size)
+            if not page:
+                break
+            await asyncio.gather(*(one(idx, text) for idx, text in page))
+        await asyncio.to_thread(store.set_status, job_id, "done")
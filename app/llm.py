@@ -0,0 +1,54 @@
+# app/llm.py
+from __future__ import annotations
+import os
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:  # openai/httpx só são importados na criação do client
+    from openai import AsyncOpenAI
+
+OPENAI_API_KEY  = os.getenv("OPENAI_API_KEY")
+OPENAI_ORG      = os.getenv("OPENAI_ORG")       # opcional
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # opcional (proxy, stub local)
+
+# pool HTTP compartilhado por respond e classify
+OPENAI_TIMEOUT          = float(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_MAX_CONNECTIONS  = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE    = int(os.getenv("OPENAI_MAX_KEEPALIVE", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+
+# NÃO crie o client aqui se a chave pode não existir.
+_client: Optional["AsyncOpenAI"] = None
+
+
+def get_client() -> Optional["AsyncOpenAI"]:
+    """
+    Client assíncrono único por processo (conexões reaproveitadas via keep-alive).
+    Retorna None quando não há OPENAI_API_KEY.
+    """
+    global _client
+    if _client is None and OPENAI_API_KEY:
+        import httpx
+        from openai import AsyncOpenAI
+        http = httpx.AsyncClient(
+            timeout=OPENAI_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            organization=OPENAI_ORG,
+            base_url=OPENAI_BASE_URL,
+            http_client=http,
+            max_retries=0,      # retries/backoff ficam no ratelimit (compartilhado)
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
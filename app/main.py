@@ -1,23 +1,63 @@
 from __future__ import annotations
-import os
+import os, asyncio, json, time
+from contextlib import aclosing
 from pathlib import Path
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
 
-from fastapi import FastAPI, UploadFile, Form, File, HTTPException
+from fastapi import FastAPI, UploadFile, Form, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from starlette.datastructures import Headers
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
+from pydantic import TypeAdapter, ValidationError
 
-from .schemas import ProcessOut, ErrorOut, ProcessBatchOut
-from .nlp import extract_text_from_pdf, preprocess, detect_language, extract_text_from_eml
-from .classify import classify_email
-from .respond import suggest_reply
+from .schemas import ProcessOut, ErrorOut, ProcessBatchOut, JobOut, ClassifyBatchOut, ClassifyItemIn
+from . import nlp
+from .nlp import preprocess, preprocess_many, detect_language
+from .executors import extract_pdf, extract_eml
+from . import executors
+from .classify import classify_email, classify_many, USE_OPENAI_CLASSIFIER, OPENAI_CLASSIFIER_MODEL
+from .respond import Reply, draft_reply, stream_reply, template_reply, OPENAI_MODEL
+from .llm import OPENAI_API_KEY, close_client, get_client
+from .cache import result_cache, make_key, CACHE_ENABLED
+from .replies import REPLY_INDEX_ENABLED, REPLY_INDEX_MIN_TOKENS, REPLY_REUSE_THRESHOLD, reply_index
+from .model import load_model, model_id
+from .threads import split_thread, THREAD_CONTEXT_CHARS, THREAD_STRIP_ENABLED
+from .tracing import span, part_trace, profiled, start_request_trace, TRACE_PROFILE_ENABLED
+from .dedup import Batch, dedup_index, simhash, DEDUP_ENABLED, DEDUP_MIN_TOKENS
+from . import metrics
+from .metrics import (
+    DEDUP_HITS, INPUT_BYTES, PART_CHARS, PARTS_IN_FLIGHT, REQUESTS_IN_FLIGHT, THREAD_QUOTED_CHARS,
+)
+from .uploads import Source, Upload, read_source, read_uploads, close_uploads, MAX_REQUEST_BYTES
+from .archives import is_archive, iter_archive
+from .jobs import JobRunner, QueueFull, JOBS_MAX_FILES, JOBS_MAX_REQUEST_BYTES
 from .utils import truncate
 
 # --------- Setup ---------
 load_dotenv()
-MAX_BYTES = int(os.getenv("MAX_BYTES", str(10 * 1024 * 1024)))
+# multipart além dos arquivos (campos de texto, cabeçalhos das partes)
+MAX_FORM_OVERHEAD = int(os.getenv("MAX_FORM_OVERHEAD", str(1024 * 1024)))
+# partes processadas em paralelo: por request e no processo inteiro
+PART_CONCURRENCY = int(os.getenv("PART_CONCURRENCY", "4"))
+GLOBAL_PART_CONCURRENCY = int(os.getenv("GLOBAL_PART_CONCURRENCY", "32"))
+_global_parts = asyncio.Semaphore(GLOBAL_PART_CONCURRENCY)
+# /process/stream: partes extraídas aguardando emissão
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", "16"))
+# POST /classify: só classificação, em lote
+CLASSIFY_MAX_ITEMS = int(os.getenv("CLASSIFY_MAX_ITEMS", "50000"))
+CLASSIFY_MAX_BYTES = int(os.getenv("CLASSIFY_MAX_BYTES", str(64 * 1024 * 1024)))
+CLASSIFY_MAX_CHARS = int(os.getenv("CLASSIFY_MAX_CHARS", "20000"))   # corpo considerado por item
+CLASSIFY_CHUNK     = int(os.getenv("CLASSIFY_CHUNK", "1000"))        # itens por passada fora do event loop
+# importa pdfplumber/bs4/openai e aquece o preprocess antes de aceitar tráfego
+WARMUP = os.getenv("WARMUP", "0") in {"1", "true", "True"}
+
+_PARTS = PARTS_IN_FLIGHT.labels()
+_PART_CHARS = PART_CHARS.labels()
+_QUOTED_CHARS = THREAD_QUOTED_CHARS.labels()
+_DEDUP_HITS_PENDING = DEDUP_HITS.labels("em_andamento")
+_DEDUP_HITS_INDEX = DEDUP_HITS.labels("indice")
 
 # main.py está em app/, então a raiz do projeto é dois níveis acima de __file__? Não:  app/main.py -> parents[1] é a raiz.
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -33,84 +73,701 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def _startup():
+    if WARMUP:
+        await asyncio.to_thread(nlp.warm_up)
+        get_client()
+    if REPLY_INDEX_ENABLED and OPENAI_API_KEY:
+        await asyncio.to_thread(reply_index.load)
+    # classificador local da zona morta (.npz): lido uma vez
+    await asyncio.to_thread(load_model)
+    # retoma jobs inacabados antes de aceitar novos
+    await job_runner.start()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await job_runner.stop()
+    # fecha o pool HTTP compartilhado com a OpenAI
+    await close_client()
+    executors.shutdown()
+
+_BODY_LIMITS = {"/jobs": JOBS_MAX_REQUEST_BYTES, "/classify": CLASSIFY_MAX_BYTES}
+
+class _LimitBody:
+    """
+    Limite do corpo na recepção, antes de o Starlette gravar o multipart no
+    spool dele: pelo Content-Length (413 sem ler nada) e contando os bytes de
+    cada mensagem http.request, que é o que vale para envio chunked (sem
+    Content-Length). Estourou no meio: HTTPException 413 de dentro do receive.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = _BODY_LIMITS.get(scope["path"], MAX_REQUEST_BYTES) + MAX_FORM_OVERHEAD
+        length = Headers(scope=scope).get("content-length")
+        if length and length.isdigit() and int(length) > limit:
+            return await JSONResponse({"detail": "Envio muito grande."}, status_code=413)(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(413, "Envio muito grande.")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(_LimitBody)
+
+@app.middleware("http")
+async def _trace_request(request: Request, call_next):
+    """
+    Server-Timing com a soma de cada etapa (spans de app/tracing.py). Em
+    respostas em stream o header sai antes das partes: só a leitura entra.
+    """
+    trace = start_request_trace()
+    t0 = time.perf_counter()
+    if request.query_params.get("profile") == "1":
+        if not TRACE_PROFILE_ENABLED:
+            return JSONResponse({"detail": "Perfil desabilitado (TRACE_PROFILE_ENABLED=0)."}, status_code=403)
+        with profiled(request.url.path.strip("/").replace("/", "_") or "index") as path:
+            response = await call_next(request)
+        response.headers["X-Profile"] = os.path.basename(path) if path else "ocupado"
+    else:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = trace.server_timing(time.perf_counter() - t0)
+    return response
+
 # --------- Health ---------
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 # --------- API ---------
-@app.post("/process", response_model=ProcessBatchOut, responses={400: {"model": ErrorOut}})
+def _decode_text(data: bytes) -> str:
+    try:
+        return data.decode("utf-8", errors="ignore")
+    except Exception:
+        return data.decode("latin-1", errors="ignore")
+
+async def _parts_of(name: str, source: Source) -> AsyncIterator[str]:
+    """Partes de um arquivo .txt/.pdf/.eml (bytes ou caminho); o .eml inclui os anexos."""
+    low = (name or "").lower()
+    if low.endswith(".txt"):
+        # utf-8 tem até 4 bytes por caractere
+        yield _decode_text(read_source(source, executors.EXTRACT_MAX_CHARS * 4))[:executors.EXTRACT_MAX_CHARS]
+    elif low.endswith(".pdf"):
+        yield await extract_pdf(source)
+    elif low.endswith(".eml"):
+        body, atts = await extract_eml(source)
+        if body:
+            yield body
+        for att_name, att_bytes in atts:
+            if (att_name or "").lower().endswith((".txt", ".pdf")):
+                async for part in _parts_of(att_name, att_bytes):
+                    yield part
+    # ignora extensões desconhecidas
+
+async def _iter_archive(up: Upload) -> AsyncIterator[Tuple[str, bytes]]:
+    """Itens do .mbox/.zip um a um, com a leitura do arquivo fora do event loop."""
+    items = iter_archive(up.filename, up.source)
+    try:
+        while True:
+            item = await asyncio.to_thread(next, items, None)
+            if item is None:
+                break
+            yield item
+    finally:
+        try:
+            items.close()
+        except ValueError:
+            pass  # cancelado com a thread ainda lendo: o gerador fecha ao ser coletado
+
+async def _iter_parts(uploads: List[Upload], email_text: Optional[str]) -> AsyncIterator[str]:
+    """Extrai as partes (e-mails) uma a uma, na ordem dos uploads; o texto colado vem por último."""
+    for up in uploads:
+        name = up.filename.lower()
+        kind = name.rsplit(".", 1)[-1] if name.endswith((".txt", ".pdf", ".eml", ".mbox", ".zip")) else "other"
+        INPUT_BYTES.labels(kind).observe(up.size)
+        if is_archive(name):
+            async for member, raw in _iter_archive(up):
+                async for part in _parts_of(member, raw):
+                    yield part
+        else:
+            async for part in _parts_of(up.filename, up.source):
+                yield part
+
+    if email_text and email_text.strip():
+        INPUT_BYTES.labels("text").observe(len(email_text.encode("utf-8")))
+        yield email_text
+
+@app.post("/process", response_model=ProcessBatchOut, responses={400: {"model": ErrorOut}, 422: {"model": ErrorOut}})
 async def process_email(
     email_files: Optional[List[UploadFile]] = File(None),
     email_text: Optional[str] = Form(None),
     observacoes: Optional[str] = Form(None),
+    no_cache: bool = Form(False),
+    debug: bool = False,
 ):
+    """
+    `?debug=1` inclui em cada resultado o tempo (ms) de cada etapa daquela parte.
+    Caixas .mbox/.zip são recusadas (422): a resposta única juntaria o lote
+    inteiro em memória; elas vão pelo /process/stream ou /jobs.
+    """
     if not email_files and not (email_text and email_text.strip()):
         raise HTTPException(400, "Envie arquivo(s) .txt/.pdf/.eml ou cole o texto.")
+    if any(is_archive(f.filename or "") for f in email_files or []):
+        raise HTTPException(422, "Caixas .mbox/.zip não são aceitas no /process: use /process/stream ou /jobs.")
+
+    with REQUESTS_IN_FLIGHT.labels("process").track():
+        with span("read_uploads"):
+            uploads = await read_uploads(email_files)
+        try:
+            parts = [p async for p in _iter_parts(uploads, email_text) if p and p.strip()]
+        finally:
+            close_uploads(uploads)
+
+        request_parts = asyncio.Semaphore(PART_CONCURRENCY)
+        use_cache = not no_cache
+        batch: Batch = {}
+        resultados: List[ProcessOut] = list(await asyncio.gather(
+            *(_run_part(part, observacoes, request_parts, use_cache, debug, batch, i) for i, part in enumerate(parts))
+        ))
+
+    if not resultados:
+        raise HTTPException(400, "Não foi possível extrair texto válido.")
+
+    return ProcessBatchOut(resultados=resultados)
+
+@app.post("/process/stream", responses={400: {"model": ErrorOut}})
+async def process_email_stream(
+    email_files: Optional[List[UploadFile]] = File(None),
+    email_text: Optional[str] = Form(None),
+    observacoes: Optional[str] = Form(None),
+    no_cache: bool = Form(False),
+    debug: bool = False,
+):
+    """
+    Mesma entrada do /process, mas responde em NDJSON: uma linha
+    {"tipo": "resultado", "indice": i, "resultado": ProcessOut} por parte, assim
+    que ela fica pronta (fora de ordem), e no fim uma linha {"tipo": "resumo"}.
+    """
+    if not email_files and not (email_text and email_text.strip()):
+        raise HTTPException(400, "Envie arquivo(s) .txt/.pdf/.eml/.mbox/.zip ou cole o texto.")
+
+    uploads = await read_uploads(email_files)
+    use_cache = not no_cache
+    return StreamingResponse(
+        _stream_results(uploads, email_text, observacoes, use_cache, debug),
+        media_type="application/x-ndjson",
+    )
+
+@app.post("/process/sse", responses={400: {"model": ErrorOut}})
+async def process_email_sse(
+    email_files: Optional[List[UploadFile]] = File(None),
+    email_text: Optional[str] = Form(None),
+    observacoes: Optional[str] = Form(None),
+    no_cache: bool = Form(False),
+):
+    """
+    Mesma entrada do /process, em Server-Sent Events, parte a parte na ordem:
+    `classificacao` (categoria e confiança, calculadas aqui, antes da OpenAI),
+    `texto` (pedaços da resposta conforme o modelo gera, já no limite de
+    frases) e `resultado` (ProcessOut final, que prevalece sobre os pedaços);
+    no fim, `resumo`. Feito para um e-mail por vez (a página usa com texto
+    colado ou um arquivo); lotes ficam no /process/stream.
+    """
+    if not email_files and not (email_text and email_text.strip()):
+        raise HTTPException(400, "Envie arquivo(s) .txt/.pdf/.eml/.mbox/.zip ou cole o texto.")
+
+    uploads = await read_uploads(email_files)
+    return StreamingResponse(
+        _sse_results(uploads, email_text, observacoes, not no_cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", response_model=JobOut, status_code=202, responses={400: {"model": ErrorOut}, 429: {"model": ErrorOut}})
+async def create_job(
+    email_files: Optional[List[UploadFile]] = File(None),
+    email_text: Optional[str] = Form(None),
+    observacoes: Optional[str] = Form(None),
+    no_cache: bool = Form(False),
+):
+    """
+    Mesma entrada do /process, para lotes grandes: grava os arquivos, enfileira
+    e devolve o id na hora. Acompanhe em GET /jobs/{id}.
+    """
+    if not email_files and not (email_text and email_text.strip()):
+        raise HTTPException(400, "Envie arquivo(s) .txt/.pdf/.eml/.mbox/.zip ou cole o texto.")
+
+    uploads = await read_uploads(email_files, JOBS_MAX_FILES, JOBS_MAX_REQUEST_BYTES)
+    try:
+        job_id = await job_runner.submit(uploads, email_text, observacoes, not no_cache)
+    except QueueFull:
+        raise HTTPException(429, "Fila de jobs cheia, tente novamente em instantes.")
+    finally:
+        close_uploads(uploads)   # o que foi para a fila já saiu do tmp
+    return JobOut(id=job_id, status="queued")
+
+@app.get("/jobs/{job_id}", response_model=JobOut, responses={404: {"model": ErrorOut}})
+async def get_job(job_id: str):
+    """Progresso e resultados parciais (em ordem de índice) do job."""
+    job = await job_runner.status(job_id)
+    if job is None:
+        raise HTTPException(404, "Job não encontrado.")
+    return job
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobOut, responses={404: {"model": ErrorOut}})
+async def cancel_job(job_id: str):
+    if not await job_runner.cancel(job_id) and await job_runner.status(job_id) is None:
+        raise HTTPException(404, "Job não encontrado.")
+    return await job_runner.status(job_id)
+
+@app.post("/classify", responses={200: {"model": ClassifyBatchOut}, 400: {"model": ErrorOut}, 413: {"model": ErrorOut}})
+async def classify_bulk(request: Request, stream: bool = False):
+    """
+    Só classificação (sem resposta e sem LLM), para roteamento em massa. Corpo:
+    array JSON ou NDJSON (Content-Type application/x-ndjson) de
+    {"subject", "body", "id"?}, até CLASSIFY_MAX_ITEMS itens. Responde
+    {"total", "resultados"} na ordem de entrada; com `stream=true` (ou
+    Accept: application/x-ndjson) sai uma linha por item, lote a lote.
+    """
+    raw = await _read_body(request, CLASSIFY_MAX_BYTES)
+    ndjson = "ndjson" in request.headers.get("content-type", "") or "jsonl" in request.headers.get("content-type", "")
+    try:
+        items = await asyncio.to_thread(_parse_classify_items, raw, ndjson)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not items:
+        raise HTTPException(400, "Envie ao menos um item {subject, body}.")
+    INPUT_BYTES.labels("classify").observe(len(raw))
+    del raw
+    chunks = [items[i:i + CLASSIFY_CHUNK] for i in range(0, len(items), max(1, CLASSIFY_CHUNK))]
+
+    if stream or "ndjson" in request.headers.get("accept", ""):
+        async def lines() -> AsyncIterator[str]:
+            with REQUESTS_IN_FLIGHT.labels("classify").track():
+                for chunk in chunks:
+                    rows = await asyncio.to_thread(_classify_chunk, chunk)
+                    yield "".join(map(_ndjson, rows))
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-    raw_parts: List[str] = []
+    with REQUESTS_IN_FLIGHT.labels("classify").track():
+        resultados: List[dict] = []
+        for chunk in chunks:
+            resultados.extend(await asyncio.to_thread(_classify_chunk, chunk))
+    # dicts prontos: sem revalidar dezenas de milhares de itens no response_model
+    body = json.dumps({"total": len(resultados), "resultados": resultados}, ensure_ascii=False, separators=(",", ":"))
+    return Response(body, media_type="application/json")
 
-    if email_files:
-        files = [f for f in email_files if f and getattr(f, "filename", "").strip()]
-        for f in files:
-            name = (f.filename or "").lower()
-            data = await f.read()
-            if not data:
-                continue
-            if len(data) > MAX_BYTES:
-                raise HTTPException(400, f"Arquivo muito grande: {f.filename}.")
+async def _read_body(request: Request, limit: int) -> bytes:
+    # o _LimitBody corta com a folga do multipart; aqui vale o limite exato
+    buf = bytearray()
+    async for chunk in request.stream():
+        buf += chunk
+        if len(buf) > limit:
+            raise HTTPException(413, "Envio muito grande.")
+    return bytes(buf)
 
-            if name.endswith(".txt"):
+_CLASSIFY_ITEMS = TypeAdapter(List[ClassifyItemIn])
+
+def _parse_classify_items(raw: bytes, ndjson: bool) -> List[Tuple[str, str, object]]:
+    """Valida o corpo do /classify contra ClassifyItemIn (JSON direto no validador, sem json.loads)."""
+    try:
+        if ndjson:
+            data = []
+            for i, line in enumerate(line for line in raw.splitlines() if line.strip()):
                 try:
-                    raw_parts.append(data.decode("utf-8", errors="ignore"))
-                except Exception:
-                    raw_parts.append(data.decode("latin-1", errors="ignore"))
-            elif name.endswith(".pdf"):
-                raw_parts.append(extract_text_from_pdf(data))
-            elif name.endswith(".eml"):
-                body, atts = extract_text_from_eml(data)
-                if body:
-                    raw_parts.append(body)
-                for att_name, att_bytes in atts:
-                    low = (att_name or "").lower()
-                    if low.endswith(".txt"):
-                        try:
-                            raw_parts.append(att_bytes.decode("utf-8", errors="ignore"))
-                        except Exception:
-                            raw_parts.append(att_bytes.decode("latin-1", errors="ignore"))
-                    elif low.endswith(".pdf"):
-                        raw_parts.append(extract_text_from_pdf(att_bytes))
+                    data.append(ClassifyItemIn.model_validate_json(line))
+                except ValidationError as e:
+                    raise ValueError(_classify_error(e, i))
+        else:
+            data = _CLASSIFY_ITEMS.validate_json(raw)
+    except ValidationError as e:
+        raise ValueError(_classify_error(e))
+    if len(data) > CLASSIFY_MAX_ITEMS:
+        raise ValueError(f"Máximo de {CLASSIFY_MAX_ITEMS} itens por request.")
+    return [(it.subject or "", it.body[:CLASSIFY_MAX_CHARS], it.id) for it in data]
+
+def _classify_error(e: ValidationError, line: Optional[int] = None) -> str:
+    err = e.errors()[0]
+    if err["type"] == "json_invalid":
+        onde = "" if line is None else f" (linha {line + 1})"
+        return f"JSON inválido{onde}: {err.get('ctx', {}).get('error', err['msg'])}"
+    loc = err["loc"] if line is None else (line, *err["loc"])
+    if not loc:
+        return "Esperado um array JSON (ou NDJSON) de itens {subject, body}."
+    campo = ".".join(str(p) for p in loc[1:2])
+    return f"Item {loc[0]}: esperado {{\"subject\": str, \"body\": str, \"id\"?: str | int}}" + (f" ({campo})." if campo else ".")
+
+def _classify_chunk(items: List[Tuple[str, str, object]]) -> List[dict]:
+    """Mesmas etapas do _process_part, em lote e síncronas (roda fora do event loop)."""
+    with span("classify_chunk"):
+        texts = [split_thread(body).newest if THREAD_STRIP_ENABLED else body for _, body, _ in items]
+        pre = preprocess_many(texts)
+        results = classify_many([(subj, text) for (subj, _, _), text in zip(items, texts)], [c for c, _ in pre])
+        rows = []
+        for (_, _, item_id), text, (_, termos), rr in zip(items, texts, pre, results):
+            row = {
+                "categoria": rr.categoria,
+                "confianca": round(float(rr.score), 3),
+                "termos_relevantes": rr.termos or termos,
+                "linguagem": detect_language(text),
+            }
+            if item_id is not None:
+                row["id"] = item_id
+            rows.append(row)
+    return rows
+
+def _ndjson(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+async def _stream_results(
+    uploads: List[Upload], email_text: Optional[str], observacoes: Optional[str], use_cache: bool,
+    debug: bool = False,
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    in_flight = REQUESTS_IN_FLIGHT.labels("process_stream")
+    in_flight.inc()
+    queue: asyncio.Queue = asyncio.Queue()
+    request_parts = asyncio.Semaphore(PART_CONCURRENCY)
+    # partes extraídas ainda não emitidas: limita memória e trabalho adiantado
+    window = asyncio.Semaphore(STREAM_WINDOW)
+    tasks: set = set()
+    batch: Batch = {}
+
+    async def run(i: int, part: str):
+        out = await _run_part(part, observacoes, request_parts, use_cache, debug, batch, i)
+        await queue.put(("resultado", (i, out)))
+
+    async def produce():
+        n = 0
+        try:
+            async for part in _iter_parts(uploads, email_text):
+                if not (part and part.strip()):
+                    continue
+                await window.acquire()
+                task = asyncio.create_task(run(n, part))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                n += 1
+        except Exception as e:
+            print("[process/stream] falha na extração:", repr(e))
+            await queue.put(("erro", "Falha ao extrair parte do envio."))
+        finally:
+            await queue.put(("fim", n))
+
+    producer = asyncio.create_task(produce())
+    total: Optional[int] = None
+    emitted = falhas = 0
+    categorias = {"Produtivo": 0, "Improdutivo": 0}
+    try:
+        while total is None or emitted < total:
+            kind, payload = await queue.get()
+            if kind == "resultado":
+                i, out = payload
+                window.release()
+                emitted += 1
+                if out.categoria is not None:
+                    categorias[out.categoria] = categorias.get(out.categoria, 0) + 1
+                else:
+                    falhas += 1
+                yield _ndjson({"tipo": "resultado", "indice": i, "resultado": out.model_dump()})
+            elif kind == "erro":
+                yield _ndjson({"tipo": "erro", "mensagem": payload})
             else:
-                # ignora extensões desconhecidas
-                continue
+                total = payload
 
-    if email_text and email_text.strip():
-        raw_parts.append(email_text)
-
-    resultados: List[ProcessOut] = []
-    for part in [p for p in raw_parts if p and p.strip()]:
-        linguagem = detect_language(part)
-        clean_text, termos = preprocess(part)
-        categoria, score, termos_rule = await classify_email(part, clean_text)
-        termos_final = termos_rule or termos
-        resposta = await suggest_reply(
-            truncate(part, 3500), categoria, extra_instructions=observacoes
+        if not total:
+            yield _ndjson({"tipo": "erro", "mensagem": "Não foi possível extrair texto válido."})
+        yield _ndjson({
+            "tipo": "resumo",
+            "total": emitted,
+            "categorias": categorias,
+            "falhas": falhas,
+            "duracao_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    finally:
+        # cliente desconectou ou terminou: não deixa trabalho órfão
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        close_uploads(uploads)
+        in_flight.dec()
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _sse_results(
+    uploads: List[Upload], email_text: Optional[str], observacoes: Optional[str], use_cache: bool,
+) -> AsyncIterator[str]:
+    started = time.perf_counter()
+    in_flight = REQUESTS_IN_FLIGHT.labels("process_sse")
+    in_flight.inc()
+    n = falhas = 0
+    categorias = {"Produtivo": 0, "Improdutivo": 0}
+    try:
+        try:
+            async for part in _iter_parts(uploads, email_text):
+                if not (part and part.strip()):
+                    continue
+                i, n = n, n + 1
+                # aclosing: cliente que desconecta derruba na hora o stream da OpenAI
+                async with aclosing(_stream_part(part, observacoes, use_cache)) as events:
+                    async for event, data in events:
+                        if event == "resultado":
+                            cat = data["resultado"]["categoria"]
+                            if cat is not None:
+                                categorias[cat] = categorias.get(cat, 0) + 1
+                            else:
+                                falhas += 1
+                        yield _sse(event, {"indice": i, **data})
+        except Exception as e:
+            print("[process/sse] falha na extração:", repr(e))
+            yield _sse("erro", {"mensagem": "Falha ao extrair parte do envio."})
+        if not n:
+            yield _sse("erro", {"mensagem": "Não foi possível extrair texto válido."})
+        yield _sse("resumo", {
+            "total": n,
+            "categorias": categorias,
+            "falhas": falhas,
+            "duracao_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    finally:
+        close_uploads(uploads)
+        in_flight.dec()
+
+async def _stream_part(part: str, observacoes: Optional[str], use_cache: bool) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Pipeline de uma parte com a resposta em pedaços. Cache como no
+    _process_part; o índice de quase-duplicatas fica de fora (uma parte por
+    vez, não há irmãs em andamento para esperar).
+    """
+    async with _global_parts:
+        _PART_CHARS.observe(len(part))
+        with _PARTS.track():
+            key = _cache_key(part, observacoes) if use_cache and CACHE_ENABLED else None
+            cached = await _cache_get(key)
+            if cached is not None:
+                yield "resultado", {"resultado": cached.model_dump()}
+                return
+            try:
+                text, context, clean_text, termos, linguagem = _prepare(part)
+                categoria, score, termos_rule = await classify_email(text, clean_text)
+            except Exception as e:
+                print("[process/sse] falha na parte:", repr(e))
+                yield "resultado", {"resultado": _failed_part().model_dump()}
+                return
+            head = {
+                "categoria": categoria,
+                "confianca": round(float(score), 3),
+                "termos_relevantes": termos_rule or termos,
+                "linguagem": linguagem,
+                "tokens": len(clean_text.split()),
+            }
+            yield "classificacao", head
+            reply, erro = Reply(template_reply(categoria), source="fallback"), None
+            try:
+                async with aclosing(stream_reply(
+                    truncate(text, 3500), categoria, extra_instructions=observacoes,
+                    clean_text=clean_text if use_cache else None, context=context,
+                )) as chunks:
+                    async for item in chunks:
+                        if isinstance(item, str):
+                            yield "texto", {"delta": item}
+                        else:
+                            reply = item
+            except Exception as e:
+                print("[process/sse] falha na resposta, usando template:", repr(e))
+                reply, erro = Reply(template_reply(categoria), source="fallback"), _REPLY_FAILED
+            out = ProcessOut(**head, resposta=reply.text, resposta_origem=reply.source,
+                             resposta_similaridade=reply.similarity, erro=erro)
+            if key is not None and reply.source != "fallback":
+                await _cache_set(key, out)
+            yield "resultado", {"resultado": out.model_dump()}
+
+def _cache_key(part: str, observacoes: Optional[str]) -> str:
+    # a categoria sai do texto + configuração do classificador (e do modelo
+    # local); a resposta depende do modelo, da chave, do recorte da thread e
+    # do índice de respostas reaproveitadas
+    if not OPENAI_API_KEY:
+        reply = "template"
+    elif REPLY_INDEX_ENABLED:
+        reply = f"{OPENAI_MODEL}:indice:{REPLY_REUSE_THRESHOLD}:{REPLY_INDEX_MIN_TOKENS}"
+    else:
+        reply = OPENAI_MODEL
+    return make_key(
+        part, observacoes, reply,
+        OPENAI_CLASSIFIER_MODEL if USE_OPENAI_CLASSIFIER else "heuristica",
+        model_id(),
+        f"thread:{THREAD_CONTEXT_CHARS}" if THREAD_STRIP_ENABLED else "thread:off",
+    )
+
+async def _cache_get(key: Optional[str]) -> Optional[ProcessOut]:
+    # cache com problema (SQLite, entrada inválida) vale como miss, não derruba a parte
+    if key is None:
+        return None
+    try:
+        return await result_cache.get(key)
+    except Exception as e:
+        print("[cache] falha na leitura:", repr(e))
+        return None
+
+async def _cache_set(key: str, out: ProcessOut) -> None:
+    try:
+        await result_cache.set(key, out)
+    except Exception as e:
+        print("[cache] falha na gravação:", repr(e))
+
+_PART_FAILED = "Falha ao processar esta parte."
+_REPLY_FAILED = "Falha ao gerar a resposta: resposta padrão da categoria."
+
+def _failed_part() -> ProcessOut:
+    """Parte que falhou antes de ser classificada: sem categoria inventada."""
+    return ProcessOut(categoria=None, confianca=None, resposta="", resposta_origem="fallback", erro=_PART_FAILED)
+
+def _prepare(part: str) -> Tuple[str, Optional[str], str, List[str], str]:
+    """(mensagem mais nova, trecho do histórico, texto limpo, termos, idioma)."""
+    with span("preprocess"):
+        context = None
+        if THREAD_STRIP_ENABLED:
+            thread = split_thread(part)
+            text, context = thread.newest, thread.context
+            _QUOTED_CHARS.inc(thread.quoted_chars)
+        else:
+            text = part
+        clean_text, termos = preprocess(text)
+    return text, context, clean_text, termos, detect_language(text)
+
+async def _process_part(
+    part: str, observacoes: Optional[str], use_cache: bool = True,
+    batch: Optional[Batch] = None, index: Optional[int] = None,
+) -> ProcessOut:
+    """
+    Só a mensagem mais nova da thread é classificada, deduplicada e vai ao
+    prompt (com um trecho do histórico como contexto); o cache usa a parte
+    inteira. `use_cache=False` (no_cache do form) recalcula tudo: não consulta
+    o cache, o índice de quase-duplicatas nem o de respostas. `batch`/`index`
+    localizam a parte no envio, para o `duplicado_de`.
+    """
+    key = _cache_key(part, observacoes) if use_cache and CACHE_ENABLED else None
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+
+    text, context, clean_text, termos, linguagem = _prepare(part)
+    tokens = clean_text.split()
+
+    if not (use_cache and DEDUP_ENABLED and len(tokens) >= DEDUP_MIN_TOKENS):
+        out, keep = await _classify_and_reply(
+            text, observacoes, clean_text, termos, linguagem, len(tokens), reuse_reply=use_cache, context=context
         )
-        resultados.append(
-            ProcessOut(
-                categoria=categoria,
-                confianca=round(float(score), 3),
-                resposta=resposta,
-                termos_relevantes=termos_final,
-                linguagem=linguagem,
-                tokens=len(clean_text.split()),
+    else:
+        # só reaproveita entre partes com as mesmas observações/config
+        fp, ctx = simhash(tokens), _cache_key("", observacoes)
+        batch = {} if batch is None else batch
+        hit = dedup_index.find(fp, ctx)
+        if hit is not None:
+            src_fp, entry = hit
+            if isinstance(entry, asyncio.Future):
+                _DEDUP_HITS_PENDING.inc()
+                entry = await asyncio.shield(entry)
+            else:
+                _DEDUP_HITS_INDEX.inc()
+            if entry is not None:
+                # origem fora deste envio: esta parte vira a referência das próximas
+                src = batch.setdefault(src_fp, index)
+                return entry.model_copy(update={
+                    "duplicado_de": src if src != index else None,
+                    "linguagem": linguagem,
+                    "tokens": len(tokens),
+                })
+            # a original falhou: calcula esta
+
+        fut = dedup_index.reserve(fp, ctx)
+        batch[fp] = index
+        out, keep = None, False
+        try:
+            out, keep = await _classify_and_reply(
+                text, observacoes, clean_text, termos, linguagem, len(tokens), context=context
             )
+        finally:
+            dedup_index.publish(fp, ctx, fut, out, keep)
+
+    if key is not None and keep:
+        await _cache_set(key, out)
+    return out
+
+async def _classify_and_reply(
+    part: str, observacoes: Optional[str], clean_text: str, termos: List[str],
+    linguagem: Optional[str], n_tokens: int, reuse_reply: bool = True, context: Optional[str] = None,
+) -> Tuple[ProcessOut, bool]:
+    """Classificação + resposta. O bool diz se o resultado pode ser reaproveitado."""
+    categoria, score, termos_rule = await classify_email(part, clean_text)
+    erro = None
+    try:
+        reply = await draft_reply(
+            truncate(part, 3500), categoria, extra_instructions=observacoes,
+            clean_text=clean_text if reuse_reply else None, context=context,
         )
+    except Exception as e:
+        # a classificação vale; só a resposta vira template
+        print("[process] falha na resposta, usando template:", repr(e))
+        reply, erro = Reply(template_reply(categoria), source="fallback"), _REPLY_FAILED
+    out = ProcessOut(
+        categoria=categoria,
+        confianca=round(float(score), 3),
+        resposta=reply.text,
+        termos_relevantes=termos_rule or termos,
+        linguagem=linguagem,
+        tokens=n_tokens,
+        resposta_origem=reply.source,
+        resposta_similaridade=reply.similarity,
+        erro=erro,
+    )
+    # template por falha da OpenAI não entra no cache (não envenena por TTL)
+    return out, reply.source != "fallback"
 
-    if not resultados:
-        raise HTTPException(400, "Não foi possível extrair texto válido.")
+async def _run_part(
+    part: str, observacoes: Optional[str], request_parts: asyncio.Semaphore, use_cache: bool = True,
+    debug: bool = False, batch: Optional[Batch] = None, index: Optional[int] = None,
+) -> ProcessOut:
+    """
+    Executa o pipeline de uma parte respeitando os limites de concorrência.
+    Falha numa parte não cancela as outras: ela volta marcada com `erro`
+    (sem categoria, se a falha veio antes da classificação).
+    `debug` anexa ao resultado os tempos (ms) das etapas desta parte.
+    """
+    with part_trace() as trace:
+        async with request_parts, _global_parts:
+            _PART_CHARS.observe(len(part))
+            try:
+                with _PARTS.track():
+                    out = await _process_part(part, observacoes, use_cache, batch, index)
+            except Exception as e:
+                print("[process] falha na parte:", repr(e))
+                out = _failed_part()
+    # cópia: o resultado pode ser o mesmo objeto do cache/dedup
+    return out.model_copy(update={"debug": trace.ms()}) if debug else out
 
-    return ProcessBatchOut(resultados=resultados)
+job_runner = JobRunner(_iter_parts, _run_part, PART_CONCURRENCY)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**result_cache.stats(), "dedup": dedup_index.stats(), "respostas": reply_index.stats()}
 
 @app.get("/")
 async def index():
@@ -0,0 +1,102 @@
+# app/matcher.py
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+# bytes latin-1 que são letra/dígito (o `\w` de bytes só cobre ASCII)
+_WORD_BYTE = bytes(1 if chr(b).isalnum() or b == 0x5F else 0 for b in range(256))
+_W = "[\\w\\xaa\\xb5\\xba\\xc0-\\xd6\\xd8-\\xf6\\xf8-\\xff]"
+
+
+def _trie_pattern(node: dict) -> str:
+    """
+    Converte uma trie de caracteres numa regex com prefixos fatorados
+    ("pode", "poderia", "poderiam" → "pode(?:ria(?:m)?)?"), tentando sempre o
+    termo mais longo primeiro; o `re` só desce pelos ramos que casam.
+    """
+    end = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return "(?:" + body + ")?" if end else body
+
+
+class KeywordMatcher:
+    """
+    Casa vários léxicos (grupos de termos, com frases de várias palavras)
+    numa única varredura do texto, respeitando limite de palavra.
+
+    - os termos viram, no import, uma única regex de bytes (latin-1) com
+      prefixos fatorados; a varredura roda inteira no `re`
+    - limite de palavra por lookaround com as letras acentuadas do latin-1
+      (o \\b de bytes as vê como separador: "dia" casaria em "média"); o \\b
+      continua na frente só para descartar rápido as posições no meio de palavra
+    - os poucos termos que começam com letra acentuada ("às", "é possível")
+      são achados por busca literal + checagem de limite
+    - a regex só consome zero caracteres (captura dentro de um lookahead),
+      então cada início de palavra é testado e termos que se sobrepõem em
+      parte ("tem como" e "como proceder" em "tem como proceder") saem todos
+    - termos contidos noutro termo casado no mesmo início ("anexo" em "anexo
+      segue") vêm de uma tabela de contenção pré-calculada
+    """
+
+    def __init__(self, groups: Dict[str, Iterable[str]]):
+        self.groups: Dict[str, List[str]] = {g: list(terms) for g, terms in groups.items()}
+        where: Dict[str, List[Tuple[str, int]]] = {}
+        for group, terms in self.groups.items():
+            for idx, term in enumerate(terms):
+                where.setdefault(" ".join(term.lower().split()), []).append((group, idx))
+
+        # termo casado → todos os (grupo, índice) que ele implica, inclusive
+        # termos menores contidos nele com limite de palavra
+        self._hits: Dict[bytes, Tuple[Tuple[str, int], ...]] = {}
+        for term in where:
+            implied: List[Tuple[str, int]] = []
+            for other, refs in where.items():
+                if other == term or re.search(r"(?<!\w)" + re.escape(other) + r"(?!\w)", term):
+                    implied.extend(refs)
+            self._hits[term.encode("latin-1")] = tuple(implied)
+
+        trie: dict = {}
+        self._literals: List[bytes] = []
+        for term in where:
+            if not term[0].isascii():
+                self._literals.append(term.encode("latin-1"))
+                continue
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        self._re = re.compile(("\\b(?<!" + _W + ")(?=(" + _trie_pattern(trie) + ")(?!" + _W + "))").encode("latin-1"))
+
+    def _find_literal(self, data: bytes, lit: bytes) -> bool:
+        i = data.find(lit)
+        while i != -1:
+            end = i + len(lit)
+            if (i == 0 or not _WORD_BYTE[data[i - 1]]) and (end == len(data) or not _WORD_BYTE[data[end]]):
+                return True
+            i = data.find(lit, i + 1)
+        return False
+
+    def scan(self, *texts: str) -> Dict[str, List[str]]:
+        """
+        Retorna {grupo: termos encontrados} (na ordem do léxico, sem repetição)
+        para a união dos textos. Os textos já devem estar normalizados
+        (minúsculas, espaços simples).
+        """
+        found: Set[Tuple[str, int]] = set()
+        hits = self._hits
+        for text in texts:
+            if not text:
+                continue
+            data = text.encode("latin-1", "replace")
+            for m in set(self._re.findall(data)):
+                found.update(hits[m])
+            for lit in self._literals:
+                if self._find_literal(data, lit):
+                    found.update(hits[lit])
+        out: Dict[str, List[str]] = {g: [] for g in self.groups}
+        for group, idx in sorted(found, key=lambda gi: gi[1]):
+            out[group].append(self.groups[group][idx])
+        return out
@@ -0,0 +1,216 @@
+# app/metrics.py
+"""
+Métricas em memória, expostas em GET /metrics no formato texto do Prometheus.
+
+Sem dependências: contadores, gauges e histogramas com rótulos fixos. Os
+"filhos" (uma combinação de rótulos) são resolvidos no import de quem mede,
+então cada observação custa um bisect + soma sob um lock (~1 µs). Os valores
+são por processo: com vários workers do uvicorn, o Prometheus soma as séries.
+"""
+from __future__ import annotations
+import threading, time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+_REGISTRY: List["_Metric"] = []
+
+# segundos: de 1 ms (heurística) a 1 min (PDF grande, LLM com retries)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# bytes/caracteres: de 1 KB a 25 MB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(8)) + (25 * 1024 * 1024,)
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            out.extend(child.render(self.name, _labels(self.labelnames, key)))  # type: ignore[attr-defined]
+        return out
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def track(self) -> "_InFlight":
+        return _InFlight(self)
+
+    def render(self, name: str, labels: str) -> List[str]:
+        return [f"{name}{labels} {_fmt(self.value)}"]
+
+
+class _InFlight:
+    __slots__ = ("_g",)
+
+    def __init__(self, gauge: _Value):
+        self._g = gauge
+
+    def __enter__(self):
+        self._g.inc()
+
+    def __exit__(self, *exc):
+        self._g.dec()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # último = acima do maior bucket
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def render(self, name: str, labels: str) -> List[str]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        base = labels[1:-1] if labels else ""
+        out, acc = [], 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            acc += n
+            le = f'le="{_fmt(bound)}"'
+            out.append(f"{name}_bucket{{{base + ',' if base else ''}{le}}} {acc}")
+        out.append(f"{name}_sum{labels} {_fmt(total)}")
+        out.append(f"{name}_count{labels} {acc}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("_h", "_t0")
+
+    def __init__(self, hist: _Histogram):
+        self._h = hist
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self._h.observe(time.perf_counter() - self._t0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _Histogram(self.buckets)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --------- métricas do serviço ---------
+STAGE_SECONDS = Histogram("autou_stage_seconds", "Duração de cada etapa do pipeline.", ["stage"])
+INPUT_BYTES = Histogram("autou_input_bytes", "Tamanho das entradas recebidas (arquivos e texto colado).",
+                        ["kind"], buckets=SIZE_BUCKETS)
+PDF_CACHE = Counter("autou_pdf_cache_total", "Consultas ao cache de texto de PDF (sha256 dos bytes).", ["result"])
+PART_CHARS = Histogram("autou_part_chars", "Tamanho do texto de cada parte extraída.", buckets=SIZE_BUCKETS)
+THREAD_QUOTED_CHARS = Counter("autou_thread_quoted_chars_total",
+                              "Caracteres de histórico citado cortados antes de classificar e montar o prompt.")
+
+LLM_ATTEMPTS = Counter("autou_llm_attempts_total", "Chamadas à OpenAI (inclui retries).", ["op"])
+LLM_RETRIES = Counter("autou_llm_retries_total", "Retries após erro da OpenAI.", ["op"])
+LLM_FAILURES = Counter("autou_llm_failures_total", "Chamadas à OpenAI que falharam de vez.", ["op"])
+LLM_REJECTED = Counter("autou_llm_rejected_total", "Chamadas à OpenAI que nem saíram (circuito aberto, fila cheia).",
+                       ["op", "reason"])
+LLM_TOKENS = Counter("autou_llm_tokens_total", "Tokens consumidos na OpenAI.", ["op", "type"])
+REPLY_FALLBACKS = Counter("autou_reply_fallbacks_total", "Respostas que caíram no template.", ["reason"])
+REPLY_REUSED = Counter("autou_reply_reused_total", "Respostas servidas do índice de respostas (sem chamar a OpenAI).")
+REPLY_FIRST_TOKEN_SECONDS = Histogram("autou_reply_first_token_seconds",
+                                      "Tempo até o primeiro texto visível da resposta em streaming (SSE).")
+REPLY_STREAM_STOPS = Counter("autou_reply_stream_stops_total",
+                             "Streams da OpenAI encerrados pelo servidor ao fechar o limite de frases.")
+CLASSIFIER_TIEBREAKS = Counter("autou_classifier_tiebreaks_total", "Desempates da zona morta (0.45–0.55) por origem.",
+                               ["origem"])
+DEDUP_HITS = Counter("autou_dedup_hits_total", "Partes resolvidas como quase-duplicata de outra.", ["tipo"])
+
+REQUESTS_IN_FLIGHT = Gauge("autou_requests_in_flight", "Requests de processamento em andamento.", ["endpoint"])
+PARTS_IN_FLIGHT = Gauge("autou_parts_in_flight", "Partes em classificação/resposta.")
+LLM_BREAKER_STATE = Gauge("autou_llm_breaker_state", "Circuit breaker da OpenAI: 0 fechado, 1 half-open, 2 aberto.")
+LLM_CONCURRENCY_LIMIT = Gauge("autou_llm_concurrency_limit", "Limite atual (adaptativo) de chamadas simultâneas à OpenAI.")
+
+
+def observe_usage(op: str, usage) -> None:
+    """Soma o `usage` de um chat completion (pode vir None em proxies/stubs)."""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(op, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(op, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
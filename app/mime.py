@@ -0,0 +1,261 @@
+# app/mime.py
+"""
+Leitura de .eml linha a linha, direto do arquivo (ou dos bytes), sem montar a
+árvore do email.parser: a memória é a das partes que serão usadas, não a da
+mensagem inteira.
+
+- cada nível de multipart/message/rfc822 é lido uma vez (encaminhamentos
+  aninhados não são revisitados)
+- corpo: só o maior text/plain e o maior text/html vistos até ali ficam em
+  memória; o texto para de ser decodificado no orçamento da parte
+- anexos: só .txt/.pdf (os que viram partes) são decodificados; os demais
+  (imagens, planilhas) são pulados sem decodificar. Anexo acima de
+  EML_PART_MAX_BYTES é descartado (PDF cortado não abre)
+- limites: EML_PART_MAX_BYTES decodificados por parte, EML_MAX_BYTES por
+  mensagem, EML_MAX_DEPTH níveis de aninhamento MIME (cada encaminhamento
+  usa dois: multipart + message/rfc822). O que passa do limite é pulado,
+  com aviso no log
+- tempo: com `time_budget`, a leitura para no prazo como se o arquivo tivesse
+  acabado; fica o texto lido até ali (anexo incompleto é descartado)
+"""
+from __future__ import annotations
+import binascii, os, time
+from dataclasses import dataclass, field
+from email import policy
+from email.message import Message
+from email.parser import BytesHeaderParser
+from typing import BinaryIO, List, Optional, Tuple
+
+EML_PART_MAX_BYTES = int(os.getenv("EML_PART_MAX_BYTES", str(10 * 1024 * 1024)))  # decodificados por parte
+EML_MAX_BYTES      = int(os.getenv("EML_MAX_BYTES", str(32 * 1024 * 1024)))       # decodificados por mensagem
+EML_MAX_DEPTH      = int(os.getenv("EML_MAX_DEPTH", "40"))                        # níveis MIME (~20 encaminhamentos)
+
+ATTACHMENT_EXTS = (".txt", ".pdf")
+_LINE_MAX = 64 * 1024          # linha maior que isso chega em pedaços
+_HEADER_MAX = 256 * 1024       # cabeçalho de uma parte (o excesso é ignorado)
+_B64_CHUNK = 64 * 1024
+_CLOCK_EVERY = 64              # linhas entre consultas ao relógio (com time_budget)
+_header_parser = BytesHeaderParser(policy=policy.default)
+
+
+@dataclass
+class MimeBody:
+    plain: str = ""                 # maior text/plain
+    html: str = ""                  # maior text/html (sem converter)
+    attachments: List[Tuple[str, bytes]] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)   # o que os limites cortaram
+
+
+class _Walker:
+    def __init__(self, fh: BinaryIO, max_chars: Optional[int], time_budget: Optional[float] = None):
+        self.fh = fh
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+        self.expired = False
+        self._reads = 0
+        self.out = MimeBody()
+        self.decoded = 0                      # bytes decodificados na mensagem
+        self.delims: List[bytes] = []         # b"--boundary" dos multipart abertos
+        self._pending: Optional[bytes] = None
+        self._bol = True                      # a próxima leitura começa uma linha
+        # text/plain: utf-8 tem até 4 bytes por caractere; o HTML precisa da parte inteira (marcação)
+        self.plain_budget = EML_PART_MAX_BYTES if max_chars is None else min(EML_PART_MAX_BYTES, max_chars * 4)
+
+    # ——— linhas ———
+    def _readline(self) -> Tuple[bytes, bool]:
+        """(linha, começa_linha); devolve a linha guardada por _unread antes."""
+        if self._pending is not None:
+            line, self._pending = self._pending, None
+            return line, True
+        if self.deadline is not None:
+            self._reads += 1
+            if self.expired or (self._reads % _CLOCK_EVERY == 0 and time.monotonic() > self.deadline):
+                if not self.expired:
+                    self.expired = True
+                    self.out.skipped.append("tempo esgotado, texto parcial")
+                return b"", self._bol
+        bol = self._bol
+        line = self.fh.readline(_LINE_MAX)
+        self._bol = line.endswith(b"\n")
+        return line, bol
+
+    def _unread(self, line: bytes) -> None:
+        self._pending = line
+
+    def _delim(self, line: bytes) -> Optional[Tuple[int, bool]]:
+        """(nível, é_fechamento) se a linha é delimitador de um multipart aberto."""
+        s = line.rstrip()
+        for i in range(len(self.delims) - 1, -1, -1):
+            d = self.delims[i]
+            if s.startswith(d):
+                rest = s[len(d):]
+                if not rest:
+                    return i, False
+                if rest == b"--":
+                    return i, True
+        return None
+
+    def _skip(self) -> Optional[Tuple[int, bool]]:
+        """Pula até o próximo delimitador (que fica para ser lido) ou o fim do arquivo."""
+        delims = self.delims
+        while True:
+            line, bol = self._readline()
+            if not line:
+                return None
+            if bol and delims and line.startswith(b"--"):
+                hit = self._delim(line)
+                if hit is not None:
+                    self._unread(line)
+                    return hit
+
+    # ——— partes ———
+    def _headers(self, default_type: str) -> Message:
+        lines, size = [], 0
+        while True:
+            line, bol = self._readline()
+            if not line:
+                break
+            if bol:
+                if line in (b"\n", b"\r\n"):
+                    break
+                if self.delims and line.startswith(b"--") and self._delim(line) is not None:
+                    self._unread(line)      # parte sem corpo
+                    break
+            if size < _HEADER_MAX:
+                lines.append(line)
+                size += len(line)
+        headers = _header_parser.parsebytes(b"".join(lines))
+        if default_type != "text/plain":
+            headers.set_default_type(default_type)
+        return headers
+
+    def part(self, depth: int = 0, default_type: str = "text/plain") -> None:
+        headers = self._headers(default_type)
+        ctype = headers.get_content_type()
+        if depth > EML_MAX_DEPTH:
+            self.out.skipped.append(f"{ctype} além de {EML_MAX_DEPTH} níveis")
+            self._skip()
+            return
+        if headers.get_content_maintype() == "multipart":
+            boundary = headers.get_boundary()
+            if boundary:
+                self._multipart(b"--" + boundary.encode("ascii", "surrogateescape"), depth,
+                                "message/rfc822" if ctype == "multipart/digest" else "text/plain")
+            else:
+                self._skip()
+            return
+        if ctype == "message/rfc822":
+            self.part(depth + 1)
+            return
+
+        disp = headers.get_content_disposition()
+        cte = str(headers.get("content-transfer-encoding", "")).strip().lower()
+        if ctype in ("text/plain", "text/html") and disp in (None, "inline", "attachment"):
+            budget = self.plain_budget if ctype == "text/plain" else EML_PART_MAX_BYTES
+            data = self._body(cte, budget, truncate=True)
+            text = _to_str(data, headers.get_content_charset())
+            # guarda só o maior de cada tipo (empate: o primeiro, como max())
+            if ctype == "text/plain":
+                if len(text) > len(self.out.plain):
+                    self.out.plain = text
+            elif len(text) > len(self.out.html):
+                self.out.html = text
+        elif disp == "attachment" and (headers.get_filename() or "").lower().endswith(ATTACHMENT_EXTS):
+            data = self._body(cte, EML_PART_MAX_BYTES, truncate=False)
+            if data is not None:
+                self.out.attachments.append((headers.get_filename(), data))
+            else:
+                self.out.skipped.append(f"anexo {headers.get_filename()} acima do limite")
+        else:
+            self._skip()
+
+    def _multipart(self, delim: bytes, depth: int, default_type: str) -> None:
+        self.delims.append(delim)
+        level = len(self.delims) - 1
+        hit = self._skip()                      # preâmbulo
+        while hit is not None and hit[0] == level:
+            self._readline()                    # consome o delimitador
+            if hit[1]:
+                del self.delims[level:]
+                self._skip()                    # epílogo, até o delimitador de fora
+                return
+            self.part(depth + 1, default_type)
+            hit = self._skip()
+        # fim do arquivo ou delimitador de um nível de fora: este multipart fecha junto
+        del self.delims[level:]
+
+    def _body(self, cte: str, budget: int, truncate: bool) -> Optional[bytes]:
+        """
+        Corpo decodificado até o próximo delimitador, com no máximo `budget`
+        bytes (e o que resta de EML_MAX_BYTES). Passou do limite: corta
+        (truncate) ou descarta e devolve None.
+        """
+        budget = min(budget, EML_MAX_BYTES - self.decoded)
+        buf = bytearray()
+        b64 = bytearray() if cte == "base64" else None
+        qp = cte == "quoted-printable"
+        held = b""      # quebra de linha antes do delimitador pertence a ele (RFC 2046)
+        over = False
+        delims = self.delims
+        while True:
+            line, bol = self._readline()
+            if not line:
+                break
+            if bol and delims and line.startswith(b"--") and self._delim(line) is not None:
+                self._unread(line)
+                break
+            if over:
+                continue
+            if b64 is not None:
+                b64 += line.translate(None, b" \t\r\n")
+                if len(b64) >= _B64_CHUNK:
+                    cut = len(b64) & ~3
+                    buf += binascii.a2b_base64(bytes(b64[:cut]))
+                    del b64[:cut]
+            else:
+                if line.endswith(b"\r\n"):
+                    content, eol = line[:-2], b"\r\n"
+                elif line.endswith(b"\n"):
+                    content, eol = line[:-1], b"\n"
+                else:
+                    content, eol = line, b""
+                if qp:
+                    if content.endswith(b"="):          # quebra suave
+                        content, eol = content[:-1], b""
+                    content = binascii.a2b_qp(content)
+                buf += held
+                buf += content
+                held = eol
+            if len(buf) > budget:
+                over = True
+        if b64:
+            try:
+                buf += binascii.a2b_base64(bytes(b64))
+            except binascii.Error:
+                pass    # final sem padding correto: fica o que já foi decodificado
+        if len(buf) > budget:
+            over = True
+        self.decoded += min(len(buf), budget)
+        if self.expired and not truncate:
+            return None     # anexo cortado pelo prazo (PDF pela metade não abre)
+        if over:
+            if not truncate:
+                return None
+            self.out.skipped.append(f"texto cortado em {budget} bytes")
+            del buf[budget:]
+        return bytes(buf)
+
+
+def _to_str(data: bytes, charset: Optional[str]) -> str:
+    try:
+        return data.decode(charset or "utf-8", errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+def walk_eml(fh: BinaryIO, max_chars: Optional[int] = None, time_budget: Optional[float] = None) -> MimeBody:
+    """Maior text/plain, maior text/html e anexos .txt/.pdf de um .eml aberto em modo binário."""
+    walker = _Walker(fh, max_chars, time_budget)
+    walker.part()
+    if walker.out.skipped:
+        print("[eml] limites:", "; ".join(walker.out.skipped[:5]))
+    return walker.out
@@ -0,0 +1,220 @@
+# app/model.py
+"""
+Classificador linear local (regressão logística em NumPy) que desempata a
+zona morta da heurística sem ida à OpenAI.
+
+- features: unigramas e bigramas do texto preprocessado, com hashing
+  (crc32, estável entre processos) em 2^bits posições, log(1+tf), norma L2
+- treino offline, a partir de pastas rotuladas:
+      python -m app.model --data data/examples [--data outra/pasta] --out app/data/classifier.npz
+- artefato .npz (pesos float32 + metadados), lido uma vez no startup
+- lote: soma dos pesos × valores por linha direto nas triplas esparsas
+  (sem a matriz densa n × dim: 64 MB em float32 para 1000 textos)
+"""
+from __future__ import annotations
+import argparse, hashlib, io, math, os, threading, zlib
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+LOCAL_MODEL_PATH  = os.getenv("LOCAL_MODEL_PATH") or str(Path(__file__).resolve().parent / "data" / "classifier.npz")
+LOCAL_MODEL_MODE  = os.getenv("LOCAL_MODEL_MODE", "tiebreak")     # tiebreak | blend | off
+LOCAL_MODEL_BLEND = float(os.getenv("LOCAL_MODEL_BLEND", "0.5"))  # peso do modelo no modo blend
+
+LABELS = ("Improdutivo", "Produtivo")   # y = índice; o score é P(Produtivo)
+_FORMAT = 1                             # muda se as features mudarem (artefato antigo é recusado)
+
+
+def _hashes(clean_text: str, ngram: int) -> List[int]:
+    toks = clean_text.encode().split()
+    # crc32 encadeado: crc32(b" b", crc32(b"a")) == crc32(b"a b"), sem montar as strings dos n-gramas
+    level = [zlib.crc32(t) for t in toks]
+    hashes = list(level)
+    spaced = [b" " + t for t in toks] if ngram > 1 else []
+    for n in range(1, ngram):
+        level = [zlib.crc32(spaced[i + n], h) for i, h in enumerate(level[:-1])]
+        hashes.extend(level)
+    return hashes
+
+
+def _sparse(clean_texts: Sequence[str], dim: int, ngram: int):
+    """(linhas, colunas, valores) da matriz de features, com norma L2 por linha."""
+    import numpy as np
+
+    per_text = [_hashes(t, ngram) for t in clean_texts]
+    lens = np.fromiter(map(len, per_text), dtype=np.int64, count=len(per_text))
+    h = np.fromiter(chain.from_iterable(per_text), dtype=np.int64, count=int(lens.sum())) & (dim - 1)
+    # tf de cada (linha, coluna) numa chamada só
+    keys, tf = np.unique(np.repeat(np.arange(len(per_text)), lens) * dim + h, return_counts=True)
+    rows, cols = np.divmod(keys, dim)
+    vals = np.log1p(tf.astype(np.float32))
+    norms = np.sqrt(np.bincount(rows, weights=vals * vals, minlength=len(per_text)))
+    vals /= np.maximum(norms, 1e-12)[rows].astype(np.float32)
+    return rows, cols, vals
+
+
+class LinearModel:
+    def __init__(self, w, b: float, bits: int, ngram: int, meta: Optional[dict] = None):
+        self.w = w
+        self.b = float(b)
+        self.bits = bits
+        self.ngram = ngram
+        self.meta = meta or {}
+        self._w_list: Optional[List[float]] = None
+
+    @property
+    def dim(self) -> int:
+        return 1 << self.bits
+
+    def score_many(self, clean_texts: Sequence[str]) -> List[float]:
+        """P(Produtivo) de cada texto preprocessado."""
+        import numpy as np
+
+        if not clean_texts:
+            return []
+        rows, cols, vals = _sparse(clean_texts, self.dim, self.ngram)
+        z = np.bincount(rows, weights=vals * self.w[cols], minlength=len(clean_texts)) + self.b
+        return (1.0 / (1.0 + np.exp(-z))).tolist()
+
+    def score(self, clean_text: str) -> float:
+        """Um texto só: mesma conta em Python puro (montar a matriz custa mais que o produto)."""
+        if self._w_list is None:
+            self._w_list = self.w.tolist()
+        w, mask = self._w_list, self.dim - 1
+        tf: dict = {}
+        for h in _hashes(clean_text, self.ngram):
+            h &= mask
+            tf[h] = tf.get(h, 0) + 1
+        z = norm = 0.0
+        for h, k in tf.items():
+            v = math.log1p(k)
+            z += w[h] * v
+            norm += v * v
+        z = (z / math.sqrt(norm) if norm else 0.0) + self.b
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def save(self, path: str) -> None:
+        import numpy as np
+
+        np.savez_compressed(
+            path, w=self.w.astype(np.float32), b=np.float32(self.b),
+            bits=self.bits, ngram=self.ngram, format=_FORMAT,
+            **{f"meta_{k}": v for k, v in self.meta.items()},
+        )
+
+    @classmethod
+    def load(cls, path) -> "LinearModel":
+        import numpy as np
+
+        with np.load(path) as z:
+            if int(z["format"]) != _FORMAT:
+                raise ValueError(f"formato {int(z['format'])} != {_FORMAT}: treine de novo")
+            meta = {k[5:]: z[k].item() for k in z.files if k.startswith("meta_")}
+            return cls(z["w"], float(z["b"]), int(z["bits"]), int(z["ngram"]), meta)
+
+
+def train(
+    clean_texts: Sequence[str], labels: Sequence[int], bits: int = 14, ngram: int = 2,
+    epochs: int = 400, lr: float = 2.0, l2: float = 1e-3,
+) -> LinearModel:
+    """Regressão logística com L2 por gradiente em lote cheio (classes balanceadas)."""
+    import numpy as np
+
+    dim = 1 << bits
+    n = len(clean_texts)
+    rows, cols, vals = _sparse(clean_texts, dim, ngram)
+    y = np.asarray(labels, dtype=np.float32)
+    pos = max(1.0, float(y.sum()))
+    sample_w = np.where(y == 1, n / (2 * pos), n / (2 * max(1.0, n - pos))).astype(np.float32)
+    w = np.zeros(dim, dtype=np.float32)
+    b = 0.0
+    for _ in range(epochs):
+        z = np.bincount(rows, weights=vals * w[cols], minlength=n) + b
+        err = (1.0 / (1.0 + np.exp(-z)) - y) * sample_w / n
+        w -= lr * (np.bincount(cols, weights=vals * err[rows], minlength=dim).astype(np.float32) + l2 * w)
+        b -= lr * float(err.sum())
+    return LinearModel(w, b, bits, ngram, {"n": n, "positivos": int(y.sum())})
+
+
+# ——— instância do processo ———
+_model: Optional[LinearModel] = None
+_model_hash = ""
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_model() -> Optional[LinearModel]:
+    """Lê o artefato uma vez (startup); sem arquivo ou com LOCAL_MODEL_MODE=off fica None."""
+    global _model, _model_hash, _loaded
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            if LOCAL_MODEL_MODE != "off" and os.path.exists(LOCAL_MODEL_PATH):
+                try:
+                    # hash dos mesmos bytes que viram o modelo (o arquivo pode ser trocado depois)
+                    raw = Path(LOCAL_MODEL_PATH).read_bytes()
+                    _model = LinearModel.load(io.BytesIO(raw))
+                    _model_hash = hashlib.sha256(raw).hexdigest()[:16]
+                except Exception as e:
+                    print("[model] artefato ignorado:", repr(e))
+    return _model
+
+
+def model_id() -> str:
+    """Identidade do que o modelo local muda na classificação (entra na chave do cache)."""
+    if get_model() is None:
+        return "sem-modelo"
+    blend = f":{LOCAL_MODEL_BLEND}" if LOCAL_MODEL_MODE == "blend" else ""
+    return f"{LOCAL_MODEL_MODE}{blend}:{_model_hash}"
+
+
+def get_model() -> Optional[LinearModel]:
+    return _model if _loaded else load_model()
+
+
+# ——— treino (CLI) ———
+def _label_of(path: Path) -> Optional[int]:
+    # pasta "produtivo"/"improdutivo" ou prefixo do arquivo (como em data/examples)
+    for name in (path.parent.name.lower(), path.name.lower()):
+        for y, label in enumerate(LABELS):
+            if name.startswith(label.lower()):
+                return y
+    return None
+
+
+def load_labelled(dirs: Iterable[str]) -> List[Tuple[str, int]]:
+    out = []
+    for d in dirs:
+        for p in sorted(Path(d).rglob("*.txt")):
+            y = _label_of(p)
+            if y is not None:
+                out.append((p.read_text(encoding="utf-8", errors="replace"), y))
+    return out
+
+
+def main() -> None:
+    from .nlp import preprocess
+
+    ap = argparse.ArgumentParser(description="Treina o classificador local (.npz)")
+    ap.add_argument("--data", action="append", help="pasta com .txt rotulados (repetível; padrão: data/examples)")
+    ap.add_argument("--out", default=LOCAL_MODEL_PATH)
+    ap.add_argument("--bits", type=int, default=14, help="dimensão do hashing = 2^bits")
+    ap.add_argument("--ngram", type=int, default=2)
+    ap.add_argument("--epochs", type=int, default=400)
+    ap.add_argument("--l2", type=float, default=1e-3)
+    args = ap.parse_args()
+
+    data = load_labelled(args.data or [str(Path(__file__).resolve().parents[1] / "data" / "examples")])
+    if not data:
+        raise SystemExit("nenhum exemplo rotulado encontrado")
+    texts = [preprocess(t)[0] for t, _ in data]
+    labels = [y for _, y in data]
+    model = train(texts, labels, bits=args.bits, ngram=args.ngram, epochs=args.epochs, l2=args.l2)
+    model.save(args.out)
+    hits = sum((p >= 0.5) == bool(y) for p, y in zip(model.score_many(texts), labels))
+    print(f"{len(data)} exemplos ({sum(labels)} produtivos), acurácia no treino {hits / len(data):.3f}, "
+          f"{os.path.getsize(args.out)} bytes → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
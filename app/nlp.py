@@ -1,225 +1,212 @@
 from __future__ import annotations
+import heapq
 import io
-import pdfplumber
 import re
-from typing import Tuple, List
-from unidecode import unidecode
-import nltk
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords', quiet=True)
-STOP_PT = set(nltk.corpus.stopwords.words('portuguese'))
+import time
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple, List, Optional, Union
+
+from . import htmltext
+from .mime import walk_eml
+from .tracing import span
+# pdfplumber, bs4 e unidecode são importados no primeiro uso (ou em warm_up)
+
+# lista de stopwords do NLTK (português), empacotada: sem download no import
+STOPWORDS_FILE = Path(__file__).resolve().parent / 'data' / 'stopwords_pt.txt'
+STOP_PT = set(STOPWORDS_FILE.read_text(encoding='utf-8').split())
 SIG_HINTS = ['att,', 'atenciosamente', 'enviado do meu iphone', 'confidencial', 'esta mensagem e seus anexos', 'este e-mail e confidencial']
 
-def extract_text_from_pdf(raw: bytes) -> str:
-    with pdfplumber.open(io.BytesIO(raw)) as pdf:
-        pages = [page.extract_text() or '' for page in pdf.pages]
-    return '\n'.join(pages)
+def _has_text_layer(page) -> bool:
+    """
+    Checagem barata (só o dicionário de recursos, sem interpretar o conteúdo):
+    página sem fonte, nem direta nem em Form XObject, é imagem/escaneada e não
+    tem texto extraível.
+    """
+    from pdfminer.pdftypes import resolve1
+    res = resolve1(page.page_obj.resources)
+    if not isinstance(res, dict):
+        return True     # estrutura inesperada: deixa o pdfplumber decidir
+    if resolve1(res.get('Font')):
+        return True
+    xobjects = resolve1(res.get('XObject'))
+    if isinstance(xobjects, dict):
+        for xobj in xobjects.values():
+            attrs = getattr(resolve1(xobj), 'attrs', {})
+            if getattr(resolve1(attrs.get('Subtype')), 'name', None) == 'Form':
+                return True
+    return False
+
+def extract_text_from_pdf(raw: Union[bytes, str], max_pages: Optional[int]=None, max_chars: Optional[int]=None, time_budget: Optional[float]=None) -> Tuple[str, bool]:
+    """
+    Extrai o texto página a página, parando (texto parcial) ao atingir
+    max_pages, max_chars ou o tempo de time_budget segundos. Páginas sem
+    camada de texto (escaneadas) são puladas sem serem interpretadas.
+    `raw` pode ser o conteúdo ou o caminho do arquivo (lido sob demanda).
+    Devolve (texto, cortado_pelo_tempo): o corte por tempo depende da carga
+    da máquina, o de páginas/caracteres não.
+    """
+    import pdfplumber
+    deadline = time.monotonic() + time_budget if time_budget else None
+    pages, total = ([], 0)
+    timed_out = False
+    with span('pdfplumber'), pdfplumber.open(io.BytesIO(raw) if isinstance(raw, bytes) else raw) as pdf:
+        for i, page in enumerate(pdf.pages):
+            if max_pages is not None and i >= max_pages:
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                timed_out = True
+                break
+            if not _has_text_layer(page):
+                continue
+            text = page.extract_text() or ''
+            pages.append(text)
+            total += len(text)
+            if max_chars is not None and total >= max_chars:
+                break
+            page.close()    # libera o layout já lido (o pdfplumber guarda por página)
+    text = '\n'.join(pages)
+    return (text[:max_chars] if max_chars is not None else text, timed_out)
 
 def detect_language(text: str) -> str:
     pt_markers = ['você', 'obrigado', 'segue', 'anexo', 'favor', 'prazo', 'atualização', 'dúvida', 'chamado']
     hits = sum((1 for w in pt_markers if w in text.lower()))
     return 'pt' if hits >= 2 else 'en'
 
+# padrões do preprocess, compilados uma vez
+_RE_FROM = re.compile('(?i)^from:.*?(?:\\n\\r?)+', re.S)
+_RE_DE = re.compile('(?i)^de:.*?(?:\\n\\r?)+', re.S)
+_RE_URL_EMAIL = re.compile('https?://\\S+|[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\\.[A-Za-z]{2,}')
+# depois do unidecode (_ASCII_FOLD) o texto é ASCII: os tokens são as sequências de [a-z0-9]
+# com 2+ caracteres (o que `\b\w{2,}\b` achava após trocar o resto por espaço)
+_RE_TOKEN = re.compile('[a-z0-9]{2,}')
+# o texto é lido em blocos deste tamanho, cortados em espaço: str.lower() de texto
+# não-ASCII reserva ~12 bytes por caractere e a lista de tokens ~9, então por bloco
+# o pico de memória não cresce com o tamanho do e-mail
+_CHUNK = 4096
+_SIG_OVERLAP = max(len(h) for h in SIG_HINTS) - 1
+
+class _AsciiFold(dict):
+    """Tabela de str.translate que aprende o unidecode (já em minúsculas) de cada caractere na 1ª vez."""
+    def __missing__(self, code: int) -> str:
+        from unidecode import unidecode
+        out = self[code] = unidecode(chr(code)).lower()
+        return out
+
+_ASCII_FOLD = _AsciiFold()
+
+def _chunks(text: str) -> Iterator[str]:
+    """Blocos de até ~_CHUNK caracteres que começam num espaço (nenhum token fica partido)."""
+    start, n = 0, len(text)
+    while n - start > _CHUNK:
+        cut = text.rfind(' ', start + 1, start + _CHUNK)
+        if cut < 0:
+            cut = text.find(' ', start + _CHUNK)
+            if cut < 0:
+                break
+        yield text[start:cut]
+        start = cut
+    yield text[start:]
+
+def _cut_signature(text: str) -> str:
+    if text.isascii():
+        low = text.lower()
+        last = {h: low.rfind(h) for h in SIG_HINTS}
+    else:
+        # última ocorrência de cada pista, bloco a bloco (sobrepostos para achar as que cruzam a borda)
+        last = dict.fromkeys(SIG_HINTS, -1)
+        for start in range(0, len(text), _CHUNK):
+            base = max(0, start - _SIG_OVERLAP)
+            low = text[base:start + _CHUNK].lower()
+            for h in SIG_HINTS:
+                i = low.rfind(h)
+                if i >= 0:
+                    last[h] = base + i
+    for h in SIG_HINTS:
+        if last[h] > 80:
+            return text[:last[h]]
+    return text
+
 def preprocess(raw: str) -> Tuple[str, List[str]]:
     """
     - normaliza, remove urls/emails, baixa ruído, tira acentos, stopwords
     - retorna texto limpo + lista de termos relevantes (top 10 por frequência)
     """
     text = raw.strip()
-    text = re.sub('(?i)^from:.*?(?:\\n\\r?)+', '', text, flags=re.S)
-    text = re.sub('(?i)^de:.*?(?:\\n\\r?)+', '', text, flags=re.S)
-    text = re.sub('https?://\\S+', ' ', text)
-    text = re.sub('[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\\.[A-Za-z]{2,}', ' ', text)
-    low = text.lower()
-    for h in SIG_HINTS:
-        if h in low:
-            idx = low.rfind(h)
-            if idx > 80:
-                text = text[:idx]
-                break
-    text = unidecode(text)
-    text = re.sub('[^a-zA-Z0-9À-ÿ\\n\\s.,;:!?-]', ' ', text)
-    text = re.sub('\\s{2,}', ' ', text).strip()
-    tokens = [t for t in re.findall('\\b\\w{2,}\\b', text.lower()) if t not in STOP_PT]
-    freq = {}
-    for t in tokens:
-        freq[t] = freq.get(t, 0) + 1
-        continue
-    termos = [w for w, _ in sorted(freq.items(), key=lambda kv: (-kv[1], kv[0]))[:10]]
-    return (' '.join(tokens), termos)
-from email import policy
-from email.message import Message
-from email.parser import BytesParser
-from bs4 import BeautifulSoup
+    text = _RE_FROM.sub('', text)
+    text = _RE_DE.sub('', text)
+    text = _RE_URL_EMAIL.sub(' ', text)
+    text = _cut_signature(text)
+    # bloco a bloco: unidecode + minúsculas num translate só, e os tokens de cada bloco
+    # são contados e juntados antes do próximo (a lista do e-mail inteiro não existe)
+    freq: Counter = Counter()
+    pieces = []
+    for chunk in _chunks(text):
+        tokens = [t for t in _RE_TOKEN.findall(chunk.translate(_ASCII_FOLD)) if t not in STOP_PT]
+        if tokens:
+            freq.update(tokens)
+            pieces.append(' '.join(tokens))
+    top = heapq.nsmallest(10, freq.items(), key=lambda kv: (-kv[1], kv[0]))
+    return (' '.join(pieces), [w for w, _ in top])
 
-def _html_to_text(html: str) -> str:
-    try:
-        soup = BeautifulSoup(html, 'html.parser')
-        for tag in soup(['script', 'style', 'noscript']):
-            tag.decompose()
-        text = soup.get_text(separator=' ', strip=True)
-        return re.sub('\\s{2,}', ' ', text).strip()
-    except Exception:
-        text = re.sub('<[^>]+>', ' ', html)
-        return re.sub('\\s{2,}', ' ', text).strip()
+def preprocess_many(texts: Iterable[str]) -> List[Tuple[str, List[str]]]:
+    """preprocess em lote; textos repetidos (comuns em threads) são processados uma vez."""
+    done: Dict[str, Tuple[str, List[str]]] = {}
+    out = []
+    for raw in texts:
+        res = done.get(raw)
+        if res is None:
+            res = done[raw] = preprocess(raw)
+        out.append((res[0], list(res[1])))
+    return out
 
-def _decode_part(part: Message) -> str:
+def _html_to_text(html: str, max_chars: Optional[int]=None) -> str:
     """
-    Decodifica conteúdo textual (plain/html) respeitando charset quando possível.
+    Parser por eventos da stdlib (app/htmltext.py), com orçamento de
+    HTML_MAX_CHARS; BeautifulSoup com HTML_EXTRACTOR=bs4 ou se ele falhar.
     """
-    try:
-        content = part.get_content()
-        if isinstance(content, bytes):
-            content = content.decode(part.get_content_charset() or 'utf-8', errors='ignore')
-        return content
-    except Exception:
-        payload = part.get_payload(decode=True) or b''
+    if htmltext.HTML_MAX_CHARS > 0:
+        max_chars = min(max_chars, htmltext.HTML_MAX_CHARS) if max_chars is not None else htmltext.HTML_MAX_CHARS
+    if htmltext.HTML_EXTRACTOR != 'bs4':
         try:
-            return payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
-        except Exception:
-            return payload.decode('latin-1', errors='ignore')
-
-def _pick_best_text(candidates_plain: list[str], candidates_html: list[str]) -> str:
-    if candidates_plain:
-        return max(candidates_plain, key=len).strip()
-    if candidates_html:
-        html = max(candidates_html, key=len)
-        return _html_to_text(html)
-    return ''
-
-def _walk_message(msg: Message) -> tuple[str, list[tuple[str, bytes]]]:
-    """
-    Percorre recursivamente a mensagem (e mensagens aninhadas) e retorna:
-    (texto_corpo, anexos_interessantes[ (filename, bytes) ])
-    """
-    plains, htmls = ([], [])
-    attachments = []
-    if msg.is_multipart():
-        for part in msg.walk():
-            ctype = part.get_content_type()
-            disp = part.get_content_disposition()
-            if ctype == 'message/rfc822':
-                try:
-                    nested = part.get_payload(0)
-                except Exception:
-                    nested = None
-                if isinstance(nested, Message):
-                    nested_text, nested_atts = _walk_message(nested)
-                    if nested_text:
-                        plains.append(nested_text)
-                    attachments.extend(nested_atts)
-            else:
-                if ctype in ('text/plain', 'text/html') and disp in (None, 'inline', 'attachment'):
-                    text = _decode_part(part)
-                    if ctype == 'text/plain':
-                        plains.append(text)
-                    else:
-                        htmls.append(text)
-                    continue
-                if disp == 'attachment':
-                    filename = part.get_filename() or ''
-                    low = filename.lower()
-                    blob = part.get_payload(decode=True) or b''
-                    if low.endswith('.txt') or low.endswith('.pdf'):
-                        attachments.append((filename, blob))
-    else:
-        ctype = msg.get_content_type()
-        if ctype in ['text/plain', 'text/html']:
-            text = _decode_part(msg)
-            if ctype == 'text/plain':
-                plains.append(text)
-            else:
-                htmls.append(text)
-    body = _pick_best_text(plains, htmls)
-    body = re.sub('\\s{2,}', ' ', body).strip()
-    return (body, attachments)
-
-def extract_text_from_eml(raw: bytes) -> tuple[str, list[tuple[str, bytes]]]:
-    """
-    Extrai texto de um .eml (inclui mensagens aninhadas).
-    Retorno: (texto, anexos_interessantes[ (filename, bytes) ])
-    """
-    msg = BytesParser(policy=policy.default).parsebytes(raw)
-    return _walk_message(msg)
-from email import policy
-from email.message import Message
-from email.parser import BytesParser
-from bs4 import BeautifulSoup
-
-def _html_to_text(html: str) -> str:
+            with span('html_parser'):
+                return htmltext.html_to_text(html, max_chars)
+        except Exception as e:
+            print('[html] parser da stdlib falhou, usando BeautifulSoup:', repr(e))
     try:
-        soup = BeautifulSoup(html, 'html.parser')
-        for tag in soup(['script', 'style', 'noscript']):
-            tag.decompose()
-        text = soup.get_text(separator=' ', strip=True)
-        return re.sub('\\s{2,}', ' ', text).strip()
+        with span('beautifulsoup'):
+            return htmltext.html_to_text_bs4(html, max_chars)
     except Exception:
         text = re.sub('<[^>]+>', ' ', html)
-        return re.sub('\\s{2,}', ' ', text).strip()
-
-def _decode_part(part: Message) -> str:
-    try:
-        content = part.get_content()
-        if isinstance(content, bytes):
-            content = content.decode(part.get_content_charset() or 'utf-8', errors='ignore')
-        return content
-    except Exception:
-        payload = part.get_payload(decode=True) or b''
-        try:
-            return payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
-        except Exception:
-            return payload.decode('latin-1', errors='ignore')
-
-def _pick_best_text(candidates_plain: list[str], candidates_html: list[str]) -> str:
-    if candidates_plain:
-        return max(candidates_plain, key=len).strip()
-    if candidates_html:
-        html = max(candidates_html, key=len)
-        return _html_to_text(html)
-    return ''
+        text = re.sub('\\s{2,}', ' ', text).strip()
+        return text[:max_chars] if max_chars is not None else text
 
-def _walk_message(msg: Message) -> tuple[str, list[tuple[str, bytes]]]:
+def extract_text_from_eml(raw: Union[bytes, str, BinaryIO], max_chars: Optional[int]=None, time_budget: Optional[float]=None) -> tuple[str, list[tuple[str, bytes]]]:
     """
-    Percorre recursivamente a mensagem (inclui message/rfc822).
-    Retorna: (texto_corpo, anexos_interessantes[ (filename, bytes) ])
+    Extrai texto de um .eml (conteúdo, caminho ou arquivo aberto; inclui
+    mensagens aninhadas): maior text/plain, ou o maior text/html convertido,
+    e os anexos .txt/.pdf. Lido em fluxo por app/mime.py, com os limites de lá;
+    com time_budget, para no prazo com o texto lido até ali.
     """
-    plains, htmls = ([], [])
-    attachments = []
-    if msg.is_multipart():
-        for part in msg.walk():
-            ctype = part.get_content_type()
-            disp = part.get_content_disposition()
-            if ctype == 'message/rfc822':
-                try:
-                    nested = part.get_payload(0)
-                except Exception:
-                    nested = None
-                if isinstance(nested, Message):
-                    nested_text, nested_atts = _walk_message(nested)
-                    if nested_text:
-                        plains.append(nested_text)
-                    attachments.extend(nested_atts)
-            elif ctype in ('text/plain', 'text/html') and disp in (None, 'inline', 'attachment'):
-                text = _decode_part(part)
-                (plains if ctype == 'text/plain' else htmls).append(text)
-            elif disp == 'attachment':
-                filename = part.get_filename() or ''
-                blob = part.get_payload(decode=True) or b''
-                low = filename.lower()
-                if low.endswith('.txt') or low.endswith('.pdf'):
-                    attachments.append((filename, blob))
+    if isinstance(raw, bytes):
+        body = walk_eml(io.BytesIO(raw), max_chars, time_budget)
+    elif isinstance(raw, str):
+        with open(raw, 'rb') as fh:
+            body = walk_eml(fh, max_chars, time_budget)
     else:
-        ctype = msg.get_content_type()
-        if ctype in ['text/plain', 'text/html']:
-            text = _decode_part(msg)
-            (plains if ctype == 'text/plain' else htmls).append(text)
-    body = _pick_best_text(plains, htmls)
-    body = re.sub('\\s{2,}', ' ', body).strip()
-    return (body, attachments)
+        body = walk_eml(raw, max_chars, time_budget)
+    if body.plain:
+        text = body.plain.strip()
+    elif body.html:
+        text = _html_to_text(body.html, max_chars)
+    else:
+        text = ''
+    text = re.sub('\\s{2,}', ' ', text).strip()
+    return (text[:max_chars] if max_chars is not None else text, body.attachments)
 
-def extract_text_from_eml(raw: bytes) -> tuple[str, list[tuple[str, bytes]]]:
-    """Extrai texto de um .eml (inclui mensagens aninhadas)."""
-    msg = BytesParser(policy=policy.default).parsebytes(raw)
-    return _walk_message(msg)
\ No newline at end of file
+def warm_up() -> None:
+    """Importa as dependências pesadas e exercita o preprocess (hook de startup)."""
+    import pdfplumber  # noqa: F401
+    from bs4 import BeautifulSoup  # noqa: F401
+    preprocess('Olá, poderia verificar o status do chamado? Atenciosamente, equipe.')
+    _html_to_text('<p>aquecimento</p>')
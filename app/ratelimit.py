@@ -0,0 +1,357 @@
+# app/ratelimit.py
+"""
+Controle do tráfego para a OpenAI, compartilhado por respond e classify.
+
+- token bucket de requests e de tokens por minuto (OPENAI_RPM, OPENAI_TPM):
+  a chamada reserva antes de sair e devolve a sobra quando vem o `usage`
+- concorrência adaptativa (AIMD): começa em OPENAI_MAX_CONCURRENCY, cai pela
+  metade a cada 429 e volta a subir de 1 em 1 a cada "janela" de sucessos
+- circuit breaker: após OPENAI_BREAKER_FAILURES falhas seguidas (429, 5xx,
+  rede) abre e as chamadas caem no template na hora; após
+  OPENAI_BREAKER_COOLDOWN segundos deixa passar uma sonda (half-open)
+- retries poucos e curtos (OPENAI_MAX_RETRIES), respeitando Retry-After; o
+  tempo total de espera (fila + backoff) fica em OPENAI_MAX_WAIT, depois
+  disso a chamada desiste e quem chamou usa o fallback
+
+O SDK da OpenAI é criado com max_retries=0: quem decide retry é este módulo.
+"""
+from __future__ import annotations
+import asyncio, os, random, time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from .metrics import LLM_ATTEMPTS, LLM_BREAKER_STATE, LLM_CONCURRENCY_LIMIT, LLM_FAILURES, LLM_REJECTED, LLM_RETRIES
+from .tracing import span
+
+T = TypeVar("T")
+
+OPENAI_RPM               = float(os.getenv("OPENAI_RPM", "500"))       # 0 = sem limite
+OPENAI_TPM               = float(os.getenv("OPENAI_TPM", "200000"))    # 0 = sem limite
+OPENAI_MAX_CONCURRENCY   = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MIN_CONCURRENCY   = int(os.getenv("OPENAI_MIN_CONCURRENCY", "1"))
+OPENAI_MAX_RETRIES       = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_WAIT          = float(os.getenv("OPENAI_MAX_WAIT", "5"))    # segundos (fila + backoff)
+OPENAI_BREAKER_FAILURES  = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN  = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30"))
+
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 4.0
+
+
+class Unavailable(Exception):
+    """A chamada nem saiu: circuito aberto ou espera acima de OPENAI_MAX_WAIT."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Interrupted(Exception):
+    """
+    Stream que falhou depois de já ter entregue texto: conta para o circuito
+    como o erro de origem (__cause__), mas não tem retry (o texto repetiria).
+    """
+
+
+def estimate_tokens(messages, max_tokens: int) -> int:
+    """~4 caracteres por token no prompt, mais o teto da resposta."""
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
+
+
+class TokenBucket:
+    """
+    Bucket com saldo que pode ficar negativo: `reserve` debita na hora e diz
+    quanto esperar até o saldo voltar a zero (fila justa, sem polling).
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self._ts = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate) if self.rate > 0 else 0.0
+
+    def reserve(self, amount: float) -> float:
+        wait = self.wait_time(amount)
+        self.tokens -= amount
+        return wait
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveLimit:
+    """
+    Semáforo com limite AIMD: +1 a cada `limit` sucessos, ÷2 em sobrecarga.
+    Cada slot leva a "época" em que foi pego: 429 de chamadas que saíram antes
+    da última redução não reduzem de novo (uma rajada = um sinal).
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.epoch = 0
+
+    async def acquire(self, timeout: float) -> int:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return self.epoch
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)   # release() já contou este slot
+        except asyncio.TimeoutError:
+            raise Unavailable("concurrency") from None
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()                    # ganhou o slot mas não vai usar
+            raise
+        return self.epoch
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def on_success(self) -> None:
+        if self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self, epoch: int) -> None:
+        if epoch == self.epoch:
+            self.limit = max(self.minimum, self.limit / 2)
+            self.epoch += 1
+
+
+class CircuitBreaker:
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failures: int, cooldown: float):
+        self.threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._set(self.HALF_OPEN)
+        if self._probing:
+            return False        # half-open: uma sonda por vez
+        self._probing = True
+        return True
+
+    def on_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            print("[OPENAI] circuito fechado, upstream respondeu")
+            self._set(self.CLOSED)
+
+    def on_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                print(f"[OPENAI] circuito aberto por {self.cooldown}s após {self.failures} falha(s)")
+            self._opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+    def on_neutral(self) -> None:
+        """Erro que não diz nada sobre a saúde do upstream (ex.: 400): libera a sonda."""
+        self._probing = False
+
+    def _set(self, state: str) -> None:
+        self.state = state
+        LLM_BREAKER_STATE.labels().set({self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state])
+
+
+def _classify_error(e: Exception) -> tuple[bool, bool, bool]:
+    """(retry?, conta como falha do upstream?, é sobrecarga/429?)"""
+    if isinstance(e, Interrupted):
+        _, unhealthy, overload = _classify_error(e.__cause__) if e.__cause__ is not None else (False, False, False)
+        return (False, unhealthy, overload)
+    from openai import APIConnectionError, APIStatusError, AuthenticationError, RateLimitError
+    if isinstance(e, RateLimitError):
+        quota = getattr(e, "code", None) == "insufficient_quota"
+        return (not quota, True, True)
+    if isinstance(e, AuthenticationError):
+        return (False, False, False)
+    if isinstance(e, APIStatusError):
+        unhealthy = e.status_code >= 500 or e.status_code == 408
+        return (unhealthy, unhealthy, False)
+    if isinstance(e, (APIConnectionError, asyncio.TimeoutError)):   # inclui APITimeoutError
+        return (True, True, False)
+    return (False, False, False)
+
+
+def _retry_after(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(response.headers[header]) * scale
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+class OpenAIGate:
+    def __init__(self):
+        self.requests = TokenBucket(OPENAI_RPM) if OPENAI_RPM > 0 else None
+        self.tokens = TokenBucket(OPENAI_TPM) if OPENAI_TPM > 0 else None
+        self.concurrency = AdaptiveLimit(OPENAI_MAX_CONCURRENCY, OPENAI_MIN_CONCURRENCY, OPENAI_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_COOLDOWN)
+        LLM_CONCURRENCY_LIMIT.labels().set(self.concurrency.limit)
+
+    async def _throttle(self, est_tokens: int, deadline: float) -> None:
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.wait_time(1)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(est_tokens))
+        if time.monotonic() + wait > deadline:
+            raise Unavailable("rate_limit")
+        if self.requests is not None:
+            self.requests.reserve(1)
+        if self.tokens is not None:
+            self.tokens.reserve(est_tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._refund(est_tokens, request=True)
+                raise
+
+    def _refund(self, est_tokens: int, request: bool) -> None:
+        """Devolve o que foi reservado e não chegou a ser usado (`request`: a chamada nem saiu)."""
+        if self.tokens is not None:
+            self.tokens.refund(est_tokens)
+        if request and self.requests is not None:
+            self.requests.refund(1)
+
+    async def call(self, op: str, fn: Callable[[], Awaitable[T]], est_tokens: int) -> T:
+        """
+        Executa `fn` (um chat completion) sob os limites. Levanta Unavailable
+        se nem chegou a chamar, ou o último erro da OpenAI. Em streaming, `fn`
+        consome o stream inteiro: o slot de concorrência fica preso até o fim.
+        Cancelada (cliente desconectou, job cancelado), devolve o que reservou
+        e, se era a sonda do half-open, libera a sonda.
+        """
+        deadline = time.monotonic() + OPENAI_MAX_WAIT
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                LLM_REJECTED.labels(op, "circuit_open").inc()
+                raise Unavailable("circuit_open")
+            # só a sonda mexe em _probing: erro neutro de outra chamada não libera uma segunda sonda
+            probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+            try:
+                with span(f"openai_{op}_fila"):
+                    await self._throttle(est_tokens, deadline)
+                    try:
+                        epoch = await self.concurrency.acquire(max(0.0, deadline - time.monotonic()))
+                    except (Unavailable, asyncio.CancelledError):
+                        self._refund(est_tokens, request=True)
+                        raise
+            except Unavailable as e:
+                if probe:
+                    self.breaker.on_neutral()
+                LLM_REJECTED.labels(op, e.reason).inc()
+                raise
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.on_neutral()
+                raise
+            if self.breaker.state == CircuitBreaker.OPEN:
+                # abriu enquanto esperava na fila
+                self.concurrency.release()
+                self._refund(est_tokens, request=True)
+                LLM_REJECTED.labels(op, "circuit_open").inc()
+                raise Unavailable("circuit_open")
+            error: Optional[Exception] = None
+            try:
+                LLM_ATTEMPTS.labels(op).inc()
+                with span(f"openai_{op}"):
+                    result = await fn()
+            except Exception as e:
+                error = e
+            except asyncio.CancelledError:
+                if probe:
+                    self.breaker.on_neutral()
+                self._refund(est_tokens, request=False)
+                raise
+            finally:
+                self.concurrency.release()
+
+            if error is not None:
+                retry, unhealthy, overload = _classify_error(error)
+                if unhealthy:
+                    self.breaker.on_failure()
+                elif probe:
+                    self.breaker.on_neutral()
+                if not isinstance(error, Interrupted):      # Interrupted: o texto que já saiu foi consumido
+                    self._refund(est_tokens, request=False)
+                if overload:
+                    self.concurrency.on_overload(epoch)
+                    LLM_CONCURRENCY_LIMIT.labels().set(self.concurrency.limit)
+                delay = max(_retry_after(error) or 0.0, min(_BACKOFF_MAX, _BACKOFF_BASE * 2 ** attempt))
+                delay *= random.uniform(0.8, 1.2)
+                if (not retry or attempt >= OPENAI_MAX_RETRIES
+                        or self.breaker.state == CircuitBreaker.OPEN
+                        or time.monotonic() + delay > deadline):
+                    print(f"[OPENAI] {op}: desistindo após {attempt + 1} tentativa(s):", repr(error))
+                    LLM_FAILURES.labels(op).inc()
+                    raise error
+                print(f"[OPENAI] {op}: erro (tentativa {attempt + 1}), nova tentativa em {delay:.2f}s:", repr(error))
+                LLM_RETRIES.labels(op).inc()
+                attempt += 1
+                with span(f"openai_{op}_backoff"):
+                    await asyncio.sleep(delay)
+                continue
+
+            self.breaker.on_success()
+            self.concurrency.on_success()
+            LLM_CONCURRENCY_LIMIT.labels().set(self.concurrency.limit)
+            usage = getattr(result, "usage", None)
+            if self.tokens is not None and usage is not None:
+                used = (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+                if used < est_tokens:
+                    self.tokens.refund(est_tokens - used)
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+openai_gate = OpenAIGate()
@@ -0,0 +1,379 @@
+# app/replies.py
+"""
+Índice de respostas já geradas: e-mails parecidos reaproveitam a resposta do
+modelo sem chamar a OpenAI.
+
+- entrada: texto preprocessado, categoria, observações e a resposta do LLM
+- busca: TF-IDF (tf log, idf suavizado) e similaridade de cosseno em NumPy;
+  só compara com entradas da mesma categoria e mesmas observações
+- acima de REPLY_REUSE_THRESHOLD a resposta guardada é devolvida
+- persistência em SQLite (REPLY_INDEX_PATH; padrão só memória, ou
+  DATA_DIR/reply_index.sqlite3), semeada na criação com
+  app/data/reply_seeds.jsonl (os e-mails de data/examples)
+- inserção incremental; acima de REPLY_INDEX_MAX_ENTRIES saem as menos usadas
+- números do e-mail viram um termo só ("#num"), e respostas pessoais não
+  entram no índice nem são reaproveitadas: as que citam um número do e-mail
+  original (protocolo, pedido) ou um nome próprio (palavra em maiúscula fora
+  do vocabulário das respostas-semente, no meio da frase ou presente no e-mail)
+
+Os vetores não são guardados: cada entrada mantém só os termos e o tf. A
+matriz esparsa (listas de postings em arrays) é remontada sob demanda depois
+de inserções, porque o idf muda com o tamanho do índice.
+"""
+from __future__ import annotations
+import json, math, os, re, sqlite3, threading, time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+REPLY_INDEX_ENABLED     = os.getenv("REPLY_INDEX_ENABLED", "1") in {"1", "true", "True"}
+_DATA_DIR               = os.getenv("DATA_DIR")
+# vazio = só memória (padrão sem DATA_DIR)
+REPLY_INDEX_PATH        = os.getenv("REPLY_INDEX_PATH", os.path.join(_DATA_DIR, "reply_index.sqlite3") if _DATA_DIR else "")
+REPLY_INDEX_MAX_ENTRIES = int(os.getenv("REPLY_INDEX_MAX_ENTRIES", "5000"))
+REPLY_REUSE_THRESHOLD   = float(os.getenv("REPLY_REUSE_THRESHOLD", "0.8"))      # cosseno 0..1
+REPLY_INDEX_MIN_TOKENS  = int(os.getenv("REPLY_INDEX_MIN_TOKENS", "4"))
+REPLY_SEED_FILE = Path(__file__).resolve().parent / "data" / "reply_seeds.jsonl"
+
+_DUPLICATE = 0.98   # acima disso uma nova resposta não entra (já há uma equivalente)
+# palavras (sem dígitos) e pontuação que encerra frase
+_RE_REPLY_WORD = re.compile(r"[^\W\d_]+|[.!?:]")
+_shared_vocab: Optional[frozenset] = None
+
+
+@dataclass
+class Match:
+    score: float
+    resposta: str
+    entry_id: int
+
+
+def _ctx(categoria: str, observacoes: Optional[str]) -> str:
+    return categoria + "\x00" + " ".join((observacoes or "").lower().split())
+
+
+def _terms_of(clean_text: str) -> List[str]:
+    # números (protocolo, pedido, CPF) viram um termo só: o pedido é o mesmo
+    return ["#num" if t.isdigit() else t for t in clean_text.split()]
+
+
+def _shared() -> frozenset:
+    """Palavras das respostas-semente (sem acento, minúsculas): o vocabulário comum a todo cliente."""
+    global _shared_vocab
+    if _shared_vocab is None:
+        from .nlp import _ASCII_FOLD
+        words = set()
+        if REPLY_SEED_FILE.exists():
+            for line in REPLY_SEED_FILE.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    resposta = json.loads(line)["resposta"]
+                    words.update(w.translate(_ASCII_FOLD) for w in _RE_REPLY_WORD.findall(resposta))
+        _shared_vocab = frozenset(words)
+    return _shared_vocab
+
+
+def _proper_nouns(resposta: str, email_terms: frozenset = frozenset()) -> List[str]:
+    """
+    Palavras em maiúscula fora do vocabulário comum que estão no meio da frase
+    ("Olá, Carlos!") ou que aparecem no e-mail (`email_terms`, já sem acento).
+    """
+    from .nlp import _ASCII_FOLD
+    shared, out = _shared(), []
+    sentence_start = True
+    for tok in _RE_REPLY_WORD.findall(resposta):
+        if tok in ".!?:":
+            sentence_start = True
+            continue
+        if tok[0].isupper():
+            folded = tok.translate(_ASCII_FOLD)
+            if folded not in shared and (not sentence_start or folded in email_terms):
+                out.append(tok)
+        sentence_start = False
+    return out
+
+
+def _personal(resposta: str, clean_text: str) -> bool:
+    """A resposta cita um número ou um nome próprio do e-mail original (não serve para outro cliente)."""
+    terms = frozenset(clean_text.split())
+    if any(n in resposta for n in terms if n.isdigit()):
+        return True
+    return bool(_proper_nouns(resposta, terms))
+
+
+def _tf(tokens: List[str]) -> Dict[str, float]:
+    return {t: 1.0 + math.log(c) for t, c in Counter(tokens).items()}
+
+
+class ReplyIndex:
+    def __init__(self, path: Optional[str] = REPLY_INDEX_PATH, max_entries: int = REPLY_INDEX_MAX_ENTRIES,
+                 seed_file: Optional[Path] = REPLY_SEED_FILE):
+        self.path = path or None
+        self.max_entries = max(1, max_entries)
+        self.seed_file = seed_file
+        self._lock = threading.Lock()        # estruturas em memória (busca e inserção)
+        self._db_lock = threading.Lock()     # conexão SQLite
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+        # entradas, em paralelo
+        self._ids: List[int] = []
+        self._ctx: List[str] = []
+        self._terms: List[Dict[int, float]] = []     # id do termo → tf
+        self._replies: List[str] = []
+        self._last_used: List[float] = []
+        self._vocab: Dict[str, int] = {}
+        self._df: List[int] = []
+        self._next_id = 1
+        self._arrays = None                          # postings; remontados quando None
+        self._weighted = None                        # tf·idf e normas; idem
+        self.reused = 0
+        self.added = 0
+
+    # ---------- carga / persistência ----------
+    def _connect(self) -> None:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies (id INTEGER PRIMARY KEY, ctx TEXT NOT NULL, "
+            "texto TEXT NOT NULL, resposta TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _seed_rows(self) -> List[Tuple[str, str, str]]:
+        from .nlp import preprocess
+        if self.seed_file is None or not self.seed_file.exists():
+            return []
+        rows = []
+        for line in self.seed_file.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                item = json.loads(line)
+                clean, _ = preprocess(item["texto"])
+                rows.append((_ctx(item["categoria"], None), clean, item["resposta"]))
+        return rows
+
+    def load(self) -> None:
+        """Carrega do SQLite (ou das sementes, se o índice estiver vazio). Idempotente."""
+        if self._loaded:
+            return
+        with self._lock, self._db_lock:
+            if self._loaded:
+                return
+            rows: List[Tuple[int, str, str, str, float]] = []
+            if self.path:
+                self._connect()
+                rows = self._conn.execute(
+                    "SELECT id, ctx, texto, resposta, last_used FROM replies ORDER BY id"
+                ).fetchall()
+            if not rows:
+                now = time.time()
+                seeds = self._seed_rows()
+                if self.path and seeds:
+                    self._conn.executemany(
+                        "INSERT INTO replies (ctx, texto, resposta, last_used) VALUES (?, ?, ?, ?)",
+                        [(c, t, r, now) for c, t, r in seeds],
+                    )
+                    self._conn.commit()
+                    rows = self._conn.execute(
+                        "SELECT id, ctx, texto, resposta, last_used FROM replies ORDER BY id"
+                    ).fetchall()
+                else:
+                    rows = [(i, c, t, r, now) for i, (c, t, r) in enumerate(seeds, 1)]
+            for entry_id, ctx, texto, resposta, last_used in rows:
+                self._append(entry_id, ctx, _terms_of(texto), resposta, last_used)
+            self._loaded = True
+
+    def _append(self, entry_id: int, ctx: str, tokens: List[str], resposta: str, last_used: float) -> None:
+        terms: Dict[int, float] = {}
+        for term, tf in _tf(tokens).items():
+            tid = self._vocab.get(term)
+            if tid is None:
+                tid = self._vocab[term] = len(self._df)
+                self._df.append(0)
+            self._df[tid] += 1
+            terms[tid] = tf
+        self._ids.append(entry_id)
+        self._ctx.append(ctx)
+        self._terms.append(terms)
+        self._replies.append(resposta)
+        self._last_used.append(last_used)
+        self._next_id = max(self._next_id, entry_id + 1)
+        if self._arrays is not None:
+            self._append_postings(terms, ctx)
+        self._weighted = None
+
+    def _evict(self) -> List[int]:
+        """Remove ~10% das entradas menos usadas de uma vez (amortiza a remontagem)."""
+        n_drop = len(self._ids) - self.max_entries + max(1, self.max_entries // 10)
+        order = sorted(range(len(self._ids)), key=self._last_used.__getitem__)
+        drop = set(order[:n_drop])
+        dropped = [self._ids[i] for i in drop]
+        for i in drop:
+            for tid in self._terms[i]:
+                self._df[tid] -= 1
+        keep = [i for i in range(len(self._ids)) if i not in drop]
+        for name in ("_ids", "_ctx", "_terms", "_replies", "_last_used"):
+            values = getattr(self, name)
+            setattr(self, name, [values[i] for i in keep])
+        # compacta o vocabulário (termos que só existiam nas entradas removidas)
+        alive = [tid for tid, df in enumerate(self._df) if df > 0]
+        remap = {old: new for new, old in enumerate(alive)}
+        self._vocab = {term: remap[tid] for term, tid in self._vocab.items() if tid in remap}
+        self._df = [self._df[tid] for tid in alive]
+        self._terms = [{remap[tid]: tf for tid, tf in terms.items()} for terms in self._terms]
+        self._arrays = self._weighted = None
+        return dropped
+
+    # ---------- busca ----------
+    def _postings(self):
+        """
+        Postings (doc, termo, tf) em arrays. Só o tf fica guardado: o idf (e
+        com ele a norma de cada documento) é aplicado na consulta, então
+        inserir é só concatenar; remontar do zero só após carga/remoção.
+        """
+        import numpy as np
+        if self._arrays is None:
+            lens = [len(t) for t in self._terms]
+            total = sum(lens)
+            self._arrays = (
+                np.repeat(np.arange(len(self._terms), dtype=np.int32), lens),
+                np.fromiter((tid for t in self._terms for tid in t), dtype=np.int32, count=total),
+                np.fromiter((w for t in self._terms for w in t.values()), dtype=np.float32, count=total),
+            )
+            self._ctx_codes: Dict[str, int] = {}
+            self._ctx_arr = np.fromiter(
+                (self._ctx_codes.setdefault(c, len(self._ctx_codes)) for c in self._ctx),
+                dtype=np.int32, count=len(self._ctx),
+            )
+        return self._arrays
+
+    def _append_postings(self, terms: Dict[int, float], ctx: str) -> None:
+        import numpy as np
+        doc_ids, term_ids, tf = self._arrays
+        doc = len(self._ids) - 1
+        self._arrays = (
+            np.concatenate([doc_ids, np.full(len(terms), doc, dtype=np.int32)]),
+            np.concatenate([term_ids, np.fromiter(terms.keys(), dtype=np.int32, count=len(terms))]),
+            np.concatenate([tf, np.fromiter(terms.values(), dtype=np.float32, count=len(terms))]),
+        )
+        code = self._ctx_codes.setdefault(ctx, len(self._ctx_codes))
+        self._ctx_arr = np.append(self._ctx_arr, np.int32(code))
+
+    def _weights(self):
+        """
+        tf·idf, normas e postings agrupados por termo (CSR), recalculados só
+        quando o índice mudou. A busca então só visita os postings dos termos
+        da consulta.
+        """
+        import numpy as np
+        if self._weighted is None:
+            doc_ids, term_ids, tf = self._postings()
+            n, vocab = len(self._ids), len(self._df)
+            idf = (np.log((1 + n) / (1 + np.asarray(self._df, dtype=np.float32))) + 1).astype(np.float32)
+            weights = tf * idf[term_ids]
+            norms = np.sqrt(np.bincount(doc_ids, weights=weights * weights, minlength=n))
+            order = np.argsort(term_ids, kind="stable")
+            indptr = np.zeros(vocab + 1, dtype=np.int64)
+            np.cumsum(np.bincount(term_ids, minlength=vocab), out=indptr[1:])
+            self._weighted = (doc_ids[order], weights[order], indptr, norms, idf)
+        return self._weighted
+
+    def search(self, tokens: List[str], categoria: str, observacoes: Optional[str], k: int = 1) -> List[Match]:
+        """
+        Top-k por cosseno entre as entradas do mesmo contexto (categoria +
+        observações). Chame com o lock (lookup/add já fazem isso).
+        """
+        import numpy as np
+        if not self._ids or not tokens:
+            return []
+        self._postings()
+        code = self._ctx_codes.get(_ctx(categoria, observacoes))
+        if code is None:
+            return []
+        docs_by_term, weights_by_term, indptr, norms, idf = self._weights()
+        n = len(self._ids)
+        unseen_idf = math.log(1 + n) + 1
+        qnorm2 = 0.0
+        slices, qweights = [], []
+        for term, qtf in _tf(tokens).items():
+            tid = self._vocab.get(term)
+            w = qtf * (float(idf[tid]) if tid is not None else unseen_idf)
+            qnorm2 += w * w
+            if tid is not None:
+                slices.append(slice(indptr[tid], indptr[tid + 1]))
+                qweights.append(w)
+        if not slices:
+            return []
+        docs = np.concatenate([docs_by_term[s] for s in slices])
+        contrib = np.concatenate([weights_by_term[s] * w for s, w in zip(slices, qweights)])
+        dots = np.bincount(docs, weights=contrib, minlength=n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where((self._ctx_arr == code) & (norms > 0), dots / (norms * math.sqrt(qnorm2)), 0.0)
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [Match(float(scores[i]), self._replies[i], self._ids[i]) for i in top if scores[i] > 0]
+
+    # ---------- API ----------
+    def lookup(self, clean_text: str, categoria: str, observacoes: Optional[str],
+               threshold: float = REPLY_REUSE_THRESHOLD) -> Optional[Match]:
+        tokens = _terms_of(clean_text)
+        if len(tokens) < REPLY_INDEX_MIN_TOKENS:
+            return None
+        self.load()
+        with self._lock:
+            best = self.search(tokens, categoria, observacoes, k=1)
+            if not best or best[0].score < threshold:
+                return None
+            # entrada gravada antes do filtro de nomes (SQLite de versões anteriores)
+            if _proper_nouns(best[0].resposta):
+                return None
+            self._last_used[self._ids.index(best[0].entry_id)] = time.time()
+        self.reused += 1
+        return best[0]
+
+    def add(self, clean_text: str, categoria: str, observacoes: Optional[str], resposta: str) -> bool:
+        """Inserção incremental (memória na hora, SQLite na mesma chamada: rode fora do event loop)."""
+        tokens = _terms_of(clean_text)
+        if len(tokens) < REPLY_INDEX_MIN_TOKENS or not resposta or _personal(resposta, clean_text):
+            return False
+        self.load()
+        with self._lock:
+            best = self.search(tokens, categoria, observacoes, k=1)
+        if best and best[0].score >= _DUPLICATE:
+            return False
+        ctx, now = _ctx(categoria, observacoes), time.time()
+        entry_id = None
+        if self._conn is not None:
+            with self._db_lock:
+                cur = self._conn.execute(
+                    "INSERT INTO replies (ctx, texto, resposta, last_used) VALUES (?, ?, ?, ?)",
+                    (ctx, " ".join(tokens), resposta, now),
+                )
+                self._conn.commit()
+                entry_id = cur.lastrowid
+        with self._lock:
+            self._append(entry_id or self._next_id, ctx, tokens, resposta, now)
+            dropped = self._evict() if len(self._ids) > self.max_entries else []
+        if dropped and self._conn is not None:
+            with self._db_lock:
+                self._conn.executemany("DELETE FROM replies WHERE id = ?", [(i,) for i in dropped])
+                self._conn.commit()
+        with self._lock:
+            self._weights()     # já deixa pronto para a próxima busca (quem chama add está fora do loop)
+        self.added += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "enabled": REPLY_INDEX_ENABLED,
+            "entries": len(self._ids),
+            "terms": len(self._vocab),
+            "reused": self.reused,
+            "added": self.added,
+            "threshold": REPLY_REUSE_THRESHOLD,
+            "sqlite": bool(self.path),
+        }
+
+
+reply_index = ReplyIndex()
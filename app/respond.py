@@ -1,22 +1,16 @@
 # app/respond.py
 from __future__ import annotations
-import os, asyncio
-from typing import Optional
+import os, asyncio, re, time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
-from openai import OpenAI, AuthenticationError, RateLimitError, APIConnectionError, APIStatusError
+from .llm import OPENAI_API_KEY, get_client
+from .metrics import REPLY_FALLBACKS, REPLY_FIRST_TOKEN_SECONDS, REPLY_REUSED, REPLY_STREAM_STOPS, observe_usage
+from .ratelimit import Interrupted, Unavailable, estimate_tokens, openai_gate
+from .replies import REPLY_INDEX_ENABLED, reply_index
+from .tracing import span
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL   = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-OPENAI_ORG     = os.getenv("OPENAI_ORG")  # opcional
-
-# NÃO crie o client aqui se a chave pode não existir.
-_client: Optional[OpenAI] = None
-
-def get_client() -> Optional[OpenAI]:
-    global _client
-    if _client is None and OPENAI_API_KEY:
-        _client = OpenAI(api_key=OPENAI_API_KEY, organization=OPENAI_ORG)
-    return _client
 
 TEMPLATE_PROD = (
     "Olá! Obrigado pela mensagem. Poderia confirmar o número do protocolo ou anexar os documentos necessários para seguirmos?"
@@ -25,6 +19,19 @@ TEMPLATE_IMP = (
     "Olá! Agradecemos a sua mensagem. Permanecemos à disposição para apoiar no que precisar."
 )
 
+REPLY_MAX_SENTENCES = 2
+REPLY_MAX_TOKENS    = 110
+
+_REUSED = REPLY_REUSED.labels()
+_FIRST_TOKEN = REPLY_FIRST_TOKEN_SECONDS.labels()
+_STREAM_STOPS = REPLY_STREAM_STOPS.labels()
+_RE_SENTENCE_END = re.compile(r"[.!?]+(?=\s|$)")     # "2.0" e "3.1" não fecham frase
+_RE_SENTENCE_TEXT = re.compile(r"[^\s.!?]")
+_PREFIX = "resposta:"
+
+def template_reply(categoria: str) -> str:
+    return TEMPLATE_PROD if categoria == "Produtivo" else TEMPLATE_IMP
+
 def _make_system_instruction(categoria: str, extra: Optional[str]) -> str:
     base = (
         "Você é um assistente de e-mails. "
@@ -37,67 +44,243 @@ def _make_system_instruction(categoria: str, extra: Optional[str]) -> str:
     base += f"Categoria: {categoria}."
     return base
 
-async def _call_openai(messages, model: str, max_tokens: int = 110, temperature: float = 0.4) -> str:
+def _limit_reply(raw: str, partial: bool = False) -> Tuple[str, bool]:
+    """
+    Tira o "Resposta:" do começo e corta depois da REPLY_MAX_SENTENCES-ésima
+    frase (. ! ou ? antes de espaço) quando já começou outra. Devolve (texto, cortou).
+    O corte preserva o prefixo: o que saiu no streaming nunca muda. Com
+    `partial` (texto ainda chegando), um começo que pode virar "Resposta:"
+    fica retido.
+    """
+    text = raw.lstrip()
+    head = text[:len(_PREFIX)].lower()
+    if head == _PREFIX:
+        text = text[len(_PREFIX):].lstrip()
+    elif partial and _PREFIX.startswith(head):
+        return "", False
+    sentences, start = 0, 0
+    for m in _RE_SENTENCE_END.finditer(text):
+        if _RE_SENTENCE_TEXT.search(text, start, m.start()):
+            sentences += 1
+        start = m.end()
+        if sentences == REPLY_MAX_SENTENCES:
+            if _RE_SENTENCE_TEXT.search(text, start):
+                return text[:start], True
+            break
+    return text, False
+
+class _SentenceLimiter:
+    """Limite de frases aplicado conforme os pedaços chegam; `feed` devolve só o texto novo."""
+
+    def __init__(self):
+        self.raw = ""
+        self.sent = 0
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        self.raw += delta
+        text, self.done = _limit_reply(self.raw, partial=True)
+        out = text[self.sent:]
+        self.sent = max(self.sent, len(text))
+        return out
+
+    def flush(self) -> str:
+        """Fim do stream: solta o que estava retido (começo que parecia "Resposta:")."""
+        text = _limit_reply(self.raw)[0]
+        out = text[self.sent:]
+        self.sent = max(self.sent, len(text))
+        return out
+
+    def text(self) -> str:
+        return _limit_reply(self.raw)[0].strip()
+
+async def _call_openai(messages, model: str, max_tokens: int = REPLY_MAX_TOKENS, temperature: float = 0.4) -> str:
+    # import tardio: o SDK da OpenAI pesa no startup e só é usado com chave
+    from openai import AuthenticationError
+
     client = get_client()
     if client is None:
         # Sem chave -> não derruba; quem chamou cai no template
         raise AuthenticationError("OPENAI_API_KEY ausente", response=None, body=None)
-    delay = 0.6
-    for attempt in range(4):
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-            return (resp.choices[0].message.content or "").strip()
-        except AuthenticationError as e:
-            print("[OPENAI] Auth error:", e)
-            raise
-        except RateLimitError as e:
-            print(f"[OPENAI] Rate/Quota (attempt {attempt+1}/4):", e)
-            if attempt == 3:
-                raise
-            await asyncio.sleep(delay); delay *= 1.8
-        except (APIConnectionError, APIStatusError) as e:
-            print(f"[OPENAI] Network/Status (attempt {attempt+1}/4):", e)
-            if attempt == 3:
-                raise
-            await asyncio.sleep(delay); delay *= 1.8
-        except Exception as e:
-            print(f"[OPENAI] Other error (attempt {attempt+1}/4):", repr(e))
-            if attempt == 3:
-                raise
-            await asyncio.sleep(delay); delay *= 1.8
-    return ""
-
-async def suggest_reply(
-    original_text: str,
-    categoria: str,
-    extra_instructions: Optional[str] = None
-) -> str:
-    if not OPENAI_API_KEY:
-        return TEMPLATE_PROD if categoria == "Produtivo" else TEMPLATE_IMP
+    # limites, retries e circuit breaker ficam no gate compartilhado com o classify
+    resp = await openai_gate.call(
+        "reply",
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        ),
+        estimate_tokens(messages, max_tokens),
+    )
+    observe_usage("reply", resp.usage)
+    return (resp.choices[0].message.content or "").strip()
 
+def _messages(original_text: str, categoria: str, extra_instructions: Optional[str], context: Optional[str]) -> List[dict]:
     system = _make_system_instruction(categoria, extra_instructions)
-    user   = f"E-mail do cliente:\n{(original_text or '').strip()}\n\nResponda apenas a mensagem ao cliente."
-
-    messages = [
+    user   = f"E-mail do cliente:\n{(original_text or '').strip()}\n\n"
+    if context:
+        user += f"Trecho das mensagens anteriores (só contexto):\n{context}\n\n"
+    user  += "Responda apenas a mensagem ao cliente."
+    return [
         {"role": "system", "content": system},
         {"role": "user",   "content": user},
     ]
 
+@dataclass
+class Reply:
+    text: str
+    source: str             # "llm" | "indice" (reaproveitada) | "template" (sem chave) | "fallback" (erro/resposta vazia)
+    similarity: Optional[float] = None      # cosseno com o e-mail de origem, quando "indice"
+
+async def draft_reply(
+    original_text: str,
+    categoria: str,
+    extra_instructions: Optional[str] = None,
+    clean_text: Optional[str] = None,
+    context: Optional[str] = None,
+) -> Reply:
+    """
+    `clean_text` (texto preprocessado) habilita o índice de respostas já geradas;
+    `context` é um trecho do histórico da thread, só para o modelo se situar.
+    """
+    with span("suggest_reply"):
+        return await _draft_reply(original_text, categoria, extra_instructions, clean_text, context)
+
+async def _draft_reply(
+    original_text: str, categoria: str, extra_instructions: Optional[str], clean_text: Optional[str],
+    context: Optional[str],
+) -> Reply:
+    if not OPENAI_API_KEY:
+        REPLY_FALLBACKS.labels("no_key").inc()
+        return Reply(template_reply(categoria), source="template")
+
+    use_index = bool(clean_text) and REPLY_INDEX_ENABLED
+    if use_index:
+        match = await asyncio.to_thread(reply_index.lookup, clean_text, categoria, extra_instructions)
+        if match is not None:
+            _REUSED.inc()
+            return Reply(match.resposta, source="indice", similarity=round(match.score, 3))
+
+    messages = _messages(original_text, categoria, extra_instructions, context)
     try:
         text = await _call_openai(messages, OPENAI_MODEL)
-        text = (text or "").strip()
-        if text.lower().startswith("resposta:"):
-            text = text.split(":", 1)[-1].strip()
-
-        parts = [p.strip() for p in text.replace("?", "?.").replace("!", "!.").split(".") if p.strip()]
-        if len(parts) > 2:
-            text = ". ".join(parts[:2]) + "."
-        return text or (TEMPLATE_PROD if categoria == "Produtivo" else TEMPLATE_IMP)
+        return await _finish(_limit_reply(text or "")[0].strip(), categoria, extra_instructions,
+                             clean_text if use_index else None)
+    except Unavailable as e:
+        # circuito aberto / fila cheia: template na hora, sem esperar retries
+        REPLY_FALLBACKS.labels(e.reason).inc()
+        return Reply(template_reply(categoria), source="fallback")
     except Exception as e:
         print("Erro OpenAI:", repr(e))
-        return TEMPLATE_PROD if categoria == "Produtivo" else TEMPLATE_IMP
+        REPLY_FALLBACKS.labels("error").inc()
+        return Reply(template_reply(categoria), source="fallback")
+
+async def _finish(text: str, categoria: str, extra_instructions: Optional[str], clean_text: Optional[str]) -> Reply:
+    """Resposta já limitada: vazia vira template; com `clean_text`, entra no índice."""
+    if not text:
+        REPLY_FALLBACKS.labels("empty").inc()
+        return Reply(template_reply(categoria), source="fallback")
+    if clean_text:
+        try:
+            await asyncio.to_thread(reply_index.add, clean_text, categoria, extra_instructions, text)
+        except Exception as e:
+            print("[replies] falha ao indexar resposta:", repr(e))
+    return Reply(text, source="llm")
+
+async def stream_reply(
+    original_text: str,
+    categoria: str,
+    extra_instructions: Optional[str] = None,
+    clean_text: Optional[str] = None,
+    context: Optional[str] = None,
+) -> AsyncIterator[Union[str, Reply]]:
+    """
+    draft_reply em pedaços: o texto sai conforme a OpenAI gera, já dentro do
+    limite de frases, e o último item é o Reply completo (que prevalece: em
+    erro no meio do stream é o template). Fechada a última frase, o stream da
+    OpenAI é encerrado sem esperar o resto da geração.
+    """
+    with span("suggest_reply"):
+        if not OPENAI_API_KEY:
+            REPLY_FALLBACKS.labels("no_key").inc()
+            yield Reply(template_reply(categoria), source="template")
+            return
+        use_index = bool(clean_text) and REPLY_INDEX_ENABLED
+        if use_index:
+            match = await asyncio.to_thread(reply_index.lookup, clean_text, categoria, extra_instructions)
+            if match is not None:
+                _REUSED.inc()
+                yield Reply(match.resposta, source="indice", similarity=round(match.score, 3))
+                return
+
+        messages = _messages(original_text, categoria, extra_instructions, context)
+        queue: asyncio.Queue = asyncio.Queue()
+        limiter = _SentenceLimiter()
+        t0 = time.perf_counter()
+
+        async def consume():
+            # uma tentativa do gate: só repete se nada tiver saído ainda
+            nonlocal limiter
+            from openai import AuthenticationError
+
+            client = get_client()
+            if client is None:
+                raise AuthenticationError("OPENAI_API_KEY ausente", response=None, body=None)
+            limiter = _SentenceLimiter()
+            stream = await client.chat.completions.create(
+                model=OPENAI_MODEL, messages=messages, max_tokens=REPLY_MAX_TOKENS, temperature=0.4,
+                stream=True, stream_options={"include_usage": True},
+            )
+            last = None
+            try:
+                async for chunk in stream:
+                    last = chunk
+                    if not chunk.choices:
+                        continue
+                    delta = limiter.feed(chunk.choices[0].delta.content or "")
+                    if delta:
+                        if limiter.sent == len(delta):     # primeiro texto visível
+                            _FIRST_TOKEN.observe(time.perf_counter() - t0)
+                        queue.put_nowait(delta)
+                    if limiter.done:
+                        _STREAM_STOPS.inc()
+                        break
+                else:
+                    rest = limiter.flush()
+                    if rest:
+                        queue.put_nowait(rest)
+            except Exception as e:
+                if limiter.sent:
+                    raise Interrupted(repr(e)) from e
+                raise
+            finally:
+                await stream.close()
+            observe_usage("reply", getattr(last, "usage", None))
+            return last
+
+        task = asyncio.create_task(openai_gate.call("reply", consume, estimate_tokens(messages, REPLY_MAX_TOKENS)))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (delta := await queue.get()) is not None:
+                yield delta
+            await task
+            reply = await _finish(limiter.text(), categoria, extra_instructions, clean_text if use_index else None)
+        except Unavailable as e:
+            REPLY_FALLBACKS.labels(e.reason).inc()
+            reply = Reply(template_reply(categoria), source="fallback")
+        except Exception as e:
+            print("Erro OpenAI (stream):", repr(e))
+            REPLY_FALLBACKS.labels("error").inc()
+            reply = Reply(template_reply(categoria), source="fallback")
+        finally:
+            # cliente desconectou: derruba a chamada (o gate libera o slot)
+            task.cancel()
+        yield reply
+
+async def suggest_reply(
+    original_text: str,
+    categoria: str,
+    extra_instructions: Optional[str] = None
+) -> str:
+    return (await draft_reply(original_text, categoria, extra_instructions)).text
@@ -4,18 +4,51 @@
 # Source timestamp: 2025-09-04 20:24:02 UTC (1757017442)
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 
 class ProcessOut(BaseModel):
-    categoria: str = Field(description='Produtivo ou Improdutivo')
-    confianca: float = Field(ge=0, le=1)
+    categoria: Optional[str] = Field(description='Produtivo ou Improdutivo (None se a parte falhou antes de ser classificada)')
+    confianca: Optional[float] = Field(ge=0, le=1)
     resposta: str
     termos_relevantes: List[str] = []
     linguagem: Optional[str] = None
     tokens: Optional[int] = None
+    resposta_origem: Optional[str] = Field(default=None, description='llm, indice (reaproveitada), template ou fallback')
+    resposta_similaridade: Optional[float] = Field(default=None, description='cosseno com o e-mail cuja resposta foi reaproveitada')
+    duplicado_de: Optional[int] = Field(default=None, description='índice, neste envio, da parte cujo resultado foi reaproveitado')
+    debug: Optional[Dict[str, float]] = Field(default=None, description='ms por etapa desta parte (só com ?debug=1)')
+    erro: Optional[str] = Field(default=None, description='o que falhou nesta parte (a classificação, se presente, é a calculada)')
 
 class ErrorOut(BaseModel):
     error: str
 
 class ProcessBatchOut(BaseModel):
-    resultados: List[ProcessOut]
\ No newline at end of file
+    resultados: List[ProcessOut]
+
+class ClassifyItemIn(BaseModel):
+    subject: Optional[str] = None
+    body: str
+    id: Optional[Union[str, int]] = Field(default=None, description='devolvido como veio, para casar o resultado')
+
+class ClassifyOut(BaseModel):
+    categoria: str = Field(description='Produtivo ou Improdutivo')
+    confianca: float = Field(ge=0, le=1)
+    termos_relevantes: List[str] = []
+    linguagem: Optional[str] = None
+    id: Optional[Union[str, int]] = None
+
+class ClassifyBatchOut(BaseModel):
+    total: int
+    resultados: List[ClassifyOut]
+
+class JobItemOut(BaseModel):
+    indice: int
+    resultado: ProcessOut
+
+class JobOut(BaseModel):
+    id: str
+    status: str = Field(description='queued, extracting, running, done, failed ou cancelled')
+    total: Optional[int] = Field(default=None, description='partes extraídas (None enquanto extrai)')
+    concluidos: int = 0
+    erro: Optional[str] = None
+    resultados: List[JobItemOut] = []
@@ -0,0 +1,126 @@
+# app/threads.py
+"""
+Segmentação de threads: separa a mensagem mais nova do histórico citado
+("Em ... escreveu:", linhas "> ", "-----Original Message-----", cabeçalhos
+De:/Enviado: do Outlook, encaminhamentos) antes de classificar e montar o
+prompt. Uma passada só: a busca para na primeira fronteira e o contexto
+lê no máximo THREAD_CONTEXT_CHARS do histórico.
+
+O "Em <data>, Fulano escreveu:" é achado pelo "escreveu:"/"wrote:": daí se
+olha para trás no máximo duas linhas procurando o "Em/On ... <dígito>" (uma
+regex com o cabeçalho inteiro voltava atrás a cada "em" seguido de número e
+ficava quadrática em textos longos). A fronteira só é procurada nos primeiros
+THREAD_SCAN_CHARS caracteres.
+"""
+from __future__ import annotations
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+THREAD_STRIP_ENABLED = os.getenv("THREAD_STRIP_ENABLED", "1") in {"1", "true", "True"}
+THREAD_CONTEXT_CHARS = int(os.getenv("THREAD_CONTEXT_CHARS", "400"))   # histórico que vai no prompt (0 = nenhum)
+THREAD_SCAN_CHARS    = int(os.getenv("THREAD_SCAN_CHARS", "200000"))  # até onde a fronteira é procurada
+
+# fronteiras entre a mensagem nova e o histórico, em ordem de aparição no texto
+_RE_BOUNDARY = re.compile(
+    r"(?im)"
+    r"(?P<wrote>(?:escreveu|wrote)\s*:)"                                          # fim de "Em <data>, Fulano escreveu:"
+    r"|^[ \t]*>"                                                                  # linha citada
+    r"|(?<!-)-{2,}\s*(?:original message|mensagem original|forwarded message|mensagem encaminhada)\s*-{2,}"
+    r"|^[ \t]*(?:de|from):[^\n]*\n(?:[^\n]*\n)?[ \t]*(?:enviad[oa]|sent|data|date):"   # bloco do Outlook
+)
+# começo do cabeçalho "Em <data>, ..." / "On <date>, ..." (o resto é conferido por posição)
+_RE_WROTE_START = re.compile(r"(?im)(?:^|(?<=\s))(?:em|on)\s")
+_RE_DIGIT = re.compile(r"\d")
+_HEADER_DATE_MAX = 120      # do "Em " até o dígito da data
+_HEADER_TAIL_MAX = 160      # do dígito até o fim da linha do cabeçalho
+_HEADER_WRAP_MAX = 80       # "escreveu:" na linha de baixo: o que vem antes dele
+# delimitador de assinatura (RFC 3676): "-- " sozinho na linha
+_RE_SIG_DELIM = re.compile(r"(?m)^-- ?$")
+_RE_SENDER_LINES = re.compile(r"(?im)(?:[ \t]*(?:de|from|para|to|cc|data|date|enviad[oa]|sent):[^\n]*\n)*")
+_RE_QUOTE_PREFIX = re.compile(r"(?m)^[ \t>]+")
+
+
+@dataclass
+class Thread:
+    newest: str         # só a mensagem mais nova (classificação, preprocess, dedup)
+    context: str        # início do histórico citado, já sem "> " (só para o prompt)
+    quoted_chars: int   # tamanho do histórico descartado
+
+
+def _header_start(text: str, floor: int, line_start: int, line_end: int) -> Optional[int]:
+    """
+    Primeiro "Em/On " da linha [line_start, line_end) com um dígito a
+    distância de cabeçalho do fim; vale também um "em" no fim da linha de cima.
+    """
+    lo = max(floor, line_start - 3, line_end - 4 - _HEADER_DATE_MAX - _HEADER_TAIL_MAX)
+    for m in _RE_WROTE_START.finditer(text, lo, line_end):
+        if m.start() < line_start and m.end() != line_start:
+            continue
+        lo = max(m.end(), line_end - _HEADER_TAIL_MAX - 1)
+        hi = min(m.end() + _HEADER_DATE_MAX + 1, line_end)
+        if lo < hi and _RE_DIGIT.search(text, lo, hi):
+            return m.start()
+    return None
+
+
+def _find_boundary(text: str, pos: int, end: int) -> Optional[Tuple[int, int]]:
+    """(início, fim) da primeira fronteira em text[pos:end]."""
+    for m in _RE_BOUNDARY.finditer(text, pos, end):
+        if m.lastgroup != "wrote":
+            return m.start(), m.end()
+        wrote = m.start()
+        line_start = text.rfind("\n", pos, wrote) + 1 or pos
+        start = None
+        if line_start > pos and wrote - line_start <= _HEADER_WRAP_MAX:
+            # cabeçalho quebrado: "Em ..., Fulano <x>\nescreveu:"
+            start = _header_start(text, pos, text.rfind("\n", pos, line_start - 1) + 1 or pos, line_start - 1)
+        if start is None:
+            start = _header_start(text, pos, line_start, wrote)
+        if start is not None:
+            return start, m.end()
+    return None
+
+
+def _after_boundary(text: str, boundary_end: int) -> int:
+    """Posição depois da linha da fronteira e dos cabeçalhos de quem enviou (o Assunto fica)."""
+    eol = text.find("\n", boundary_end)
+    return _RE_SENDER_LINES.match(text, len(text) if eol < 0 else eol + 1).end()
+
+
+def _context_of(rest: str, max_chars: int) -> str:
+    if max_chars <= 0:
+        return ""
+    # o histórico pode ser enorme: lê só uma janela do começo
+    window = rest[: max_chars * 2]
+    b = _find_boundary(window, 0, len(window))
+    if b is not None and b[0] == 0:
+        window = window[_after_boundary(window, b[1]):]
+    window = _RE_QUOTE_PREFIX.sub("", window)
+    return " ".join(window.split())[:max_chars]
+
+
+def split_thread(text: str, context_chars: int = THREAD_CONTEXT_CHARS) -> Thread:
+    """
+    Mensagem mais nova + trecho do histórico. Fronteira sem nada antes (e-mail
+    encaminhado, cabeçalho colado no topo) não conta: a busca continua depois
+    dela. Se não sobrar texto, devolve o original inteiro.
+    """
+    pos, scan_end = 0, min(len(text), THREAD_SCAN_CHARS)
+    while True:
+        b = _find_boundary(text, pos, scan_end)
+        end = b[0] if b is not None else len(text)
+        if b is None or text[pos:end].strip():
+            break
+        pos = _after_boundary(text, b[1])
+
+    newest = text[pos:end]
+    sig = _RE_SIG_DELIM.search(newest)
+    if sig is not None and newest[:sig.start()].strip():
+        newest = newest[:sig.start()]
+    newest = newest.strip()
+    if not newest:
+        return Thread(text, "", 0)
+    rest = text[end:]
+    return Thread(newest, _context_of(rest, context_chars), len(rest))
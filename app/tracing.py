@@ -0,0 +1,135 @@
+# app/tracing.py
+"""
+Spans por etapa do pipeline. `with span("preprocess"):` soma a duração no
+histograma autou_stage_seconds e, quando há trace ativo, no trace da request
+(header Server-Timing) e no da parte (campo `debug` com ?debug=1). Sem trace
+ativo o custo é o do histograma + duas leituras de ContextVar.
+
+`?profile=1` (só com TRACE_PROFILE_ENABLED=1) roda a request sob cProfile e
+grava o .prof em TRACE_PROFILE_DIR (abre com `python -m pstats` ou snakeviz).
+O cProfile vê a thread do event loop: requests concorrentes entram no perfil
+e extração em pool de processos não.
+"""
+from __future__ import annotations
+import os, tempfile, threading, time, uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from .metrics import STAGE_SECONDS
+
+TRACE_PROFILE_ENABLED = os.getenv("TRACE_PROFILE_ENABLED", "0") in {"1", "true", "True"}
+TRACE_PROFILE_DIR     = os.getenv("TRACE_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "autou-profiles")
+
+
+class Trace:
+    """Duração somada e contagem por etapa (spans podem vir de threads do pool)."""
+
+    __slots__ = ("stages", "_lock")
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def ms(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(total * 1000, 3) for name, (total, _) in self.stages.items()}
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Valor do header Server-Timing; `desc` traz quantas vezes a etapa rodou (ex.: retries)."""
+        with self._lock:
+            items = [
+                f"{name};dur={total_s * 1000:.1f}" + (f';desc="{n}x"' if n > 1 else "")
+                for name, (total_s, n) in self.stages.items()
+            ]
+        if total is not None:
+            items.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(items)
+
+
+_request_trace: ContextVar[Optional[Trace]] = ContextVar("autou_request_trace", default=None)
+_part_trace: ContextVar[Optional[Trace]] = ContextVar("autou_part_trace", default=None)
+_histograms: dict = {}
+
+
+class span:
+    """Context manager de uma etapa: histograma + traces ativos."""
+
+    __slots__ = ("name", "_t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        dt = time.perf_counter() - self._t0
+        hist = _histograms.get(self.name)
+        if hist is None:
+            hist = _histograms[self.name] = STAGE_SECONDS.labels(self.name)
+        hist.observe(dt)
+        trace = _request_trace.get()
+        if trace is not None:
+            trace.add(self.name, dt)
+        trace = _part_trace.get()
+        if trace is not None:
+            trace.add(self.name, dt)
+
+
+def start_request_trace() -> Trace:
+    """Abre o trace da request no contexto atual (middleware); tasks filhas herdam."""
+    trace = Trace()
+    _request_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def part_trace() -> Iterator[Trace]:
+    """Trace só desta parte (a task da parte tem o próprio contexto)."""
+    trace = Trace()
+    token = _part_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _part_trace.reset(token)
+
+
+# ——— perfil opt-in ———
+_profiling = threading.Lock()
+
+
+@contextmanager
+def profiled(label: str) -> Iterator[Optional[str]]:
+    """
+    cProfile em volta do bloco; devolve o caminho do .prof, ou None se outro
+    perfil já estiver rodando (um por vez: o profiler é global na thread).
+    """
+    if not _profiling.acquire(blocking=False):
+        yield None
+        return
+    import cProfile
+
+    path = os.path.join(TRACE_PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:6]}.prof")
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        try:
+            yield path
+        finally:
+            prof.disable()
+        os.makedirs(TRACE_PROFILE_DIR, exist_ok=True)
+        prof.dump_stats(path)
+        print("[profile] gravado em", path)
+    finally:
+        _profiling.release()
@@ -0,0 +1,124 @@
+# app/uploads.py
+"""
+Cópia dos uploads já recebidos pelo Starlette para a forma que a extração usa.
+
+O corpo do request é limitado na recepção (_LimitBody em app/main.py); quando
+o handler roda, o Starlette já gravou cada arquivo no SpooledTemporaryFile
+dele (memória até 1 MB, disco acima). Daqui:
+
+- arquivo pequeno (< UPLOAD_SPILL_BYTES) vira bytes em memória
+- arquivo maior é copiado, em blocos, para um arquivo temporário com nome; a
+  extração recebe o caminho (o PDF é lido sob demanda e o pool de processos
+  não copia o conteúdo). Esses arquivos passam pelo disco duas vezes (spool
+  do Starlette + esta cópia)
+- limites por arquivo: MAX_BYTES (ARCHIVE_MAX_BYTES para .mbox/.zip), e
+  MAX_REQUEST_BYTES e MAX_FILES por request
+
+Memória de pico por request ≈ MAX_FILES × (1 MB do spool + UPLOAD_SPILL_BYTES),
+mais o estado da extração em andamento.
+"""
+from __future__ import annotations
+import os, tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Union
+
+from fastapi import HTTPException, UploadFile
+
+from .archives import ARCHIVE_MAX_BYTES, is_archive
+
+MAX_BYTES          = int(os.getenv("MAX_BYTES", str(10 * 1024 * 1024)))          # por arquivo
+MAX_REQUEST_BYTES  = int(os.getenv("MAX_REQUEST_BYTES", str(25 * 1024 * 1024)))  # soma dos arquivos
+MAX_FILES          = int(os.getenv("MAX_FILES", "20"))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(64 * 1024)))
+UPLOAD_SPILL_BYTES = int(os.getenv("UPLOAD_SPILL_BYTES", str(1024 * 1024)))    # acima disso, vai para disco
+UPLOAD_TMP_DIR     = os.getenv("UPLOAD_TMP_DIR")                                # vazio = tmp do sistema
+
+# bytes em memória ou caminho de um arquivo temporário
+Source = Union[bytes, str]
+
+
+def read_source(source: Source, limit: Optional[int] = None) -> bytes:
+    if isinstance(source, bytes):
+        return source if limit is None else source[:limit]
+    with open(source, "rb") as fh:
+        return fh.read() if limit is None else fh.read(limit)
+
+
+@dataclass
+class Upload:
+    filename: str
+    source: Source
+    size: int
+
+    def read_bytes(self, limit: Optional[int] = None) -> bytes:
+        return read_source(self.source, limit)
+
+    def close(self) -> None:
+        if isinstance(self.source, str):
+            try:
+                os.unlink(self.source)
+            except OSError:
+                pass
+
+
+async def _read_one(f: UploadFile, budget: int) -> Optional[Upload]:
+    name = f.filename or ""
+    max_bytes = ARCHIVE_MAX_BYTES if is_archive(name) else MAX_BYTES
+    buf = bytearray()
+    spill = None
+    size = 0
+    try:
+        while True:
+            chunk = await f.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(400, f"Arquivo muito grande: {name}.")
+            if size > budget:
+                raise HTTPException(413, "Envio muito grande (soma dos arquivos).")
+            if spill is None and len(buf) + len(chunk) >= UPLOAD_SPILL_BYTES:
+                spill = tempfile.NamedTemporaryFile(prefix="upload-", dir=UPLOAD_TMP_DIR, delete=False)
+                spill.write(buf)
+                buf = bytearray()
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buf += chunk
+    except BaseException:
+        if spill is not None:
+            spill.close()
+            os.unlink(spill.name)
+        raise
+    if spill is not None:
+        spill.close()
+        return Upload(name, spill.name, size)
+    return Upload(name, bytes(buf), size) if size else None
+
+
+async def read_uploads(
+    email_files: Optional[List[UploadFile]],
+    max_files: int = MAX_FILES,
+    max_request_bytes: int = MAX_REQUEST_BYTES,
+) -> List[Upload]:
+    """Lê os uploads ainda dentro do handler (o FastAPI fecha os arquivos ao retornar)."""
+    uploads: List[Upload] = []
+    files = [f for f in (email_files or []) if f and getattr(f, "filename", "").strip()]
+    if len(files) > max_files:
+        raise HTTPException(400, f"Envie no máximo {max_files} arquivos.")
+    total = 0
+    try:
+        for f in files:
+            up = await _read_one(f, max_request_bytes - total)
+            if up is not None:
+                uploads.append(up)
+                total += up.size
+    except BaseException:
+        close_uploads(uploads)
+        raise
+    return uploads
+
+
+def close_uploads(uploads: List[Upload]) -> None:
+    for up in uploads:
+        up.close()
@@ -0,0 +1,49 @@
+# bench/accuracy.py
+"""
+Acurácia e matriz de confusão do classify_email sobre data/examples.
+
+    python -m bench.accuracy
+"""
+from __future__ import annotations
+import asyncio, json
+
+from .synth import load_examples
+
+LABELS = ("Produtivo", "Improdutivo")
+
+
+async def evaluate() -> dict:
+    from app.classify import classify_email
+    from app.nlp import preprocess
+
+    confusion = {real: {pred: 0 for pred in LABELS} for real in LABELS}
+    errors = []
+    examples = load_examples()
+    for i, (label, text) in enumerate(examples):
+        clean, _ = preprocess(text)
+        pred, score, _ = await classify_email(text, clean)
+        confusion[label][pred] += 1
+        if pred != label:
+            errors.append({"indice": i, "real": label, "previsto": pred, "score": score, "texto": text[:80]})
+    total = len(examples)
+    correct = sum(confusion[l][l] for l in LABELS)
+    per_class = {}
+    for l in LABELS:
+        tp = confusion[l][l]
+        fp = sum(confusion[o][l] for o in LABELS if o != l)
+        fn = sum(confusion[l][o] for o in LABELS if o != l)
+        per_class[l] = {
+            "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+            "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+        }
+    return {
+        "total": total,
+        "accuracy": round(correct / total, 4) if total else 0.0,
+        "confusion": confusion,     # confusion[real][previsto]
+        "per_class": per_class,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(asyncio.run(evaluate()), indent=2, ensure_ascii=False))
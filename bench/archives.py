@@ -0,0 +1,112 @@
+# bench/archives.py
+"""
+Leitura de .mbox/.zip (app/archives.py): mesmas mensagens que o leitor
+antigo (`for line in fh`) nas caixas sintéticas, e memória de pico
+(tracemalloc) com um zip-bomba, um .mbox de N MB de "x" sem quebra de
+linha dentro de um zip de poucos KB, em que o leitor antigo carregava a
+"linha" inteira. Com ARCHIVE_MAX_BYTES baixo, a leitura para no limite
+contando também os bytes pulados.
+
+    python -m bench.archives --bomb-mb 300 --legacy-bomb-mb 50
+"""
+from __future__ import annotations
+import argparse, io, json, sys, time, tracemalloc, zipfile
+
+from . import synth
+
+
+def legacy_iter_mbox(fh, item_max: int):
+    buf: list = []
+    size = 0
+    skipping = False
+    for line in fh:
+        if line.startswith(b"From "):
+            if buf and not skipping:
+                yield b"".join(buf)
+            buf, size, skipping = [], 0, False
+            continue
+        if skipping:
+            continue
+        size += len(line)
+        if size > item_max:
+            buf, skipping = [], True
+            continue
+        buf.append(line)
+    if buf and not skipping and any(l.strip() for l in buf):
+        yield b"".join(buf)
+
+
+def _bomb(mb: int) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("caixa.mbox", "w") as w:
+            w.write(b"From a@b Mon Jan  1 00:00:00 2024\nSubject: oi\n\n")
+            for _ in range(mb):
+                w.write(b"x" * 2**20)
+    return buf.getvalue()
+
+
+def _peak(fn) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn()
+    s = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"itens": out, "pico_mb": round(peak / 2**20, 1), "s": round(s, 2)}
+
+
+def _parity() -> dict:
+    from app import archives
+
+    long_sep = b"From " + b"a" * (3 * archives._LINE_CHUNK) + b"\nSubject: x\n\ncorpo\n"
+    cases = {
+        "mbox_500": synth.mbox_bytes(500),
+        "separador_longo": synth.mbox_bytes(3) + long_sep + synth.mbox_bytes(2),
+        "sem_from_inicial": b"Subject: solto\n\ntexto\n" + synth.mbox_bytes(2),
+        "linha_longa": synth.mbox_bytes(1) + b"y" * (5 * archives._LINE_CHUNK + 7) + b"\n" + synth.mbox_bytes(1),
+    }
+    out = {}
+    for name, raw in cases.items():
+        new = list(archives.iter_mbox(io.BytesIO(raw)))
+        old = list(legacy_iter_mbox(io.BytesIO(raw), archives.ARCHIVE_ITEM_MAX_BYTES))
+        out[name] = {"mensagens": len(new), "iguais": new == old}
+    z = synth.zip_bytes(50, mbox_messages=100)
+    out["zip_50_eml_100_mbox"] = {"itens": len(list(archives.iter_archive("c.zip", z)))}
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bomb-mb", type=int, default=300)
+    ap.add_argument("--legacy-bomb-mb", type=int, default=50, help="0 pula o leitor antigo")
+    args = ap.parse_args()
+
+    from app import archives
+
+    bomb = _bomb(args.bomb_mb)
+    report = {"paridade": _parity(), "zip_bomba": {"zip_kb": round(len(bomb) / 1024, 1), "mbox_mb": args.bomb_mb}}
+    report["zip_bomba"]["atual"] = _peak(lambda: len(list(archives.iter_archive("bomba.zip", bomb))))
+    if args.legacy_bomb_mb:
+        small = _bomb(args.legacy_bomb_mb)
+
+        def legacy():
+            with zipfile.ZipFile(io.BytesIO(small)) as zf, zf.open("caixa.mbox") as member:
+                return len(list(legacy_iter_mbox(member, archives.ARCHIVE_ITEM_MAX_BYTES)))
+        report["zip_bomba"][f"antigo_{args.legacy_bomb_mb}mb"] = _peak(legacy)
+
+    limit = archives.ARCHIVE_MAX_BYTES
+    archives.ARCHIVE_MAX_BYTES = 64 * 2**20
+    try:
+        report["limite_64mb"] = _peak(lambda: len(list(archives.iter_archive("bomba.zip", bomb))))
+    finally:
+        archives.ARCHIVE_MAX_BYTES = limit
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    ok = (all(r.get("iguais", True) for r in report["paridade"].values())
+          and report["zip_bomba"]["atual"]["pico_mb"] < 2 * archives.ARCHIVE_ITEM_MAX_BYTES / 2**20 + 8)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# bench/classify_bulk.py
+"""
+Vazão do POST /classify (só classificação, sem LLM) com dezenas de milhares
+de e-mails, em JSON e em NDJSON com stream, contra o /process um e-mail por
+request (sem chave: resposta por template, ou seja, o mínimo do caminho
+completo). Tudo num processo: e-mails/s por núcleo.
+
+    python -m bench.classify_bulk --n 20000 --baseline 300
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, time
+
+from .synth import load_examples
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabi", "Hugo"]
+
+
+def make_items(n: int, seed: int = 7) -> list[dict]:
+    """E-mails distintos (nome e código de referência trocados) a partir de data/examples."""
+    rnd = random.Random(seed)
+    examples = [(label, t.strip()) for label, t in load_examples()]
+    items = []
+    for i in range(n):
+        label, text = examples[i % len(examples)]
+        ref = "".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=6))
+        items.append({"id": i, "subject": "", "body": f"{text}\n{NOMES[i % len(NOMES)]} (ref. {ref})", "real": label})
+    return items
+
+
+def _rate(n: int, seconds: float) -> dict:
+    return {"emails": n, "wall_s": round(seconds, 3), "emails_por_s": round(n / seconds)}
+
+
+def _direct(items: list[dict]) -> dict:
+    from app.main import _classify_chunk, CLASSIFY_CHUNK
+
+    rows = [(it["subject"], it["body"], it["id"]) for it in items]
+    _classify_chunk(rows[:100])
+    t0 = time.perf_counter()
+    for i in range(0, len(rows), CLASSIFY_CHUNK):
+        _classify_chunk(rows[i:i + CLASSIFY_CHUNK])
+    return _rate(len(rows), time.perf_counter() - t0)
+
+
+async def _http(items: list[dict], baseline: int) -> dict:
+    import httpx
+    from app.main import app
+
+    out = {}
+    payload = json.dumps(items, ensure_ascii=False).encode()
+    ndjson = "\n".join(json.dumps(it, ensure_ascii=False) for it in items).encode()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        t0 = time.perf_counter()
+        r = await client.post("/classify", content=payload, headers={"content-type": "application/json"})
+        r.raise_for_status()
+        res = r.json()["resultados"]
+        out["classify_json"] = {
+            **_rate(len(items), time.perf_counter() - t0),
+            "request_mb": round(len(payload) / 2**20, 1),
+            "response_mb": round(len(r.content) / 2**20, 1),
+            "acuracia": round(sum(x["categoria"] == it["real"] for x, it in zip(res, items)) / len(items), 4),
+            "ids_em_ordem": [x["id"] for x in res] == [it["id"] for it in items],
+        }
+
+        # o ASGITransport junta o corpo inteiro: aqui só a vazão, não o tempo até a 1ª linha
+        t0 = time.perf_counter()
+        n_lines = 0
+        async with client.stream("POST", "/classify?stream=true", content=ndjson,
+                                 headers={"content-type": "application/x-ndjson"}) as r:
+            async for line in r.aiter_lines():
+                n_lines += bool(line)
+        out["classify_ndjson_stream"] = _rate(n_lines, time.perf_counter() - t0)
+
+        sample = items[:baseline]
+        t0 = time.perf_counter()
+        for it in sample:
+            r = await client.post("/process", data={"email_text": it["body"], "no_cache": "true"})
+            r.raise_for_status()
+        out["process_um_por_request"] = _rate(len(sample), time.perf_counter() - t0)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--baseline", type=int, default=300, help="e-mails enviados ao /process para comparação")
+    args = ap.parse_args()
+
+    # sem chave: o /process responde por template (sem rede), o /classify não usa LLM de qualquer jeito
+    os.environ["OPENAI_API_KEY"] = ""
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    items = make_items(args.n)
+    report = {"direto": _direct(items), **asyncio.run(_http(items, args.baseline))}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench/common.py
+from __future__ import annotations
+import os, statistics, time
+from typing import Callable, Iterable, List
+
+
+def percentiles(samples: Iterable[float]) -> dict:
+    """Resumo em ms de uma lista de durações em segundos."""
+    xs = sorted(samples)
+    if not xs:
+        return {"n": 0}
+
+    def pct(p: float) -> float:
+        k = (len(xs) - 1) * p
+        lo, hi = int(k), min(int(k) + 1, len(xs) - 1)
+        return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+    return {
+        "n": len(xs),
+        "mean_ms": round(statistics.fmean(xs) * 1000, 3),
+        "p50_ms": round(pct(0.50) * 1000, 3),
+        "p95_ms": round(pct(0.95) * 1000, 3),
+        "p99_ms": round(pct(0.99) * 1000, 3),
+        "max_ms": round(xs[-1] * 1000, 3),
+    }
+
+
+def time_call(fn: Callable[[], object], repeats: int = 5, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def use_fake_openai(base_url: str) -> None:
+    """Aponta o app para o servidor fake. Precisa rodar ANTES de importar app.*"""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = os.environ.get("BENCH_OPENAI_API_KEY", "sk-fake")
+    # reaproveitamento desligado: cada e-mail mede o caminho completo
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    os.environ.setdefault("REPLY_INDEX_ENABLED", "0")
+
+
+def fake_port() -> int:
+    """
+    Porta fixa do fake na sessão: o app lê OPENAI_BASE_URL no import, então
+    todas as suítes rodadas no mesmo processo precisam do mesmo endereço.
+    """
+    from .fake_openai import _free_port
+    if "BENCH_FAKE_PORT" not in os.environ:
+        os.environ["BENCH_FAKE_PORT"] = str(_free_port())
+    return int(os.environ["BENCH_FAKE_PORT"])
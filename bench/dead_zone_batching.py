@@ -0,0 +1,77 @@
+# bench/dead_zone_batching.py
+"""
+N e-mails de zona morta classificados em paralelo com USE_OPENAI_CLASSIFIER=1,
+contra o servidor fake: compara chamadas ao modelo e latência com lote de
+tamanho 1 (uma chamada por e-mail) e com o micro-lote configurado.
+
+    python -m bench.dead_zone_batching --n 64 --latency 0.3 --batch 16
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, statistics, time
+
+from .fake_openai import FakeOpenAI
+
+# sem termos dos léxicos e curto: score 0.5, cai na zona morta
+DEAD_ZONE = [
+    "Segue a informação combinada sobre o cliente {i}.",
+    "Passando aqui referente ao assunto {i} de ontem.",
+    "Mensagem {i} encaminhada pelo setor financeiro.",
+    "Conforme conversamos, ficou para o lote {i}, anexo depois.",
+]
+
+
+async def _run(n: int) -> list[float]:
+    from app.classify import classify_email
+    from app.llm import close_client
+
+    async def one(i: int) -> float:
+        t0 = time.perf_counter()
+        text = DEAD_ZONE[i % len(DEAD_ZONE)].format(i=i)
+        await classify_email(text, text)
+        return time.perf_counter() - t0
+
+    try:
+        return await asyncio.gather(*(one(i) for i in range(n)))
+    finally:
+        await close_client()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=64)
+    ap.add_argument("--latency", type=float, default=0.3)
+    ap.add_argument("--batch", type=int, default=16)
+    ap.add_argument("--wait-ms", type=float, default=25)
+    ap.add_argument("--concurrency", type=int, default=8, help="conexões simultâneas aceitas pelo pool HTTP")
+    args = ap.parse_args()
+
+    os.environ["USE_OPENAI_CLASSIFIER"] = "1"
+    os.environ["LOCAL_MODEL_MODE"] = "off"   # mede o desempate pelo GPT
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["OPENAI_MAX_CONNECTIONS"] = str(args.concurrency)
+    rows = []
+    with FakeOpenAI(latency=args.latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        from app import classify
+        for size in (1, args.batch):
+            classify.CLASSIFIER_BATCH_SIZE = size
+            classify.CLASSIFIER_BATCH_WAIT_MS = args.wait_ms if size > 1 else 0
+            classify._batcher = None
+            calls_before = fake.cfg.calls
+            t0 = time.perf_counter()
+            lat = asyncio.run(_run(args.n))
+            wall = time.perf_counter() - t0
+            lat.sort()
+            rows.append({
+                "batch_size": size,
+                "emails": args.n,
+                "llm_calls": fake.cfg.calls - calls_before,
+                "wall_s": round(wall, 3),
+                "p50_s": round(statistics.median(lat), 3),
+                "p95_s": round(lat[int(0.95 * (len(lat) - 1))], 3),
+            })
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
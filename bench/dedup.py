@@ -0,0 +1,108 @@
+# bench/dedup.py
+"""
+Lote com reclamações quase idênticas (mesmo texto, nome/protocolo trocados)
+contra o servidor fake, num /process só: compara chamadas ao modelo com
+DEDUP ligado e desligado e confere se cada `duplicado_de` aponta para uma
+parte do mesmo grupo que não é ela mesma reaproveitada.
+
+    python -m bench.dedup --groups 5 --copies 20 --latency 0.2 [--similarity 0.9]
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, sys, time
+
+from .fake_openai import FakeOpenAI
+
+TEMPLATES = [
+    "Prezados, sou cliente {nome} e estou sem acesso ao sistema desde ontem. Já tentei redefinir a senha "
+    "várias vezes e o erro continua aparecendo na tela de login. Preciso de suporte urgente, protocolo {i}.",
+    "Olá, gostaria de solicitar o estorno da cobrança duplicada na fatura deste mês. O valor foi debitado "
+    "duas vezes no cartão e ainda não recebi retorno do atendimento. Aguardo posição, protocolo {i}.",
+    "Bom dia, o relatório financeiro que vocês enviaram está com os valores de março divergentes do extrato "
+    "do banco. Podem verificar o fechamento e reenviar a versão corrigida? Atenciosamente, {nome}.",
+    "Boa tarde, informo que o boleto com vencimento amanhã não abre no aplicativo, aparece código inválido. "
+    "Solicito o envio de uma segunda via atualizada por e-mail para o cliente {nome}, protocolo {i}.",
+    "Equipe, o pedido de alteração cadastral feito na semana passada ainda consta como pendente no portal. "
+    "Podem confirmar se falta algum documento e qual o prazo para concluir? Obrigado, {nome}.",
+]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabi", "Hugo"]
+
+
+def _batch(groups: int, copies: int) -> list[str]:
+    # parte i é do grupo i % groups
+    return [
+        TEMPLATES[g % len(TEMPLATES)].format(nome=NOMES[c % len(NOMES)], i=1000 + c)
+        for c in range(copies) for g in range(groups)
+    ]
+
+
+MODES = (("sem_dedup", True), ("dedup", False), ("dedup_2o_lote", False))
+
+
+def _origins_ok(out: list[dict], groups: int) -> bool:
+    for i, o in enumerate(out):
+        src = o.get("duplicado_de")
+        if src is not None and (src == i or src % groups != i % groups or out[src].get("duplicado_de") is not None):
+            return False
+    return True
+
+
+async def _run(texts: list[str], groups: int, fake: FakeOpenAI) -> list[dict]:
+    import httpx
+    from app.main import app
+    from app.llm import close_client
+
+    files = [("email_files", (f"{i}.txt", t.encode(), "text/plain")) for i, t in enumerate(texts)]
+
+    async def batch(client, no_cache):
+        r = await client.post("/process", data={"no_cache": str(no_cache).lower()}, files=files)
+        r.raise_for_status()
+        return r.json()["resultados"]
+
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+            for label, no_cache in MODES:
+                calls_before = fake.cfg.calls
+                t0 = time.perf_counter()
+                out = await batch(client, no_cache)
+                rows.append({
+                    "modo": label,
+                    "emails": len(texts),
+                    "llm_calls": fake.cfg.calls - calls_before,
+                    "duplicados": sum(1 for o in out if o.get("duplicado_de") is not None),
+                    "origens_corretas": _origins_ok(out, groups),
+                    "wall_s": round(time.perf_counter() - t0, 3),
+                })
+    finally:
+        await close_client()
+    return rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--groups", type=int, default=5)
+    ap.add_argument("--copies", type=int, default=20)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--similarity", type=float, default=None, help="DEDUP_SIMILARITY (padrão: o do app)")
+    args = ap.parse_args()
+
+    if args.similarity is not None:
+        os.environ["DEDUP_SIMILARITY"] = str(args.similarity)
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    os.environ.setdefault("REPLY_INDEX_ENABLED", "0")
+    os.environ.setdefault("MAX_FILES", str(args.groups * args.copies))
+    texts = _batch(args.groups, args.copies)
+    with FakeOpenAI(latency=args.latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        from app.dedup import dedup_index
+        rows = asyncio.run(_run(texts, args.groups, fake))
+        rows.append({"indice": dedup_index.stats()})
+    print(json.dumps(rows, indent=2, ensure_ascii=False))
+    return 0 if all(r.get("origens_corretas", True) for r in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
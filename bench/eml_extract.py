@@ -0,0 +1,228 @@
+# bench/eml_extract.py
+"""
+.eml grandes e aninhados: leitor em fluxo (app/mime.py) × o caminho antigo
+(email.parser monta a árvore inteira e _walk_message percorre tudo).
+
+- paridade: mesmo corpo nos .eml sintéticos e em casos de borda
+  (quoted-printable, base64 latin-1, alternative, digest, multipart sem
+  fechamento); anexos sem a duplicata do caminho antigo (msg.walk() já entra
+  nos message/rfc822 e a recursão explícita contava de novo: um PDF no nível
+  k aparecia 2^(k-1) vezes). Diferença esperada: encaminhamentos só em HTML
+  — antes o texto convertido das mensagens internas contava como text/plain
+  e vencia o HTML de fora; agora vale o maior HTML entre todos os níveis
+- cadeia de encaminhamentos de ~50 MB (PDF + imagem em cada nível), lida do
+  disco: pico de memória (tracemalloc) e tempo, antes × depois
+- limites: profundidade, anexo acima de EML_PART_MAX_BYTES, texto cortado,
+  prazo (time_budget) esgotado no meio do corpo: texto parcial, anexo que
+  não chegou a ser lido descartado
+
+    python -m bench.eml_extract --depth 6 --blob-kb 6000
+"""
+from __future__ import annotations
+import argparse, json, os, re, sys, tempfile, time, tracemalloc
+from email import policy
+from email.message import EmailMessage, Message
+from email.parser import BytesParser
+from typing import Optional
+
+from . import synth
+
+
+# ——— caminho antigo (cópia de app/nlp.py antes do leitor em fluxo) ———
+def _decode_part(part: Message) -> str:
+    try:
+        content = part.get_content()
+        if isinstance(content, bytes):
+            content = content.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+        return content
+    except Exception:
+        payload = part.get_payload(decode=True) or b''
+        try:
+            return payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+        except Exception:
+            return payload.decode('latin-1', errors='ignore')
+
+
+def _walk_message(msg: Message, max_chars: Optional[int] = None):
+    from app.nlp import _html_to_text
+
+    plains, htmls, attachments = [], [], []
+    if msg.is_multipart():
+        for part in msg.walk():
+            ctype = part.get_content_type()
+            disp = part.get_content_disposition()
+            if ctype == 'message/rfc822':
+                try:
+                    nested = part.get_payload(0)
+                except Exception:
+                    nested = None
+                if isinstance(nested, Message):
+                    nested_text, nested_atts = _walk_message(nested, max_chars)
+                    if nested_text:
+                        plains.append(nested_text)
+                    attachments.extend(nested_atts)
+            elif ctype in ('text/plain', 'text/html') and disp in (None, 'inline', 'attachment'):
+                (plains if ctype == 'text/plain' else htmls).append(_decode_part(part))
+            elif disp == 'attachment':
+                filename = part.get_filename() or ''
+                blob = part.get_payload(decode=True) or b''
+                if filename.lower().endswith(('.txt', '.pdf')):
+                    attachments.append((filename, blob))
+    elif msg.get_content_type() in ('text/plain', 'text/html'):
+        (plains if msg.get_content_type() == 'text/plain' else htmls).append(_decode_part(msg))
+    if plains:
+        body = max(plains, key=len).strip()
+    elif htmls:
+        body = _html_to_text(max(htmls, key=len), max_chars)
+    else:
+        body = ''
+    return re.sub('\\s{2,}', ' ', body).strip(), attachments
+
+
+def legacy_extract(raw, max_chars: Optional[int] = None):
+    if isinstance(raw, bytes):
+        msg = BytesParser(policy=policy.default).parsebytes(raw)
+    else:
+        with open(raw, 'rb') as fh:
+            msg = BytesParser(policy=policy.default).parse(fh)
+    body, attachments = _walk_message(msg, max_chars)
+    return (body[:max_chars] if max_chars is not None else body, attachments)
+
+
+# ——— casos ———
+def _edge_cases() -> dict:
+    out = {}
+    qp = EmailMessage()
+    qp["Subject"] = "qp"
+    qp.set_content("Olá, poderia verificar o chamado nº 123? " * 20 + "\nlinha final = sem quebra suave", cte="quoted-printable")
+    out["quoted_printable"] = bytes(qp)
+
+    latin = EmailMessage()
+    latin.set_content("Atualização da solicitação: ação necessária até sexta.".encode("latin-1"),
+                      maintype="text", subtype="plain", cte="base64", params={"charset": "latin-1"})
+    out["base64_latin1"] = bytes(latin)
+
+    alt = EmailMessage()
+    alt.set_content("Versão texto: segue o relatório do mês.")
+    alt.add_alternative("<p>Versão <b>HTML</b>: segue o relatório do mês, com mais detalhes.</p>", subtype="html")
+    out["alternative"] = bytes(alt)
+
+    html_only = EmailMessage()
+    html_only.set_content("<html><body><p>Só HTML &mdash; sem parte texto</p><script>x()</script></body></html>", subtype="html")
+    out["so_html"] = bytes(html_only)
+
+    digest = (b'Content-Type: multipart/digest; boundary="dg"\r\n\r\n--dg\r\n\r\n'
+              b'Subject: um\r\n\r\nPrimeira mensagem do resumo.\r\n--dg\r\n\r\n'
+              b'Subject: dois\r\n\r\nSegunda mensagem do resumo, mais longa que a primeira.\r\n--dg--\r\n')
+    out["digest"] = digest
+
+    truncated = bytes(synth.eml_bytes(depth=2, pdf_pages=1))
+    out["sem_fechamento"] = truncated[:truncated.rindex(b"--")]
+    return out
+
+
+def _parity() -> dict:
+    from app.nlp import extract_text_from_eml
+
+    cases, expected = {}, set()
+    for d in (1, 3, 10):
+        for html in (False, True):
+            for pdf in (0, 2):
+                name = f"depth{d}{'_html' if html else ''}{'_pdf' if pdf else ''}"
+                cases[name] = synth.eml_bytes(depth=d, html=html, pdf_pages=pdf)
+                if html and d > 1:
+                    expected.add(name)
+    cases.update(_edge_cases())
+    rows, diffs, changed = {}, {}, {}
+    for name, raw in cases.items():
+        old_body, old_atts = legacy_extract(raw)
+        new_body, new_atts = extract_text_from_eml(raw)
+        if old_body != new_body:
+            (changed if name in expected else diffs)[name] = {"antes": old_body[:120], "depois": new_body[:120]}
+        rows[name] = {
+            "anexos_antes": len(old_atts),
+            "anexos_depois": len(new_atts),
+            # sem a duplicata, os anexos são os mesmos (e os mesmos bytes)
+            "anexos_iguais": sorted(dict(old_atts).items()) == sorted(new_atts),
+        }
+    return {"casos": len(cases), "corpo_igual": len(cases) - len(diffs) - len(changed), "diferencas": diffs,
+            "diferencas_esperadas_so_html": changed, "anexos": rows}
+
+
+def _measure(fn) -> dict:
+    t0 = time.perf_counter()
+    body, atts = fn()
+    wall = time.perf_counter() - t0
+    tracemalloc.start()     # segunda passada só para o pico (o tracemalloc deixa tudo mais lento)
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"pico_mb": round(peak / 2**20, 1), "s": round(wall, 3), "corpo_chars": len(body),
+            "anexos": len(atts), "anexos_mb": round(sum(len(b) for _, b in atts) / 2**20, 2)}
+
+
+def _big_chain(depth: int, blob_kb: int, pdf_pages: int) -> dict:
+    from app.nlp import extract_text_from_eml
+
+    raw = synth.eml_bytes(depth=depth, pdf_pages=pdf_pages, blob_kb=blob_kb)
+    with tempfile.NamedTemporaryFile(suffix=".eml", delete=False) as fh:
+        fh.write(raw)
+        path = fh.name
+    size_mb = round(len(raw) / 2**20, 1)
+    del raw
+    try:
+        return {
+            "eml_mb": size_mb,
+            "antes_do_disco": _measure(lambda: legacy_extract(path, 200000)),
+            "depois_do_disco": _measure(lambda: extract_text_from_eml(path, 200000)),
+        }
+    finally:
+        os.unlink(path)
+
+
+def _limits() -> dict:
+    from app import mime
+    from app.nlp import extract_text_from_eml
+
+    out = {}
+    deep = synth.eml_bytes(depth=30, pdf_pages=1)
+    out["profundidade_30_anexos"] = len(extract_text_from_eml(deep)[1])      # EML_MAX_DEPTH=40: 20 níveis
+
+    raw = synth.eml_bytes(depth=2, pdf_pages=40)
+    part_max = mime.EML_PART_MAX_BYTES
+    mime.EML_PART_MAX_BYTES = 100 * 1024
+    try:
+        out["anexo_acima_do_limite_anexos"] = len(extract_text_from_eml(raw)[1])
+        big = EmailMessage()
+        big.set_content("linha de texto longo " * 50000)
+        out["texto_cortado_chars"] = len(extract_text_from_eml(bytes(big))[0])
+    finally:
+        mime.EML_PART_MAX_BYTES = part_max
+
+    slow = EmailMessage()
+    slow.set_content("linha de texto longo\n" * 200000)
+    slow.add_attachment(b"%PDF-1.4 anexo", maintype="application", subtype="pdf", filename="a.pdf")
+    full_text, full_atts = extract_text_from_eml(bytes(slow))
+    text, atts = extract_text_from_eml(bytes(slow), time_budget=1e-6)
+    out["prazo_esgotado"] = {"chars_sem_prazo": len(full_text), "anexos_sem_prazo": len(full_atts),
+                             "chars_parcial": len(text), "anexos_parcial": len(atts)}
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--depth", type=int, default=6)
+    ap.add_argument("--blob-kb", type=int, default=6000, help="imagem anexa por nível (não usada)")
+    ap.add_argument("--pdf-pages", type=int, default=20)
+    args = ap.parse_args()
+
+    report = {"paridade": _parity(), "limites": _limits(), "cadeia": _big_chain(args.depth, args.blob_kb, args.pdf_pages)}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if not report["paridade"]["diferencas"] and all(
+        r["anexos_iguais"] for r in report["paridade"]["anexos"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
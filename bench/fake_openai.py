@@ -0,0 +1,209 @@
+# bench/fake_openai.py
+"""
+Servidor local compatível com /v1/chat/completions da OpenAI, para benchmarks.
+Latência e falhas são configuráveis em tempo de execução via FakeConfig.
+Com `"stream": true` responde em SSE (chunks `chat.completion.chunk`, `usage`
+no fim com stream_options.include_usage, `[DONE]`): o primeiro token sai após
+`latency` e cada um dos seguintes após `token_latency`.
+
+Uso:
+    with FakeOpenAI(latency=0.5) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+"""
+from __future__ import annotations
+import asyncio, json, random, re, socket, threading, time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+REPLY = "Olá! Recebemos sua mensagem. Vamos verificar e retornamos em breve."
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.2          # segundos por chamada
+    prompt_latency: float = 0.0   # segundos extras por 1k tokens de prompt (prefill)
+    token_latency: float = 0.0    # segundos por token gerado (com e sem stream)
+    jitter: float = 0.0           # ± segundos aleatórios
+    fail_rate: float = 0.0        # 0..1 de respostas com erro
+    fail_status: int = 500        # status usado nas falhas (429, 500, 503...)
+    concurrency_limit: int = 0    # >0: 429 acima de N chamadas simultâneas (cota de concorrência)
+    retry_after: Optional[float] = None  # header Retry-After nas falhas
+    reply: str = REPLY
+    batch_drop: int = 0           # omite os últimos N itens de respostas em lote
+    calls: int = 0
+    prompt_tokens: int = 0        # soma do `usage.prompt_tokens` devolvido
+    failures: int = 0
+    streams: int = 0              # respostas em SSE
+    streams_cut: int = 0          # SSE encerrados pelo cliente antes do fim
+    tokens_sent: int = 0          # tokens entregues (em SSE, só os que chegaram a sair)
+    in_flight: int = 0
+    max_in_flight: int = 0
+    started: List[float] = field(default_factory=list)
+
+
+def _completion(content: str, prompt_chars: int) -> dict:
+    prompt_tokens = max(1, prompt_chars // 4)
+    completion_tokens = max(1, len(content) // 4)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _tokens(content: str) -> List[str]:
+    # ~uma palavra por token, com o espaço na frente (como os tokens da OpenAI)
+    return re.findall(r"\s*\S+", content) or [content]
+
+
+def _chunk(delta: dict, finish_reason: Optional[str] = None, usage: Optional[dict] = None) -> str:
+    body = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    if usage:
+        body["usage"] = usage
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+def _label(text: str) -> str:
+    text = text.lower()
+    return "Produtivo" if ("?" in text or "status" in text or "anexo" in text) else "Improdutivo"
+
+
+def _answer(cfg: FakeConfig, body: dict) -> str:
+    messages = body.get("messages") or []
+    system = (messages[0].get("content") or "") if messages else ""
+    if "classificador" in system.lower():
+        user = messages[-1].get("content") or ""
+        items = re.split(r"^### E-mail \d+\n", user, flags=re.M)[1:]
+        if items:
+            keep = items[: max(0, len(items) - cfg.batch_drop)]
+            return "\n".join(f"{i}: {_label(t)}" for i, t in enumerate(keep, 1))
+        return _label(user)
+    return cfg.reply
+
+
+def _failure(cfg: FakeConfig, status: int) -> JSONResponse:
+    cfg.failures += 1
+    headers = {"retry-after": str(cfg.retry_after)} if cfg.retry_after is not None else None
+    return JSONResponse(
+        {"error": {"message": "fake failure", "type": "fake", "code": status}},
+        status_code=status, headers=headers,
+    )
+
+
+def make_app(cfg: FakeConfig) -> Starlette:
+    async def stream(out: dict, include_usage: bool):
+        content = out["choices"][0]["message"]["content"]
+        done = False
+        try:
+            yield _chunk({"role": "assistant", "content": ""})
+            for i, tok in enumerate(_tokens(content)):
+                if i and cfg.token_latency:
+                    await asyncio.sleep(cfg.token_latency)
+                cfg.tokens_sent += 1
+                yield _chunk({"content": tok})
+            yield _chunk({}, "stop")
+            if include_usage:
+                yield _chunk({}, usage=out["usage"])
+            yield "data: [DONE]\n\n"
+            done = True
+        finally:
+            cfg.streams_cut += not done
+            cfg.in_flight -= 1
+
+    async def chat(request: Request):
+        body = await request.json()
+        cfg.calls += 1
+        cfg.in_flight += 1
+        cfg.max_in_flight = max(cfg.max_in_flight, cfg.in_flight)
+        cfg.started.append(time.perf_counter())
+        streaming = False
+        try:
+            prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages") or [])
+            delay = cfg.latency + (random.uniform(-cfg.jitter, cfg.jitter) if cfg.jitter else 0.0)
+            delay += cfg.prompt_latency * prompt_chars / 4000
+            if cfg.concurrency_limit and cfg.in_flight > cfg.concurrency_limit:
+                return _failure(cfg, 429)
+            await asyncio.sleep(max(0.0, delay))
+            if cfg.fail_rate and random.random() < cfg.fail_rate:
+                return _failure(cfg, cfg.fail_status)
+            out = _completion(_answer(cfg, body), prompt_chars)
+            cfg.prompt_tokens += out["usage"]["prompt_tokens"]
+            if body.get("stream"):
+                cfg.streams += 1
+                streaming = True    # in_flight cai quando o stream termina
+                include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+                return StreamingResponse(stream(out, include_usage), media_type="text/event-stream")
+            n_tokens = len(_tokens(out["choices"][0]["message"]["content"]))
+            if cfg.token_latency:
+                await asyncio.sleep(cfg.token_latency * (n_tokens - 1))
+            cfg.tokens_sent += n_tokens
+            return JSONResponse(out)
+        finally:
+            if not streaming:
+                cfg.in_flight -= 1
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat, methods=["POST"])])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeOpenAI:
+    """Sobe o servidor fake numa thread (uvicorn) e derruba ao sair do with."""
+
+    def __init__(self, port: Optional[int] = None, **cfg):
+        self.cfg = FakeConfig(**cfg)
+        self.port = port or _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/v1"
+        config = uvicorn.Config(make_app(self.cfg), host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "FakeOpenAI":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Servidor fake da OpenAI")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--fail-status", type=int, default=500)
+    args = ap.parse_args()
+    cfg = FakeConfig(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status)
+    print(json.dumps({"base_url": f"http://127.0.0.1:{args.port}/v1"}))
+    uvicorn.run(make_app(cfg), host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,160 @@
+# bench/heuristic.py
+"""
+Compara a contagem de sinais antiga (um `in` por termo do léxico, sobre
+`text + " " + subj` refeito a cada grupo) com o KeywordMatcher (uma varredura),
+em corpos longos no estilo thread. Tempos em µs por e-mail.
+
+Paridade: o KeywordMatcher contra uma referência em str com
+`(?<!\w)termo(?!\w)` por termo, em casos de borda (termo no fim de palavra
+acentuada: "média", "mídia", "custódia" não têm "dia") e em textos
+aleatórios montados com os termos dos léxicos colados a letras acentuadas.
+
+    python -m bench.heuristic --repeats 20 --sizes 1 10 50 200
+"""
+from __future__ import annotations
+import argparse, json, random, re, time
+from pathlib import Path
+from typing import List
+
+from app import classify
+from app.classify import _MATCHER, _heuristic_score, score_many, _normalize
+
+EXAMPLES = Path(__file__).resolve().parents[1] / "data" / "examples"
+
+_LEGACY_GROUPS = [
+    (classify.ASK_TOKENS, 1.2, True), (classify.ACTION_TOKENS, 1.2, True),
+    (classify.STATUS_TOKENS, 1.0, True), (classify.ATTACH_TOKENS, 1.0, True),
+    (classify.DATE_TOKENS, 0.6, True),
+    (classify.GREET_TOKENS, 1.0, False), (classify.SMALL_TALK_TOKENS, 1.0, False),
+]
+
+
+def legacy_counts(subject: str, body: str) -> float:
+    """Só a parte de contagem da versão antiga: `t in text + " " + subj` por termo."""
+    subj = _normalize(subject or "")
+    text = _normalize(body or "")
+    pos = neg = 0.0
+    for tokens, w, positive in _LEGACY_GROUPS:
+        where = text + " " + subj
+        c = sum(1 for t in tokens if t in where)
+        if positive:
+            pos += c * w
+        else:
+            neg += c * w
+    return pos - neg
+
+
+def matcher_counts(subject: str, body: str) -> dict:
+    """Mesma etapa com o KeywordMatcher: uma varredura para todos os léxicos."""
+    return _MATCHER.scan(_normalize(body or ""), _normalize(subject or ""))
+
+
+BORDER_CASES = [
+    "segue a média de vendas da mídia digital",
+    "custódia do documento e tragédia evitada",
+    "hoje é dia de pagamento, bom dia",
+    "às vezes é possível resolver no mesmo dia",
+    "céas, ótimo obrigado",
+    "anexoé prazoà status_ 2ºdia",
+    "tem como proceder",
+    "tem como faço",
+]
+
+
+def _overlap_texts() -> List[str]:
+    """Frases em que o fim de um termo é o começo de outro ("tem como" + "como proceder")."""
+    terms = {" ".join(t.lower().split()) for terms in _MATCHER.groups.values() for t in terms}
+    words = [t.split() for t in sorted(terms)]
+    out = []
+    for a in words:
+        for b in words:
+            for k in range(1, min(len(a), len(b))):
+                if a[-k:] == b[:k]:
+                    out.append(" ".join(a + b[k:]))
+    return out
+
+
+def reference_scan(*texts: str) -> dict:
+    """Um re.search em str por termo, com o \\w Unicode: o resultado esperado."""
+    out = {}
+    for group, terms in _MATCHER.groups.items():
+        out[group] = [t for t in terms if any(
+            re.search(r"(?<!\w)" + re.escape(" ".join(t.lower().split())) + r"(?!\w)", x) for x in texts if x)]
+    return out
+
+
+def _random_texts(n: int, seed: int = 3) -> List[str]:
+    rnd = random.Random(seed)
+    terms = [t for terms in _MATCHER.groups.values() for t in terms]
+    glue = ["", "", " ", " ", ", ", "é", "á", "ã", "ç", "ó", "ê", "í", "ú", "à", "º", "x", "_", "1", "-"]
+    out = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rnd.randint(1, 6)):
+            parts.append(rnd.choice(glue) + rnd.choice(terms).lower() + rnd.choice(glue))
+        out.append(_normalize(" ".join(parts)))
+    return out
+
+
+def parity(n: int) -> dict:
+    overlaps = _overlap_texts()
+    cases = [_normalize(t) for t in BORDER_CASES] + overlaps + _random_texts(n)
+    bad = [t for t in cases if _MATCHER.scan(t) != reference_scan(t)]
+    return {
+        "amostras": len(cases),
+        "sobrepostos": len(overlaps),
+        "divergencias": len(bad),
+        "exemplos": bad[:5],
+        "media_midia": _MATCHER.scan(_normalize(BORDER_CASES[0]))["date"],
+    }
+
+
+def thread_body(n_messages: int) -> str:
+    """Monta um corpo de thread com n mensagens citadas (exemplos reais repetidos)."""
+    samples = [p.read_text(encoding="utf-8") for p in sorted(EXAMPLES.glob("*.txt"))]
+    out: List[str] = []
+    for i in range(n_messages):
+        out.append(samples[i % len(samples)])
+        out.append(f"\nEm seg., 1 de jan. de 2024 às 10:{i % 60:02d}, Fulano <fulano@exemplo.com> escreveu:\n> ")
+    return "".join(out)
+
+
+def _bench(fn, items, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(items)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeats", type=int, default=20)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 200])
+    ap.add_argument("--batch", type=int, default=50)
+    ap.add_argument("--parity", type=int, default=20000, help="textos aleatórios na conferência de paridade")
+    args = ap.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        body = thread_body(size)
+        items = [("Re: status do protocolo", body)] * args.batch
+        legacy = _bench(lambda xs: [legacy_counts(s, b) for s, b in xs], items, args.repeats)
+        scan = _bench(lambda xs: [matcher_counts(s, b) for s, b in xs], items, args.repeats)
+        single = _bench(lambda xs: [_heuristic_score(s, b) for s, b in xs], items, args.repeats)
+        bulk = _bench(score_many, items, args.repeats)
+        rows.append({
+            "messages_in_thread": size,
+            "body_chars": len(body),
+            "legacy_counts_us": round(legacy / args.batch * 1e6, 1),
+            "matcher_counts_us": round(scan / args.batch * 1e6, 1),
+            "counts_speedup": round(legacy / scan, 2),
+            "heuristic_score_us": round(single / args.batch * 1e6, 1),
+            "score_many_us": round(bulk / args.batch * 1e6, 1),
+        })
+    print(json.dumps({"paridade": parity(args.parity), "tempo": rows}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
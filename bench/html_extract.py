@@ -0,0 +1,127 @@
+# bench/html_extract.py
+"""
+HTML → texto: parser por eventos (app/htmltext.py) × BeautifulSoup.
+
+- paridade: saída idêntica nos corpos HTML dos .eml sintéticos, nos
+  exemplos de data/examples em HTML, nas newsletters e em casos de borda
+  (entidades, comentários, tags sem fechamento, CDATA, noscript). Única
+  diferença conhecida, fora da conferência: entidade desconhecida ("&foo;")
+  fica como está, como no navegador; o BeautifulSoup perde o ";"
+- oculto: o preheader com display:none some só no parser novo
+- tempo por corpo (ms) e pico de memória (tracemalloc) em newsletters de
+  dezenas a centenas de KB, com e sem o orçamento de HTML_MAX_CHARS
+
+    python -m bench.html_extract --blocks 25 100 400 --repeats 5
+"""
+from __future__ import annotations
+import argparse, json, sys, tracemalloc
+from email import policy
+from email.parser import BytesParser
+
+from . import synth
+from .common import time_call
+
+EDGE_CASES = [
+    "<p>a<p>b<div>c</span>d</div>",
+    "<p>caf&eacute; &amp; p&atilde;o &#8212; &#x41; &amp sem ponto e vírgula &lt;tag&gt;</p>",
+    "<div>antes<!-- comentário --> depois<br/>quebra<br>linha</div>",
+    "<div>x<![CDATA[ dado cru ]]>y</div>",
+    "<noscript><p>ative o JavaScript</p></noscript><p>texto</p>",
+    "<table><tr><td>  um\n\n  dois\t\ttrês  </td><td>\n</td></tr></table>",
+    "<p>aberta sem fechar<div><span>dentro",
+    "<script>if (a < b) { x = '</p>'; }</script><style>p{}</style>visível",
+    "<?xml version='1.0'?><!DOCTYPE html><html><body>só o corpo</body></html>",
+    "<p>linha com nbsp</p><pre>  pre\n   formatado  </pre>",
+    "texto solto sem tags",
+    "",
+]
+
+
+def _samples() -> dict:
+    out = {}
+    for depth in (1, 3):
+        msg = BytesParser(policy=policy.default).parsebytes(synth.eml_bytes(depth=depth, html=True))
+        for i, part in enumerate(p for p in msg.walk() if p.get_content_type() == "text/html"):
+            out[f"eml_depth{depth}_{i}"] = part.get_content()
+    for i, (_, text) in enumerate(synth.load_examples()):
+        body = "".join(f"<p>{line}</p>" for line in text.split("\n"))
+        out[f"exemplo_{i:02d}"] = f"<html><body><div style=\"font-family:Arial\">{body}</div></body></html>"
+    for blocks in (1, 10, 50):
+        out[f"newsletter_{blocks}"] = synth.marketing_html(blocks)
+    for i, html in enumerate(EDGE_CASES):
+        out[f"borda_{i:02d}"] = html
+    return out
+
+
+def _parity() -> dict:
+    from app.htmltext import html_to_text, html_to_text_bs4
+
+    samples = _samples()
+    diffs = {k: {"stdlib": html_to_text(h)[:200], "bs4": html_to_text_bs4(h)[:200]}
+             for k, h in samples.items() if html_to_text(h) != html_to_text_bs4(h)}
+    full = synth.marketing_html(20)
+    budget = html_to_text(full, 1000)
+    return {
+        "amostras": len(samples),
+        "identicas": len(samples) - len(diffs),
+        "diferencas": diffs,
+        "orcamento_e_prefixo": budget == html_to_text_bs4(full)[:1000] and len(budget) == 1000,
+    }
+
+
+def _hidden() -> dict:
+    from app.htmltext import html_to_text, html_to_text_bs4
+
+    html = synth.marketing_html(3, preheader="PREHEADER oculto")
+    return {
+        "bs4_inclui_preheader": "PREHEADER" in html_to_text_bs4(html),
+        "stdlib_inclui_preheader": "PREHEADER" in html_to_text(html),
+        "hidden_attr": html_to_text('<p>a</p><div hidden><p>b</p></div><p>c</p>'),
+        "visibility": html_to_text('<td>a<span style="VISIBILITY: hidden">b<b>x</b></td>c'),
+    }
+
+
+def _peak_kb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def _speed(blocks: list[int], repeats: int, budget: int) -> dict:
+    from app.htmltext import html_to_text, html_to_text_bs4
+
+    out = {}
+    for n in blocks:
+        html = synth.marketing_html(n, preheader="Só hoje")
+        row = {"html_kb": round(len(html) / 1024, 1), "texto_chars": len(html_to_text(html))}
+        for label, fn in (
+            ("bs4", lambda: html_to_text_bs4(html)),
+            ("stdlib", lambda: html_to_text(html)),
+            (f"stdlib_orcamento_{budget}", lambda: html_to_text(html, budget)),
+        ):
+            row[label] = {**time_call(fn, repeats), "pico_kb": _peak_kb(fn)}
+        row["aceleracao"] = round(row["bs4"]["mean_ms"] / row["stdlib"]["mean_ms"], 2)
+        row["aceleracao_com_orcamento"] = round(row["bs4"]["mean_ms"] / row[f"stdlib_orcamento_{budget}"]["mean_ms"], 2)
+        out[f"newsletter_{n}_blocos"] = row
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--blocks", type=int, nargs="+", default=[25, 100, 400])
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--budget", type=int, default=20000, help="caracteres (como HTML_MAX_CHARS)")
+    args = ap.parse_args()
+
+    report = {"paridade": _parity(), "oculto": _hidden(), "tempo": _speed(args.blocks, args.repeats, args.budget)}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    ok = not report["paridade"]["diferencas"] and report["paridade"]["orcamento_e_prefixo"] \
+        and not report["oculto"]["stdlib_inclui_preheader"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# bench/llm_concurrency.py
+"""
+Dispara N chamadas concorrentes de suggest_reply contra o servidor fake lento
+e verifica se as latências se sobrepõem (event loop não bloqueado).
+
+    python -m bench.llm_concurrency --n 10 --latency 0.5
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, sys, time
+
+from .fake_openai import FakeOpenAI
+
+
+async def _run(n: int) -> list[float]:
+    from app.respond import suggest_reply
+    from app.llm import close_client
+
+    async def one() -> float:
+        t0 = time.perf_counter()
+        await suggest_reply("Qual o status do protocolo 12345?", "Produtivo")
+        return time.perf_counter() - t0
+
+    try:
+        return await asyncio.gather(*(one() for _ in range(n)))
+    finally:
+        await close_client()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0.5)
+    args = ap.parse_args()
+
+    with FakeOpenAI(latency=args.latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+        import app.respond  # noqa: F401  (import fora da medição)
+        t0 = time.perf_counter()
+        latencies = asyncio.run(_run(args.n))
+        wall = time.perf_counter() - t0
+        out = {
+            "n": args.n,
+            "latency_stub_s": args.latency,
+            "wall_s": round(wall, 3),
+            "serial_estimate_s": round(args.n * args.latency, 3),
+            "max_latency_s": round(max(latencies), 3),
+            "max_in_flight": fake.cfg.max_in_flight,
+        }
+    print(json.dumps(out, indent=2))
+    # sobreposição: o lote inteiro deve custar bem menos que N latências em série
+    overlapped = out["max_in_flight"] > 1 and wall < args.n * args.latency / 2
+    return 0 if overlapped else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# bench/load.py
+"""
+Vazão e latência (p50/p95/p99) de /process em vários níveis de concorrência,
+com o servidor fake da OpenAI em latência e taxa de falha configuráveis.
+
+    python -m bench.load --levels 1 4 16 64 --requests 128 --latency 0.2 --fail-rate 0.05
+"""
+from __future__ import annotations
+import argparse, asyncio, json, time
+from typing import Sequence
+
+from .common import fake_port, percentiles, use_fake_openai
+from .fake_openai import FakeOpenAI
+from .synth import load_examples
+
+
+async def _level(client, texts: Sequence[str], concurrency: int, n_requests: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.post("/process", data={"email_text": texts[i % len(texts)], "no_cache": "true"})
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    wall = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(n_requests / wall, 2),
+        **percentiles(latencies),
+    }
+
+
+async def _run(levels: Sequence[int], n_requests: int, fake: FakeOpenAI) -> list[dict]:
+    import httpx
+    from app.main import app
+    from app.llm import close_client
+
+    texts = [t for _, t in load_examples()]
+    out = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for c in levels:
+                calls_before = fake.cfg.calls
+                fake.cfg.max_in_flight = 0
+                res = await _level(client, texts, c, n_requests)
+                res["llm_calls"] = fake.cfg.calls - calls_before
+                res["llm_max_in_flight"] = fake.cfg.max_in_flight
+                out.append(res)
+    finally:
+        await close_client()
+    return out
+
+
+def run(levels: Sequence[int] = (1, 4, 16, 64), n_requests: int = 64,
+        latency: float = 0.2, jitter: float = 0.0, fail_rate: float = 0.0, fail_status: int = 500) -> dict:
+    with FakeOpenAI(port=fake_port(), latency=latency, jitter=jitter, fail_rate=fail_rate, fail_status=fail_status) as fake:
+        use_fake_openai(fake.base_url)
+        results = asyncio.run(_run(levels, n_requests, fake))
+    return {
+        "fake": {"latency_s": latency, "jitter_s": jitter, "fail_rate": fail_rate, "fail_status": fail_status},
+        "levels": results,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--fail-status", type=int, default=500)
+    args = ap.parse_args()
+    print(json.dumps(run(args.levels, args.requests, args.latency, args.jitter, args.fail_rate, args.fail_status), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# bench/local_model.py
+"""
+Classificador local (app/model.py) × heurística em data/examples, com
+validação leave-one-out (cada e-mail é previsto por um modelo treinado sem
+ele), e custo por e-mail em µs: heurística, modelo um a um e em lote.
+O lote (score_many, esparso) é comparado com a conta pela matriz densa
+n × dim: mesmos scores e pico de memória (tracemalloc) de cada um.
+
+    python -m bench.local_model --batch 16 256
+"""
+from __future__ import annotations
+import argparse, copy, json, time, tracemalloc
+
+from .synth import load_examples, reply_thread
+
+
+def _accuracy(examples, bits: int) -> dict:
+    from app import classify
+    from app.model import LABELS, train
+    from app.nlp import preprocess
+
+    texts = [t for _, t in examples]
+    labels = [LABELS.index(l) for l, _ in examples]
+    clean = [preprocess(t)[0] for t in texts]
+    hits = {"heuristica": 0, "modelo": 0, "heuristica+desempate": 0, "blend": 0}
+    dead_zone = 0
+    for i in range(len(texts)):
+        rest = [j for j in range(len(texts)) if j != i]
+        model = train([clean[j] for j in rest], [labels[j] for j in rest], bits=bits)
+        p = model.score(clean[i])
+        rr = classify._heuristic_score("", texts[i])
+        real = LABELS[labels[i]]
+
+        tie = copy.copy(rr)
+        if 0.45 <= tie.score <= 0.55:
+            dead_zone += 1
+            classify._pull(tie, LABELS[p >= 0.5])
+        blend = copy.copy(rr)
+        classify._blend(blend, p)
+
+        hits["heuristica"] += rr.categoria == real
+        hits["modelo"] += LABELS[p >= 0.5] == real
+        hits["heuristica+desempate"] += tie.categoria == real
+        hits["blend"] += blend.categoria == real
+    n = len(texts)
+    return {"emails": n, "zona_morta": dead_zone, **{k: round(v / n, 4) for k, v in hits.items()}}
+
+
+def _per_email_us(fn, n_items: int, repeats: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return round((time.perf_counter() - t0) / repeats / n_items * 1e6, 2)
+
+
+def _latency(examples, batches: list[int], repeats: int) -> dict:
+    from app.classify import _heuristic_score
+    from app.model import load_model
+    from app.nlp import preprocess
+
+    model = load_model()
+    if model is None:
+        return {"erro": "sem artefato (python -m app.model)"}
+    texts = [t for _, t in examples]
+    clean = [preprocess(t)[0] for t in texts]
+    long_clean = preprocess(reply_thread(10))[0]
+    out = {
+        "heuristica": _per_email_us(lambda: [_heuristic_score("", t) for t in texts], len(texts), repeats),
+        "modelo_um_a_um": _per_email_us(lambda: [model.score(c) for c in clean], len(clean), repeats),
+        f"modelo_um_a_um_{len(long_clean.split())}_tokens": _per_email_us(lambda: model.score(long_clean), 1, repeats),
+    }
+    for size in batches:
+        batch = (clean * (size // len(clean) + 1))[:size]
+        out[f"modelo_lote_{size}"] = _per_email_us(lambda: model.score_many(batch), size, repeats)
+    return out
+
+
+def _dense_scores(model, clean_texts):
+    """Referência: a matriz densa (n × dim) que o score_many montava."""
+    import numpy as np
+    from app.model import _sparse
+
+    rows, cols, vals = _sparse(clean_texts, model.dim, model.ngram)
+    X = np.zeros((len(clean_texts), model.dim), dtype=np.float32)
+    X[rows, cols] = vals
+    return (1.0 / (1.0 + np.exp(-(X @ model.w + model.b)))).tolist()
+
+
+def _peak_kb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def _batch_vs_dense(examples, sizes: list[int]) -> dict:
+    from app.model import load_model
+    from app.nlp import preprocess
+
+    model = load_model()
+    if model is None:
+        return {"erro": "sem artefato (python -m app.model)"}
+    clean = [preprocess(t)[0] for _, t in examples]
+    out = {}
+    for size in sizes:
+        batch = (clean * (size // len(clean) + 1))[:size]
+        sparse, dense = model.score_many(batch), _dense_scores(model, batch)
+        out[f"lote_{size}"] = {
+            "max_diff": max(abs(a - b) for a, b in zip(sparse, dense)),
+            "mesma_categoria": all((a >= 0.5) == (b >= 0.5) for a, b in zip(sparse, dense)),
+            "pico_kb_esparso": _peak_kb(lambda: model.score_many(batch)),
+            "pico_kb_denso": _peak_kb(lambda: _dense_scores(model, batch)),
+        }
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, nargs="+", default=[16, 256])
+    ap.add_argument("--bits", type=int, default=14)
+    ap.add_argument("--repeats", type=int, default=50)
+    args = ap.parse_args()
+
+    examples = load_examples()
+    report = {
+        "acuracia_leave_one_out": _accuracy(examples, args.bits),
+        "us_por_email": _latency(examples, args.batch, args.repeats),
+        "lote_esparso_x_denso": _batch_vs_dense(examples, args.batch + [1000]),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
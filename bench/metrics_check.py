@@ -0,0 +1,80 @@
+# bench/metrics_check.py
+"""
+Faz alguns requests (texto, PDF, .eml) contra o app com o fake da OpenAI
+falhando parte das chamadas e confere o que aparece em /metrics, no header
+Server-Timing e no campo `debug` (?debug=1).
+
+    python -m bench.metrics_check
+"""
+from __future__ import annotations
+import os, re, sys
+
+from .common import fake_port, use_fake_openai
+from .fake_openai import FakeOpenAI
+from . import synth
+
+
+def parse(text: str) -> dict:
+    """{'nome{rótulos}': valor} das linhas de amostra."""
+    out = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            out[key] = float(value)
+    return out
+
+
+def main() -> int:
+    with FakeOpenAI(port=fake_port(), latency=0.01, fail_rate=0.0, fail_status=429) as fake:
+        use_fake_openai(fake.base_url)
+        os.environ["CACHE_ENABLED"] = "0"
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            files = [
+                ("email_files", ("a.pdf", synth.pdf_bytes(2), "application/pdf")),
+                ("email_files", ("b.eml", synth.eml_bytes(depth=1), "message/rfc822")),
+            ]
+            assert client.post("/process", files=files).status_code == 200
+            for text in ("Qual o status do chamado 123?", "Obrigado, bom fim de semana!"):
+                assert client.post("/process", data={"email_text": text}).status_code == 200
+            fake.cfg.fail_rate = 1.0   # toda chamada falha: 1 + OPENAI_MAX_RETRIES tentativas e template
+            r = client.post("/process?debug=1", data={"email_text": "Pode verificar o protocolo?"})
+            assert r.status_code == 200
+            timing = dict(
+                (item.split(";")[0], item) for item in r.headers.get("server-timing", "").split(", ") if item
+            )
+            debug = r.json()["resultados"][0]["debug"] or {}
+            body = client.get("/metrics").text
+
+    from app.ratelimit import OPENAI_MAX_RETRIES
+    m = parse(body)
+    buckets = [v for k, v in m.items() if k.startswith('autou_stage_seconds_bucket{stage="preprocess"')]
+    checks = {
+        "pdf extraído": m.get('autou_stage_seconds_count{stage="extract_text_from_pdf"}', 0) >= 1,
+        "eml extraído": m.get('autou_stage_seconds_count{stage="extract_text_from_eml"}', 0) >= 1,
+        "preprocess por parte": m.get('autou_stage_seconds_count{stage="preprocess"}', 0) >= 5,
+        "heurística por parte": m.get('autou_stage_seconds_count{stage="heuristic_score"}', 0) >= 5,
+        "resposta por parte": m.get('autou_stage_seconds_count{stage="suggest_reply"}', 0) >= 5,
+        "tentativas": m.get('autou_llm_attempts_total{op="reply"}', 0) >= 5 + OPENAI_MAX_RETRIES,
+        "retries": m.get('autou_llm_retries_total{op="reply"}', 0) == OPENAI_MAX_RETRIES,
+        "falhas": m.get('autou_llm_failures_total{op="reply"}', 0) == 1,
+        "fallback": m.get('autou_reply_fallbacks_total{reason="error"}', 0) == 1,
+        "tokens": m.get('autou_llm_tokens_total{op="reply",type="prompt"}', 0) > 0,
+        "entrada pdf": m.get('autou_input_bytes_count{kind="pdf"}', 0) == 1,
+        "entrada texto": m.get('autou_input_bytes_count{kind="text"}', 0) == 3,
+        "in-flight zerado": m.get('autou_requests_in_flight{endpoint="process"}', -1) == 0
+                            and m.get("autou_parts_in_flight", -1) == 0,
+        "buckets cumulativos": bool(buckets) and all(a <= b for a, b in zip(buckets, buckets[1:])),
+        "server-timing com retries": f'desc="{1 + OPENAI_MAX_RETRIES}x"' in timing.get("openai_reply", "")
+                                     and "openai_reply_backoff" in timing and "total" in timing,
+        "debug por parte": {"preprocess", "heuristic_score", "suggest_reply", "openai_reply"} <= set(debug),
+    }
+    for name, ok in checks.items():
+        print(("ok   " if ok else "FAIL ") + name)
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
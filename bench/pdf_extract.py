@@ -0,0 +1,161 @@
+# bench/pdf_extract.py
+"""
+Extração de PDFs grandes sintéticos: orçamento de caracteres (parada
+antecipada), páginas escaneadas puladas e cache por sha256, inclusive quando
+a extração compartilhada falha ou é cancelada (quem esperava não pode receber
+"" como se o PDF fosse vazio, e a próxima tentativa extrai de novo), e worker
+que morre no meio (os._exit): a entrada volta vazia, sem ser repetida no
+processo do servidor (se fosse, o bench morreria junto), e o pool é refeito.
+Texto cortado pelo prazo (EXTRACT_TIMEOUT) não entra no cache.
+
+    python -m bench.pdf_extract --pages 300 --scanned 40 --copies 8
+"""
+from __future__ import annotations
+import argparse, asyncio, json, time
+
+from . import synth
+from .common import time_call
+
+
+def _budgets(raw: bytes, repeats: int) -> dict:
+    from app import executors, nlp
+
+    limits = {
+        "antes (50 págs / 200k chars)": dict(max_pages=executors.EXTRACT_MAX_PAGES, max_chars=executors.EXTRACT_MAX_CHARS),
+        f"PDF_MAX_CHARS={executors.PDF_MAX_CHARS}": dict(
+            max_pages=executors.EXTRACT_MAX_PAGES, max_chars=min(executors.PDF_MAX_CHARS, executors.EXTRACT_MAX_CHARS)),
+    }
+    out = {}
+    for label, kw in limits.items():
+        text, _ = nlp.extract_text_from_pdf(raw, **kw)
+        out[label] = {"chars": len(text), **time_call(lambda: nlp.extract_text_from_pdf(raw, **kw), repeats, warmup=0)}
+    return out
+
+
+def _scanned(raw: bytes, repeats: int) -> dict:
+    from app import nlp
+
+    check = nlp._has_text_layer
+    out = {}
+    for label, fn in (("interpretando todas", lambda page: True), ("pulando escaneadas", check)):
+        nlp._has_text_layer = fn
+        try:
+            out[label] = time_call(lambda: nlp.extract_text_from_pdf(raw, max_pages=None), repeats, warmup=0)
+        finally:
+            nlp._has_text_layer = check
+    return out
+
+
+async def _cache(raw: bytes, copies: int) -> dict:
+    from app import executors
+
+    t0 = time.perf_counter()
+    texts = await asyncio.gather(*(executors.extract_pdf(raw) for _ in range(copies)))
+    parallel = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    await executors.extract_pdf(raw)
+    again = time.perf_counter() - t0
+    return {
+        "copias_em_paralelo": copies,
+        "textos_iguais": len(set(texts)) == 1,
+        "parallel_s": round(parallel, 3),
+        "repetido_ms": round(again * 1000, 3),
+    }
+
+
+async def _shared_failures(copies: int) -> dict:
+    """Extração compartilhada que falha / é cancelada, com `copies - 1` esperando."""
+    from app import executors
+
+    real, calls = executors._extract_pdf_uncached, []
+
+    async def flaky(raw, size):
+        calls.append(raw)
+        await asyncio.sleep(0.2)
+        if len(calls) == 1 and raw == b"%erro":
+            raise RuntimeError("parser quebrou")
+        return f"texto de {raw.decode()}", False
+
+    executors._extract_pdf_uncached = flaky
+    try:
+        got = await asyncio.gather(*(executors.extract_pdf(b"%erro") for _ in range(copies)), return_exceptions=True)
+        erro = {
+            "quem_esperava_recebeu_o_erro": all(isinstance(g, RuntimeError) for g in got),
+            "texto_vazio_entregue": sum(g == "" for g in got),
+            "pendente_removido": not executors._pdf_cache.pending,
+            "nova_tentativa": await executors.extract_pdf(b"%erro"),
+        }
+
+        calls.clear()
+        leader = asyncio.create_task(executors.extract_pdf(b"%cancel"))
+        await asyncio.sleep(0.05)
+        waiters = [asyncio.create_task(executors.extract_pdf(b"%cancel")) for _ in range(copies - 1)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        got = await asyncio.gather(*waiters, return_exceptions=True)
+        cancelado = {
+            "quem_esperava_recebeu": sorted({repr(g) for g in got}),
+            "extracoes": len(calls),
+            "pendente_removido": not executors._pdf_cache.pending,
+        }
+    finally:
+        executors._extract_pdf_uncached = real
+    return {"erro": erro, "cancelado": cancelado}
+
+
+async def _deadline_not_cached(raw: bytes) -> dict:
+    """Texto cortado pelo prazo (depende da carga) não fica no cache; o completo fica."""
+    from app import executors
+
+    digest, timeout = executors._sha256(raw), executors.EXTRACT_TIMEOUT
+    executors.EXTRACT_TIMEOUT = 1e-6
+    try:
+        partial_text = await executors.extract_pdf(raw)
+    finally:
+        executors.EXTRACT_TIMEOUT = timeout
+    cached_partial = executors._pdf_cache.get(digest) is not None
+    full = await executors.extract_pdf(raw)
+    return {"chars_no_prazo": len(partial_text), "parcial_em_cache": cached_partial,
+            "chars_depois": len(full), "completo_em_cache": executors._pdf_cache.get(digest) == full}
+
+
+async def _broken_worker(raw: bytes) -> dict:
+    import os
+    from functools import partial
+    from app import executors
+
+    if executors.EXTRACT_PROCESS_WORKERS <= 0:
+        return {"erro": "EXTRACT_PROCESS_WORKERS=0"}
+    size = executors.EXTRACT_PROCESS_MIN_BYTES     # força o pool de processos
+    got = await executors._run(partial(os._exit, 1), size, "vazio")
+    text, _ = await executors._run(partial(__import__("app.nlp").nlp.extract_text_from_pdf, raw, max_pages=2), size, ("", False))
+    return {"resultado_do_worker_morto": got, "proxima_tarefa_chars": len(text)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=300)
+    ap.add_argument("--scanned", type=int, default=40, help="páginas só com imagem no 2º PDF")
+    ap.add_argument("--copies", type=int, default=8, help="mesmo anexo em N e-mails")
+    ap.add_argument("--repeats", type=int, default=2)
+    args = ap.parse_args()
+
+    from app import executors
+
+    big = synth.pdf_bytes(args.pages)
+    mixed = synth.pdf_bytes(args.scanned + 5, image_pages=args.scanned)
+    report = {
+        "pdf_bytes": len(big),
+        "orcamento": _budgets(big, args.repeats),
+        f"escaneadas_{args.scanned}_de_{args.scanned + 5}": _scanned(mixed, args.repeats),
+        "cache_sha256": asyncio.run(_cache(big, args.copies)),
+        "extracao_compartilhada": asyncio.run(_shared_failures(args.copies)),
+        "prazo_fora_do_cache": asyncio.run(_deadline_not_cached(synth.pdf_bytes(3))),
+        "worker_morto": asyncio.run(_broken_worker(big)),
+    }
+    executors.shutdown()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/preprocess.py
+"""
+Compara o preprocess antigo (passos re.sub encadeados, dict de frequência)
+com o atual: confere saída idêntica em data/examples e nas threads sintéticas
+e mede tempo e alocação de pico (tracemalloc) por chamada, em KB e em bytes
+por caractere de entrada (o atual lê o texto em blocos de _CHUNK: o pico
+deixa de ser ~12 bytes/caractere da cópia minúscula + lista de tokens).
+Os casos de borda cruzam blocos: pista de assinatura partida na borda,
+texto sem espaços e acentos na emenda.
+
+    python -m bench.preprocess --sizes 1 10 50 200
+"""
+from __future__ import annotations
+import argparse, json, re, sys, time, tracemalloc
+from typing import List, Tuple
+
+from unidecode import unidecode
+
+from app.nlp import _CHUNK, STOP_PT, SIG_HINTS, preprocess, preprocess_many
+from .synth import load_examples, thread_text
+
+
+def legacy_preprocess(raw: str) -> Tuple[str, List[str]]:
+    text = raw.strip()
+    text = re.sub('(?i)^from:.*?(?:\\n\\r?)+', '', text, flags=re.S)
+    text = re.sub('(?i)^de:.*?(?:\\n\\r?)+', '', text, flags=re.S)
+    text = re.sub('https?://\\S+', ' ', text)
+    text = re.sub('[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\\.[A-Za-z]{2,}', ' ', text)
+    low = text.lower()
+    for h in SIG_HINTS:
+        if h in low:
+            idx = low.rfind(h)
+            if idx > 80:
+                text = text[:idx]
+                break
+    text = unidecode(text)
+    text = re.sub('[^a-zA-Z0-9À-ÿ\\n\\s.,;:!?-]', ' ', text)
+    text = re.sub('\\s{2,}', ' ', text).strip()
+    tokens = [t for t in re.findall('\\b\\w{2,}\\b', text.lower()) if t not in STOP_PT]
+    freq = {}
+    for t in tokens:
+        freq[t] = freq.get(t, 0) + 1
+    termos = [w for w, _ in sorted(freq.items(), key=lambda kv: (-kv[1], kv[0]))[:10]]
+    return (' '.join(tokens), termos)
+
+
+def _chunk_cases() -> List[str]:
+    filler = "Prezados, segue a atualização do chamado com as informações solicitadas. "
+    body = filler * (2 * _CHUNK // len(filler) + 1)
+    cases = []
+    for off in range(1, len("atenciosamente")):
+        cut = _CHUNK - off                                  # "atenciosamente" cruzando a borda
+        cases.append(body[:cut] + "Atenciosamente, João\n" + body[cut:])
+    cases.append("ação" * (_CHUNK // 2) + " Atenciosamente " + "x" * 100)    # sem espaços
+    cases.append(("é " * _CHUNK) + "Obrigado pela atenção")
+    return cases
+
+
+def _measure(fn, text: str, repeats: int) -> dict:
+    fn(text)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(text)
+    us = (time.perf_counter() - t0) / repeats * 1e6
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us": round(us, 1), "peak_kb": round(peak / 1024, 1), "peak_b_por_char": round(peak / len(text), 1)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 200])
+    ap.add_argument("--repeats", type=int, default=20)
+    args = ap.parse_args()
+
+    texts = [t for _, t in load_examples()] + [thread_text(n) for n in args.sizes] + _chunk_cases()
+    mismatches = sum(legacy_preprocess(t) != preprocess(t) for t in texts)
+    batch_ok = preprocess_many(texts) == [preprocess(t) for t in texts]
+
+    rows = []
+    for n in args.sizes:
+        text = thread_text(n)
+        old, new = _measure(legacy_preprocess, text, args.repeats), _measure(preprocess, text, args.repeats)
+        rows.append({
+            "thread": n, "chars": len(text), "legacy": old, "fused": new,
+            "speedup": round(old["us"] / new["us"], 2),
+            "peak_ratio": round(new["peak_kb"] / old["peak_kb"], 2),
+        })
+    print(json.dumps({"mismatches": mismatches, "batch_identical": batch_ok, "rows": rows}, indent=2))
+    return 0 if mismatches == 0 and batch_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# bench/reply_reuse.py
+"""
+Índice de respostas (app/replies.py) contra o servidor fake:
+
+- fluxo de e-mails nos padrões mais comuns (2ª via, status de protocolo,
+  reativação de acesso, envio de documento), com redação variada: quantas
+  respostas saem do índice e quantas chamadas ao modelo sobram
+- custo de busca/inserção com o índice cheio (REPLY_INDEX_MAX_ENTRIES)
+- dados pessoais: a resposta com o nome de um cliente ("Olá, Carlos!") não
+  entra no índice nem é servida ao mesmo e-mail assinado por outra pessoa
+  (nem quando já estava gravada); a versão sem nome continua reaproveitada
+
+    python -m bench.reply_reuse --n 200 --threshold 0.8
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, sys, time
+
+from .common import percentiles
+from .fake_openai import FakeOpenAI
+
+ABERTURAS = ["Bom dia,", "Boa tarde,", "Olá,", "Prezados,", ""]
+PEDIDOS = [
+    "poderiam me enviar a segunda via do boleto do pedido {n}?",
+    "preciso da segunda via do boleto referente ao pedido {n}, podem enviar?",
+    "qual o status do protocolo {n}? Ainda não tive retorno.",
+    "gostaria de saber o andamento do chamado {n}, está em análise?",
+    "meu acesso ao sistema foi bloqueado, podem reativar o usuário {n}?",
+    "não consigo acessar o sistema, preciso reativar meu acesso (usuário {n}).",
+    "segue em anexo o documento solicitado no protocolo {n}, podem confirmar o recebimento?",
+    "anexei o comprovante do pedido {n}, poderiam confirmar se está tudo certo?",
+]
+FECHOS = ["Obrigado.", "Atenciosamente.", "Aguardo retorno.", ""]
+
+PESSOAL = ("Bom dia, aqui é o {nome}. Gostaria de saber o status da minha solicitação de reembolso, "
+           "fiz o pedido semana passada e ainda não tive retorno. Obrigado.")
+
+
+def _stream(n: int, seed: int = 7) -> list[str]:
+    rnd = random.Random(seed)
+    return [
+        " ".join(p for p in (rnd.choice(ABERTURAS), rnd.choice(PEDIDOS).format(n=rnd.randint(1000, 99999)),
+                             rnd.choice(FECHOS)) if p)
+        for _ in range(n)
+    ]
+
+
+async def _flow(texts: list[str], fake: FakeOpenAI, concurrency: int) -> dict:
+    import httpx
+    from app.main import app
+    from app.llm import close_client
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(client, text):
+        async with sem:
+            r = await client.post("/process", data={"email_text": text})
+            r.raise_for_status()
+            return r.json()["resultados"][0]
+
+    before = fake.cfg.calls
+    t0 = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as client:
+            out = []
+            for text in texts:          # em ordem: o índice aprende com as respostas anteriores
+                out.append(await one(client, text))
+    finally:
+        await close_client()
+    origem = {}
+    for o in out:
+        origem[o.get("resposta_origem")] = origem.get(o.get("resposta_origem"), 0) + 1
+    sims = [o["resposta_similaridade"] for o in out if o.get("resposta_similaridade")]
+    return {
+        "emails": len(texts),
+        "chamadas_llm": fake.cfg.calls - before,
+        "origem": origem,
+        "similaridade_min": min(sims) if sims else None,
+        "wall_s": round(time.perf_counter() - t0, 3),
+    }
+
+
+def _personal() -> dict:
+    from app.nlp import preprocess
+    from app.replies import ReplyIndex, _ctx
+
+    carlos, ana = (preprocess(PESSOAL.format(nome=n))[0] for n in ("Carlos", "Ana"))
+    out = {}
+    for label, resposta in (("com_nome", "Olá, Carlos! Seu reembolso está em análise."),
+                            ("nome_no_inicio", "Carlos, seu reembolso está em análise."),
+                            ("sem_nome", "Olá! Seu reembolso está em análise.")):
+        idx = ReplyIndex(path=None)
+        added = idx.add(carlos, "Produtivo", None, resposta)
+        match = idx.lookup(ana, "Produtivo", None)
+        out[label] = {"indexada": added, "servida_para_ana": match is not None}
+    # entrada gravada antes do filtro (índice SQLite antigo)
+    idx = ReplyIndex(path=None)
+    idx.load()
+    with idx._lock:
+        idx._append(idx._next_id, _ctx("Produtivo", None), carlos.split(), "Olá, Carlos! Seu reembolso está em análise.", 0)
+        score = idx.search(ana.split(), "Produtivo", None)[0].score
+    out["legado_com_nome"] = {"cosseno": round(score, 3), "servida_para_ana": idx.lookup(ana, "Produtivo", None) is not None}
+    return out
+
+
+def _scale(entries: int, queries: int) -> dict:
+    from app.replies import ReplyIndex
+    rnd = random.Random(1)
+    words = [f"w{i}" for i in range(20000)]
+    docs = [" ".join(rnd.choices(words, k=30)) for _ in range(entries)]
+    idx = ReplyIndex(path=None, max_entries=entries, seed_file=None)
+    add = []
+    for i, d in enumerate(docs):
+        t0 = time.perf_counter()
+        idx.add(d, "Produtivo", None, f"r{i}")
+        add.append(time.perf_counter() - t0)
+    look = []
+    for i in range(queries):
+        t0 = time.perf_counter()
+        idx.lookup(docs[rnd.randrange(entries)], "Produtivo", None)
+        look.append(time.perf_counter() - t0)
+    return {"entradas": entries, "add": percentiles(add[-200:]), "lookup": percentiles(look)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200)
+    ap.add_argument("--threshold", type=float, default=None, help="REPLY_REUSE_THRESHOLD (padrão: o do app)")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--entries", type=int, default=5000)
+    args = ap.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["CACHE_ENABLED"] = "0"
+    os.environ["DEDUP_ENABLED"] = "0"
+    os.environ["REPLY_INDEX_ENABLED"] = "1"
+    os.environ["REPLY_INDEX_PATH"] = ""        # só memória, semeado com data/examples
+    if args.threshold is not None:
+        os.environ["REPLY_REUSE_THRESHOLD"] = str(args.threshold)
+    with FakeOpenAI(latency=0.05) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        flow = asyncio.run(_flow(_stream(args.n), fake, args.concurrency))
+    pessoal = _personal()
+    print(json.dumps({"fluxo": flow, "dados_pessoais": pessoal, "escala": _scale(args.entries, 200)},
+                     indent=2, ensure_ascii=False))
+    ok = (not any(r["servida_para_ana"] for k, r in pessoal.items() if k != "sem_nome")
+          and not pessoal["com_nome"]["indexada"] and pessoal["sem_nome"]["servida_para_ana"])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# bench/reply_stream.py
+"""
+Resposta em streaming (POST /process/sse) × /process, contra o servidor fake
+em modo SSE (latência até o 1º token + tempo por token). O app sobe num
+uvicorn de verdade: o ASGITransport do httpx junta o corpo inteiro e
+esconderia o tempo até o primeiro evento.
+
+- tempo até `classificacao`, até o primeiro `texto` e até o `resultado`,
+  contra o tempo total do /process (a mesma resposta, sem stream)
+- os pedaços de `texto` juntos são a resposta final, e `classificacao` chega
+  antes do primeiro pedaço
+- corte no limite de frases: quantos tokens o fake chegou a mandar e quantos
+  streams foram encerrados pelo app antes do fim
+- cliente que desconecta no meio: o stream da OpenAI cai junto
+- limite de frases incremental: alimentado caractere a caractere dá o mesmo
+  texto que o limite aplicado na resposta inteira
+
+    python -m bench.reply_stream --n 10 --latency 0.3 --token-latency 0.03
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, sys, threading, time
+
+from .common import fake_port, percentiles, use_fake_openai
+from .fake_openai import FakeOpenAI, _free_port, _tokens
+
+LONG_REPLY = (
+    "Recebemos sua solicitação e já encaminhamos o pedido para a equipe responsável. "
+    "Retornaremos com a atualização do status em até dois dias úteis. "
+    + "Enquanto isso, caso tenha novas informações, responda a este e-mail com o número do protocolo "
+      "para que possamos anexar ao atendimento e agilizar a análise do seu caso. " * 3
+).strip()
+
+LIMIT_CASES = [
+    "Olá! Tudo certo? Sim, recebemos.",
+    "Resposta: Recebemos o arquivo. Vamos analisar. Obrigado!",
+    "resposta:   Segue o status: em análise... Retornamos em breve! E mais isto.",
+    "Versão 2.0 liberada. Consulte o item 3.1 do manual. Fim.",
+    "Olá!!! Recebemos?! Certo. Tchau.",
+    "Sem ponto final nenhum",
+    "Uma frase só.",
+    "Resp",
+]
+
+
+class _Server:
+    """App servido por uvicorn numa thread (como o FakeOpenAI)."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        self.port = _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> "_Server":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def _email(i: int) -> str:
+    return f"Bom dia, qual o status do protocolo {1000 + i}? Ainda não tive retorno sobre o pedido. Obrigado."
+
+
+async def _sse(client, text: str, stop_after_text: bool = False) -> dict:
+    t0 = time.perf_counter()
+    out = {"ordem": [], "deltas": []}
+    async with client.stream("POST", "/process/sse", data={"email_text": text}) as r:
+        r.raise_for_status()
+        buf = ""
+        async for chunk in r.aiter_text():
+            buf += chunk
+            while "\n\n" in buf:
+                block, buf = buf.split("\n\n", 1)
+                lines = dict(line.split(": ", 1) for line in block.split("\n"))
+                event, data = lines["event"], json.loads(lines["data"])
+                out.setdefault(f"{event}_s", time.perf_counter() - t0)
+                out["ordem"].append(event)
+                if event == "texto":
+                    out["deltas"].append(data["delta"])
+                    if stop_after_text:
+                        return out
+                elif event == "resultado":
+                    out["resultado"] = data["resultado"]
+    out["total_s"] = time.perf_counter() - t0
+    return out
+
+
+async def _run(base_url: str, fake: FakeOpenAI, n: int) -> dict:
+    import httpx
+
+    cfg = fake.cfg
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await client.post("/process", data={"email_text": _email(-1)})      # aquece (imports, cliente)
+        full = []
+        for i in range(n):
+            t0 = time.perf_counter()
+            r = await client.post("/process", data={"email_text": _email(i)})
+            r.raise_for_status()
+            full.append(time.perf_counter() - t0)
+        resposta_process = r.json()["resultados"][0]["resposta"]
+
+        tokens_before, cut_before = cfg.tokens_sent, cfg.streams_cut
+        runs = [await _sse(client, _email(n + i)) for i in range(n)]
+        await asyncio.sleep(0.1)
+        tokens_streamed = (cfg.tokens_sent - tokens_before) / n
+        cut = cfg.streams_cut - cut_before
+
+        cut_before = cfg.streams_cut
+        await _sse(client, _email(2 * n), stop_after_text=True)    # fecha a conexão no 1º pedaço
+        for _ in range(50):
+            if not cfg.in_flight:
+                break
+            await asyncio.sleep(0.05)
+        desconexao = {"stream_openai_encerrado": cfg.streams_cut - cut_before == 1, "em_andamento_no_fake": cfg.in_flight}
+
+    finals = [run["resultado"]["resposta"] for run in runs]
+    return {
+        "process": percentiles(full),
+        "sse_classificacao": percentiles([r["classificacao_s"] for r in runs]),
+        "sse_primeiro_texto": percentiles([r["texto_s"] for r in runs]),
+        "sse_resultado": percentiles([r["resultado_s"] for r in runs]),
+        "primeiro_texto_vs_process": round(
+            percentiles(full)["p50_ms"] / percentiles([r["texto_s"] for r in runs])["p50_ms"], 2),
+        "resposta": finals[0],
+        "igual_ao_process": all(f == resposta_process for f in finals),
+        "pedacos_formam_a_resposta": all("".join(r["deltas"]).strip() == r["resultado"]["resposta"] for r in runs),
+        "classificacao_antes_do_texto": all(r["ordem"].index("classificacao") < r["ordem"].index("texto") for r in runs),
+        "pedacos_por_resposta": round(sum(len(r["deltas"]) for r in runs) / n, 1),
+        "tokens_da_resposta_longa": len(_tokens(LONG_REPLY)),
+        "tokens_enviados_por_stream": round(tokens_streamed, 1),
+        "streams_cortados_pelo_app": f"{cut}/{n}",
+        "desconexao": desconexao,
+    }
+
+
+def _limiter() -> dict:
+    from app.respond import _SentenceLimiter, _limit_reply
+
+    rows = {}
+    for raw in LIMIT_CASES + [LONG_REPLY]:
+        lim = _SentenceLimiter()
+        streamed = "".join(lim.feed(ch) for ch in raw) + lim.flush()
+        whole = _limit_reply(raw)[0].strip()
+        rows[raw[:40]] = {"inteiro": whole, "incremental_igual": streamed.strip() == whole == lim.text()}
+    return rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=10)
+    ap.add_argument("--latency", type=float, default=0.3, help="s até o 1º token no fake")
+    ap.add_argument("--token-latency", type=float, default=0.03, help="s por token no fake")
+    args = ap.parse_args()
+
+    os.environ["DEDUP_ENABLED"] = "0"
+    with FakeOpenAI(port=fake_port(), latency=args.latency, token_latency=args.token_latency, reply=LONG_REPLY) as fake:
+        use_fake_openai(fake.base_url)
+        from app.main import app
+
+        with _Server(app) as server:
+            report = {"sse": asyncio.run(_run(server.base_url, fake, args.n)), "limite_incremental": _limiter()}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sse = report["sse"]
+    ok = (sse["pedacos_formam_a_resposta"] and sse["classificacao_antes_do_texto"] and sse["igual_ao_process"]
+          and sse["desconexao"]["stream_openai_encerrado"]
+          and all(r["incremental_igual"] for r in report["limite_incremental"].values()))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# bench/resilience.py
+"""
+Comportamento do gate da OpenAI (app/ratelimit.py) contra o servidor fake:
+
+- queda: 100% de 429/503 → quantas chamadas chegam ao upstream e quanto
+  cada e-mail espera até cair no template (antes: 4 tentativas por chamada)
+- recuperação: upstream volta, o circuito passa por half-open e fecha
+- sonda cancelada: a chamada de half-open é cancelada no meio (cliente do
+  SSE desconectou, job cancelado); a sonda é liberada, os tokens reservados
+  voltam ao bucket e a próxima chamada fecha o circuito
+- cota de concorrência: o fake devolve 429 acima de N chamadas simultâneas;
+  a concorrência adaptativa converge e quase tudo responde pelo modelo
+
+    python -m bench.resilience --n 50 --latency 0.05
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, statistics, sys, time
+
+from .fake_openai import FakeOpenAI
+
+COOLDOWN = 1.0
+
+
+async def _burst(n: int) -> dict:
+    from app.respond import draft_reply
+
+    async def one():
+        t0 = time.perf_counter()
+        reply = await draft_reply("Qual o status do protocolo 12345?", "Produtivo")
+        return time.perf_counter() - t0, reply.source
+
+    res = await asyncio.gather(*(one() for _ in range(n)))
+    lat = sorted(t for t, _ in res)
+    return {
+        "llm": sum(1 for _, s in res if s == "llm"),
+        "fallback": sum(1 for _, s in res if s == "fallback"),
+        "p50_s": round(statistics.median(lat), 3),
+        "max_s": round(lat[-1], 3),
+    }
+
+
+async def _cancelled_probe(fake: FakeOpenAI, n: int) -> dict:
+    from app.ratelimit import TokenBucket, openai_gate
+    from app.respond import draft_reply
+
+    openai_gate.__init__()
+    # 1 token/s de reposição: o que não for devolvido aparece no saldo
+    bucket = openai_gate.tokens = TokenBucket(60, burst=100000)
+    fake.cfg.fail_rate, fake.cfg.fail_status = 1.0, 503
+    await _burst(n)
+    fake.cfg.fail_rate, latency = 0.0, fake.cfg.latency
+    await asyncio.sleep(COOLDOWN + 0.1)
+    fake.cfg.latency = 5.0
+    probe = asyncio.create_task(draft_reply("Qual o status do protocolo 12345?", "Produtivo"))
+    await asyncio.sleep(0.2)
+    state = openai_gate.breaker.state
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+    fake.cfg.latency = latency
+    out = {
+        "breaker_na_sonda": state,
+        "sonda_presa": openai_gate.breaker._probing,
+        "tokens_devolvidos": bucket.tokens >= bucket.capacity - 1,
+    }
+    out["proxima_sonda"] = await _burst(1)
+    out["breaker"] = openai_gate.breaker.state
+    out["fechado"] = await _burst(n)
+    return out
+
+
+async def _scenarios(fake: FakeOpenAI, n: int, server_limit: int) -> dict:
+    from app.llm import close_client
+    from app.ratelimit import openai_gate
+
+    out = {}
+    try:
+        for status in (429, 503):
+            openai_gate.__init__()
+            fake.cfg.fail_rate, fake.cfg.fail_status = 1.0, status
+            before = fake.cfg.calls
+            out[f"queda_{status}"] = {
+                **await _burst(n),
+                "chamadas_upstream": fake.cfg.calls - before,
+                "legado_chamadas": 4 * n,
+                "breaker": openai_gate.breaker.state,
+            }
+
+        # upstream volta: primeira rajada ainda com circuito aberto, depois da
+        # espera passa uma sonda e fecha
+        fake.cfg.fail_rate = 0.0
+        rejected = await _burst(n)
+        await asyncio.sleep(COOLDOWN + 0.1)
+        before = fake.cfg.calls
+        probe = await _burst(n)
+        probe["chamadas_upstream"] = fake.cfg.calls - before
+        state = openai_gate.breaker.state
+        out["recuperacao"] = {
+            "circuito_aberto": rejected,
+            "half_open": probe,
+            "breaker": state,
+            "fechado": await _burst(n),
+        }
+
+        out["sonda_cancelada"] = await _cancelled_probe(fake, n)
+
+        openai_gate.__init__()
+        fake.cfg.concurrency_limit = server_limit
+        before_calls, before_fail = fake.cfg.calls, fake.cfg.failures
+        res = await _burst(n * 4)
+        out[f"cota_concorrencia_{server_limit}"] = {
+            **res,
+            "chamadas_upstream": fake.cfg.calls - before_calls,
+            "429": fake.cfg.failures - before_fail,
+            "limite_final": round(openai_gate.concurrency.limit, 2),
+        }
+        fake.cfg.concurrency_limit = 0
+    finally:
+        await close_client()
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--server-limit", type=int, default=4, help="chamadas simultâneas aceitas pelo fake")
+    args = ap.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["OPENAI_BREAKER_COOLDOWN"] = str(COOLDOWN)
+    with FakeOpenAI(latency=args.latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        report = asyncio.run(_scenarios(fake, args.n, args.server_limit))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    ok = (
+        all(report[k]["chamadas_upstream"] < report[k]["legado_chamadas"] / 4 for k in ("queda_429", "queda_503"))
+        and report["recuperacao"]["circuito_aberto"]["llm"] == 0
+        and report["recuperacao"]["half_open"]["chamadas_upstream"] == 1
+        and report["recuperacao"]["breaker"] == "closed"
+        and report["recuperacao"]["fechado"]["llm"] == args.n
+        and report["sonda_cancelada"]["breaker_na_sonda"] == "half_open"
+        and not report["sonda_cancelada"]["sonda_presa"]
+        and report["sonda_cancelada"]["tokens_devolvidos"]
+        and report["sonda_cancelada"]["breaker"] == "closed"
+        and report["sonda_cancelada"]["fechado"]["llm"] == args.n
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
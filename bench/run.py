@@ -0,0 +1,58 @@
+# bench/run.py
+"""
+Roda a suíte inteira (etapas, carga, acurácia) e grava um JSON comparável
+entre commits.
+
+    python -m bench.run --out bench_results.json
+    python -m bench.run --only accuracy stages --latency 0.1
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, platform, subprocess, sys, time
+from pathlib import Path
+
+SUITES = ("stages", "load", "accuracy")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parents[1]).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES))
+    ap.add_argument("--latency", type=float, default=0.2, help="latência do fake da OpenAI (s)")
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--requests", type=int, default=64)
+    ap.add_argument("--repeats", type=int, default=5)
+    args = ap.parse_args()
+
+    report: dict = {
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+    if "stages" in args.only:
+        from . import stages
+        report["stages"] = stages.run(latency=min(args.latency, 0.05), repeats=args.repeats)
+    if "load" in args.only:
+        from . import load
+        report["load"] = load.run(args.levels, args.requests, latency=args.latency, fail_rate=args.fail_rate)
+    if "accuracy" in args.only:
+        from . import accuracy
+        report["accuracy"] = asyncio.run(accuracy.evaluate())
+
+    Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"resultado em {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# bench/stages.py
+"""
+Tempo por etapa do pipeline, variando o tamanho da entrada:
+extract_text_from_pdf/eml, preprocess, _heuristic_score, suggest_reply e
+/process de ponta a ponta (cliente ASGI, sem rede).
+
+    python -m bench.stages --latency 0.05
+"""
+from __future__ import annotations
+import argparse, asyncio, json, time
+
+from .common import fake_port, percentiles, time_call, use_fake_openai
+from .fake_openai import FakeOpenAI
+from . import synth
+
+THREAD_SIZES = (1, 10, 50, 200)
+PDF_PAGES = (1, 10, 50)
+EML_DEPTHS = (1, 3, 10)
+
+
+def bench_sync(repeats: int = 5) -> dict:
+    from app.nlp import extract_text_from_pdf, extract_text_from_eml, preprocess
+    from app.classify import _heuristic_score
+
+    out: dict = {"extract_text_from_pdf": {}, "extract_text_from_eml": {}, "preprocess": {}, "heuristic_score": {}}
+    for pages in PDF_PAGES:
+        raw = synth.pdf_bytes(pages)
+        out["extract_text_from_pdf"][f"{pages}p"] = {
+            "bytes": len(raw), **time_call(lambda: extract_text_from_pdf(raw), repeats, warmup=0)}
+    for depth in EML_DEPTHS:
+        for html in (False, True):
+            raw = synth.eml_bytes(depth=depth, html=html, pdf_pages=2 if html else 0)
+            key = f"depth{depth}" + ("_html_pdf" if html else "")
+            out["extract_text_from_eml"][key] = {
+                "bytes": len(raw), **time_call(lambda: extract_text_from_eml(raw), repeats)}
+    for n in THREAD_SIZES:
+        text = synth.thread_text(n)
+        clean, _ = preprocess(text)
+        out["preprocess"][f"thread_{n}"] = {"chars": len(text), **time_call(lambda: preprocess(text), repeats)}
+        out["heuristic_score"][f"thread_{n}"] = {
+            "chars": len(text), **time_call(lambda: _heuristic_score(text, clean), repeats)}
+    return out
+
+
+async def bench_async(repeats: int = 5) -> dict:
+    import httpx
+    from app.main import app
+    from app.respond import suggest_reply
+    from app.llm import close_client
+
+    out: dict = {"suggest_reply": {}, "process_e2e": {}}
+    try:
+        for n in (1, 10):
+            text = synth.thread_text(n)
+            samples = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                await suggest_reply(text, "Produtivo")
+                samples.append(time.perf_counter() - t0)
+            out["suggest_reply"][f"thread_{n}"] = percentiles(samples)
+
+        cases = {
+            "text_thread_10": ({"email_text": synth.thread_text(10)}, None),
+            "pdf_10p": ({}, ("doc.pdf", synth.pdf_bytes(10), "application/pdf")),
+            "eml_depth3_html_pdf": ({}, ("fwd.eml", synth.eml_bytes(depth=3, html=True, pdf_pages=2), "message/rfc822")),
+        }
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name, (data, upload) in cases.items():
+                samples = []
+                for _ in range(repeats):
+                    files = {"email_files": upload} if upload else None
+                    t0 = time.perf_counter()
+                    r = await client.post("/process", data={**data, "no_cache": "true"}, files=files)
+                    samples.append(time.perf_counter() - t0)
+                    r.raise_for_status()
+                out["process_e2e"][name] = {"parts": len(r.json()["resultados"]), **percentiles(samples)}
+    finally:
+        await close_client()
+    return out
+
+
+def run(latency: float = 0.05, repeats: int = 5) -> dict:
+    with FakeOpenAI(port=fake_port(), latency=latency) as fake:
+        use_fake_openai(fake.base_url)
+        result = bench_sync(repeats)
+        result.update(asyncio.run(bench_async(repeats)))
+    result["fake_latency_s"] = latency
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--repeats", type=int, default=5)
+    args = ap.parse_args()
+    print(json.dumps(run(args.latency, args.repeats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench/startup.py
+"""
+Custo de startup: tempo de `import app.main` num interpretador novo (e os
+módulos pesados que ficaram carregados) e tempo até o primeiro 200 em
+/health com o uvicorn subindo do zero.
+
+    python -m bench.startup --runs 5
+"""
+from __future__ import annotations
+import argparse, json, os, statistics, subprocess, sys, time
+import urllib.request
+from pathlib import Path
+
+from .fake_openai import _free_port
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("pdfplumber", "pdfminer", "bs4", "unidecode", "nltk", "openai", "httpx")
+
+_IMPORT_PROBE = (
+    "import sys, time; t0 = time.perf_counter(); import app.main; "
+    "dt = time.perf_counter() - t0; "
+    f"print(dt, ','.join(m for m in {HEAVY!r} if m in sys.modules))"
+)
+
+
+def import_time(env: dict) -> tuple[float, str]:
+    out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), (out[1] if len(out) > 1 else "")
+
+
+def first_200(env: dict, timeout: float = 30.0) -> float:
+    port = _free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("servidor não respondeu /health")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    report = {}
+    for name, extra in (("lazy", {"WARMUP": "0"}), ("warmup", {"WARMUP": "1"})):
+        env = {**os.environ, **extra}
+        imports = [import_time(env) for _ in range(args.runs)]
+        ready = [first_200(env) for _ in range(args.runs)]
+        report[name] = {
+            "import_app_main_ms": round(statistics.median(t for t, _ in imports) * 1000, 1),
+            "heavy_modules_after_import": imports[-1][1].split(",") if imports[-1][1] else [],
+            "first_200_health_ms": round(statistics.median(ready) * 1000, 1),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# bench/synth.py
+"""
+Geradores de corpora sintéticos para acompanhar a escala com o tamanho da
+entrada: threads longas (texto), PDFs grandes, .eml aninhados e HTML de
+newsletter.
+
+    python -m bench.synth --out /tmp/corpus
+"""
+from __future__ import annotations
+import argparse, io, random, zipfile
+from email.message import EmailMessage
+from pathlib import Path
+from typing import List
+
+EXAMPLES = Path(__file__).resolve().parents[1] / "data" / "examples"
+
+
+def load_examples() -> List[tuple[str, str]]:
+    """[(rótulo, texto)] a partir de data/examples (prefixo do arquivo é o rótulo)."""
+    out = []
+    for p in sorted(EXAMPLES.glob("*.txt")):
+        label = "Improdutivo" if p.name.startswith("improdutivo") else "Produtivo"
+        out.append((label, p.read_text(encoding="utf-8")))
+    return out
+
+
+def thread_text(n_messages: int) -> str:
+    """Thread de e-mail com n mensagens, cada resposta citando a anterior."""
+    samples = [t for _, t in load_examples()]
+    parts: List[str] = []
+    for i in range(n_messages):
+        parts.append(samples[i % len(samples)])
+        parts.append(
+            f"\n\nEm seg., {1 + i % 28} de jan. de 2024 às 10:{i % 60:02d}, "
+            f"Fulano <fulano{i}@exemplo.com> escreveu:\n"
+        )
+        parts.append("> " + samples[(i + 1) % len(samples)] + "\n")
+    return "".join(parts)
+
+
+def reply_thread(n_messages: int, signature: str = "Atenciosamente,\nFulano de Tal", first: str = "") -> str:
+    """
+    Thread como chega de clientes reais: a mensagem nova no topo (com
+    assinatura) e o histórico inteiro citado embaixo, alternando os formatos
+    do Gmail ("Em ... escreveu:" + "> "), do Outlook (De:/Enviado:) e o
+    "-----Original Message-----".
+    """
+    samples = [t for _, t in load_examples()]
+    parts = [first or samples[0].strip(), "\n\n", signature, "\n"]
+    for i in range(1, n_messages):
+        body = samples[i % len(samples)].strip()
+        depth = "> " * (1 + (i - 1) // 3 % 2)
+        style = i % 3
+        if style == 1:
+            parts.append(
+                f"\nEm seg., {1 + i % 28} de jan. de 2024 às 10:{i % 60:02d}, "
+                f"Fulano <fulano{i}@exemplo.com> escreveu:\n"
+            )
+            parts.append("".join(f"{depth}{line}\n" for line in (body + "\n\nAtenciosamente,\nSuporte").splitlines()))
+        elif style == 2:
+            parts.append(
+                f"\nDe: Suporte <suporte@exemplo.com>\nEnviado: terça-feira, {1 + i % 28} de janeiro de 2024 09:{i % 60:02d}\n"
+                f"Para: Fulano <fulano{i}@exemplo.com>\nAssunto: RE: Chamado {1000 + i}\n\n{body}\n"
+            )
+        else:
+            parts.append(f"\n-----Original Message-----\nFrom: cliente{i}@exemplo.com\nSent: Monday\n\n{body}\n")
+    return "".join(parts)
+
+
+def pdf_bytes(pages: int, lines_per_page: int = 50, image_pages: int = 0) -> bytes:
+    """
+    PDF mínimo (Helvetica, só texto) com `pages` páginas, sem dependências.
+    As `image_pages` primeiras são "escaneadas": só uma imagem, sem fonte.
+    """
+    samples = [t.replace("\n", " ") for _, t in load_examples()]
+    image_obj = 4 + 2 * pages
+    objs: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(pages)), pages)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for p in range(pages):
+        if p < image_pages:
+            resources = f"<< /XObject << /Im1 {image_obj} 0 R >> >>"
+            stream = b"q 595 0 0 842 0 0 cm /Im1 Do Q"
+        else:
+            resources = "<< /Font << /F1 3 0 R >> >>"
+            ops = ["BT /F1 9 Tf 36 806 Td 14 TL"]
+            for ln in range(lines_per_page):
+                line = samples[(p + ln) % len(samples)][:110]
+                line = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                ops.append(f"({line}) '")
+            ops.append("ET")
+            stream = "\n".join(ops).encode("latin-1", "replace")
+        objs.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources {resources} /Contents {5 + 2 * p} 0 R >>"
+        ).encode())
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    # imagem 8x8 em tons de cinza, compartilhada pelas páginas escaneadas
+    pixels = bytes(range(0, 256, 4))
+    objs.append(b"<< /Type /XObject /Subtype /Image /Width 8 /Height 8 /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n" % len(pixels) + pixels + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for k, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % k + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+
+def eml_bytes(depth: int = 1, html: bool = False, pdf_pages: int = 0, body_repeat: int = 1, blob_kb: int = 0) -> bytes:
+    """
+    .eml com `depth` níveis de encaminhamento (message/rfc822 aninhado),
+    corpo em texto ou HTML e, opcionalmente, um PDF anexo e uma imagem de
+    `blob_kb` KB (bytes aleatórios, não usada na extração) em cada nível.
+    """
+    samples = [t for _, t in load_examples()]
+
+    def build(level: int) -> EmailMessage:
+        msg = EmailMessage()
+        msg["From"] = f"remetente{level}@exemplo.com"
+        msg["To"] = "suporte@exemplo.com"
+        msg["Subject"] = f"Fwd: status do protocolo {1000 + level}"
+        text = "\n\n".join(samples[(level + i) % len(samples)] for i in range(body_repeat))
+        if html:
+            paragraphs = "".join(f"<p>{p}</p>" for p in text.split("\n\n"))
+            msg.set_content(
+                f"<html><head><style>p{{color:#333}}</style></head><body>{paragraphs}"
+                f"<script>var x = {level};</script></body></html>",
+                subtype="html",
+            )
+        else:
+            msg.set_content(text)
+        if pdf_pages:
+            msg.add_attachment(pdf_bytes(pdf_pages), maintype="application", subtype="pdf",
+                               filename=f"anexo_{level}.pdf")
+        if blob_kb:
+            msg.add_attachment(random.Random(level).randbytes(blob_kb * 1024), maintype="image", subtype="png",
+                               filename=f"foto_{level}.png")
+        if level < depth:
+            msg.add_attachment(build(level + 1))
+        return msg
+
+    return bytes(build(1))
+
+
+def marketing_html(blocks: int, preheader: str = "") -> str:
+    """
+    Newsletter no estilo dos e-mails de marketing: tabelas aninhadas com
+    estilo inline, CSS no <head>, comentários condicionais do Outlook,
+    entidades, imagens e rastreadores. Cada bloco tem ~2 KB de HTML para
+    ~300 caracteres de texto. `preheader` entra escondido (display:none).
+    """
+    samples = [t.strip() for _, t in load_examples()]
+    head = (
+        "<!DOCTYPE html><html lang=\"pt-BR\"><head><meta charset=\"utf-8\">"
+        "<title>Novidades da semana</title>"
+        "<style type=\"text/css\">body{margin:0}table td{border-collapse:collapse}"
+        "@media only screen and (max-width:600px){.col{width:100%!important}}</style>"
+        "<!--[if mso]><xml><o:OfficeDocumentSettings><o:PixelsPerInch>96</o:PixelsPerInch>"
+        "</o:OfficeDocumentSettings></xml><![endif]--></head><body style=\"margin:0;padding:0\">"
+    )
+    parts = [head]
+    if preheader:
+        parts.append(f'<div style="display:none;max-height:0;overflow:hidden">{preheader}&nbsp;&zwnj;</div>')
+    parts.append('<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0">')
+    for i in range(blocks):
+        text = samples[i % len(samples)].replace("\n", "<br>")
+        parts.append(
+            f'<tr><td align="center" style="padding:0 12px"><!--[if mso]><table width="600"><tr><td><![endif]-->'
+            f'<table class="col" width="600" cellpadding="0" cellspacing="0" style="max-width:600px;'
+            f'background:#ffffff;font-family:Arial,Helvetica,sans-serif;font-size:14px;line-height:20px">'
+            f'<tr><td style="padding:24px 24px 8px"><img src="https://cdn.exemplo.com/img/banner{i}.png" '
+            f'width="552" alt="" style="display:block;border:0"></td></tr>'
+            f'<tr><td style="padding:0 24px;color:#333333"><h2 style="margin:0 0 8px;font-size:18px">'
+            f'Oferta n&ordm; {i + 1} &mdash; s&oacute; esta semana</h2><p style="margin:0">{text}</p></td></tr>'
+            f'<tr><td style="padding:16px 24px"><a href="https://click.exemplo.com/?u={i}&amp;c=abc" '
+            f'style="background:#0057ff;color:#fff;padding:10px 18px;text-decoration:none;border-radius:4px">'
+            f'Saiba mais</a></td></tr></table><!--[if mso]></td></tr></table><![endif]--></td></tr>'
+        )
+    parts.append(
+        '</table><p style="font-size:11px;color:#999">Para n&atilde;o receber mais, '
+        '<a href="https://click.exemplo.com/sair">descadastre-se</a>.</p>'
+        '<img src="https://px.exemplo.com/open.gif" width="1" height="1" alt="">'
+        "<script>window.track && track('open');</script></body></html>"
+    )
+    return "".join(parts)
+
+
+def mbox_bytes(n_messages: int) -> bytes:
+    """Caixa .mbox com n mensagens simples (alternando os exemplos)."""
+    out = bytearray()
+    samples = load_examples()
+    for i in range(n_messages):
+        _, text = samples[i % len(samples)]
+        msg = EmailMessage()
+        msg["From"] = f"cliente{i}@exemplo.com"
+        msg["Subject"] = f"Mensagem {i}"
+        msg.set_content(text)
+        out += b"From cliente%d@exemplo.com Mon Jan  1 10:00:00 2024\n" % i + bytes(msg) + b"\n"
+    return bytes(out)
+
+
+def zip_bytes(n_eml: int, mbox_messages: int = 0, pdf_pages: int = 0) -> bytes:
+    """Zip com n .eml em pastas, um .mbox interno e um PDF opcionais."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(n_eml):
+            zf.writestr(f"caixa/{i // 100:03d}/{i:05d}.eml", eml_bytes(depth=1))
+        if mbox_messages:
+            zf.writestr("export/arquivo.mbox", mbox_bytes(mbox_messages))
+        if pdf_pages:
+            zf.writestr("anexos/doc.pdf", pdf_bytes(pdf_pages))
+        zf.writestr("leia-me.md", "ignorado")
+    return buf.getvalue()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="bench_corpus")
+    args = ap.parse_args()
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for n in (1, 10, 50, 200):
+        (out / f"thread_{n}.txt").write_text(thread_text(n), encoding="utf-8")
+    for pages in (1, 10, 100, 300):
+        (out / f"doc_{pages}p.pdf").write_bytes(pdf_bytes(pages))
+    for depth in (1, 3, 10):
+        (out / f"fwd_depth{depth}.eml").write_bytes(eml_bytes(depth=depth))
+        (out / f"fwd_depth{depth}_html_pdf.eml").write_bytes(eml_bytes(depth=depth, html=True, pdf_pages=5))
+    (out / "caixa_10k.mbox").write_bytes(mbox_bytes(10000))
+    (out / "caixa_500.zip").write_bytes(zip_bytes(500, mbox_messages=100, pdf_pages=5))
+    print(f"corpus em {out}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# bench/threads.py
+"""
+Threads longas (histórico citado no formato Gmail/Outlook) com e sem o
+segmentador de app/threads.py:
+
+- cpu: preprocess + _heuristic_score na parte inteira × split_thread + os
+  dois só na mensagem nova (µs por e-mail)
+- e2e: /process contra o fake com custo de prefill por token de prompt;
+  tokens de prompt enviados e latência por e-mail
+- assinatura: a assinatura da mensagem nova continua fora do texto limpo
+- paridade: mesma mensagem nova, histórico e contexto que a regex antiga
+  (cabeçalho "Em ... escreveu:" inteiro numa regex só) em threads sintéticas,
+  nos exemplos e em cabeçalhos com tamanhos em volta dos limites
+- pior caso: texto longo com "em <número>" a cada poucas palavras e sem
+  "escreveu:" (a regex antiga voltava atrás em cada um: quadrática)
+
+    python -m bench.threads --sizes 2 5 10 20 --latency 0.05 --prompt-latency 0.4
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, re, sys, time
+
+from . import synth
+from .common import percentiles, time_call
+from .fake_openai import FakeOpenAI
+
+SIGNATURE = "Fico no aguardo do retorno.\nAtenciosamente,\nMariana Souza\nGerente Financeira\nEmpresa Exemplo"
+
+
+def _cpu(sizes: list[int], repeats: int) -> dict:
+    from app.classify import _heuristic_score
+    from app.nlp import preprocess
+    from app.threads import split_thread
+
+    def legacy(text: str):
+        clean, _ = preprocess(text)
+        return _heuristic_score("", text), clean
+
+    def segmented(text: str):
+        newest = split_thread(text).newest
+        clean, _ = preprocess(newest)
+        return _heuristic_score("", newest), clean
+
+    out = {}
+    for n in sizes:
+        text = synth.reply_thread(n)
+        thread = split_thread(text)
+        out[f"thread_{n}"] = {
+            "chars": len(text),
+            "mensagem_nova_chars": len(thread.newest),
+            "historico_chars": thread.quoted_chars,
+            "split_us": time_call(lambda: split_thread(text), repeats)["mean_ms"] * 1000,
+            "antes": time_call(lambda: legacy(text), repeats),
+            "depois": time_call(lambda: segmented(text), repeats),
+        }
+    return out
+
+
+# ——— regex antiga (cópia de app/threads.py antes da busca pelo "escreveu:") ———
+_LEGACY_BOUNDARY = re.compile(
+    r"(?im)"
+    r"(?:^|(?<=\s))(?:em|on)\s[^\n]{0,120}?\d[^\n]{0,160}?(?:\n[^\n]{0,80}?)?(?:escreveu|wrote)\s*:"
+    r"|^[ \t]*>"
+    r"|-{2,}\s*(?:original message|mensagem original|forwarded message|mensagem encaminhada)\s*-{2,}"
+    r"|^[ \t]*(?:de|from):[^\n]*\n(?:[^\n]*\n)?[ \t]*(?:enviad[oa]|sent|data|date):"
+)
+
+
+def legacy_split(text: str, context_chars: int = 400):
+    from app.threads import _RE_QUOTE_PREFIX, _RE_SENDER_LINES, _RE_SIG_DELIM, Thread
+
+    def after(t, m):
+        eol = t.find("\n", m.end())
+        return _RE_SENDER_LINES.match(t, len(t) if eol < 0 else eol + 1).end()
+
+    pos = 0
+    while True:
+        m = _LEGACY_BOUNDARY.search(text, pos)
+        end = m.start() if m is not None else len(text)
+        if m is None or text[pos:end].strip():
+            break
+        pos = after(text, m)
+    newest = text[pos:end]
+    sig = _RE_SIG_DELIM.search(newest)
+    if sig is not None and newest[:sig.start()].strip():
+        newest = newest[:sig.start()]
+    newest = newest.strip()
+    if not newest:
+        return Thread(text, "", 0)
+    rest = text[end:]
+    window = rest[: context_chars * 2]
+    m = _LEGACY_BOUNDARY.match(window)
+    if m is not None:
+        window = window[after(window, m):]
+    context = " ".join(_RE_QUOTE_PREFIX.sub("", window).split())[:context_chars]
+    return Thread(newest, context, len(rest))
+
+
+def _header_cases(n: int, seed: int = 5) -> dict:
+    rnd = random.Random(seed)
+    fixed = {
+        "gmail_pt": "Pode confirmar?\n\nEm seg., 1 de jan. de 2024 às 10:00, Fulano <f@x.com> escreveu:\n> antes",
+        "gmail_en": "Any news?\n\nOn Mon, Jan 1, 2024 at 10:00 AM Fulano <f@x.com> wrote:\n> before",
+        "quebrado": "Ok.\n\nEm ter., 2 de jan. de 2024 às 09:15, Fulano de Tal <fulano.de.tal@exemplo.com.br>\nescreveu:\n> x",
+        "data_numerica": "Segue.\nEm 12/03/2024 10:00, Maria escreveu:\nmensagem anterior",
+        "sem_cabecalho": "O cliente escreveu: preciso do boleto. Em 2024 o pedido 12 saiu.",
+        "em_sem_escreveu": "Em 2024 o pedido 123 foi faturado em 3 parcelas, on 5 de maio.",
+        "topo_encaminhado": "Em 1 de jan. de 2024, Fulano escreveu:\n\nTexto encaminhado aqui.",
+        "em_no_fim_da_linha": "Olá\nvamos ver em\n12 de jan, Fulano escreveu:\n> x",
+    }
+    out = dict(fixed)
+    for i in range(n):
+        date = rnd.randint(100, 140)          # em volta de 120 até o dígito
+        tail = rnd.randint(140, 180)          # em volta de 160 até o fim da linha
+        wrap = rnd.choice([None, rnd.randint(60, 100)])
+        head = "Em " + "x" * date + "7" + "y" * tail
+        marker = "escreveu:" if wrap is None else "\n" + "z" * wrap + " escreveu:"
+        pre = rnd.choice(["", "ok ", "Obrigado.\n", "on 3 "])
+        out[f"limite_{i}"] = f"Mensagem nova {i}.\n{pre}{head}{marker}\n> antigo {i}\n"
+    return out
+
+
+def _parity(cases: int) -> dict:
+    from app.threads import split_thread
+
+    texts = {f"sintetica_{n}": synth.reply_thread(n) for n in range(1, 21)}
+    texts.update({f"exemplo_{i:02d}": t for i, (_, t) in enumerate(synth.load_examples())})
+    texts.update(_header_cases(cases))
+    diffs = {k: {"antes": legacy_split(t).newest[:80], "depois": split_thread(t).newest[:80]}
+             for k, t in texts.items() if legacy_split(t) != split_thread(t)}
+    return {"textos": len(texts), "iguais": len(texts) - len(diffs), "diferencas": diffs}
+
+
+def _worst_case(kb: list[int], legacy_max_kb: int) -> dict:
+    from app.threads import split_thread
+
+    filler = "em 2024 o pedido 123 foi faturado on 5 itens e em 3 parcelas. "
+    out = {}
+    for size in kb:
+        text = "Olá, segue o extrato.\n" + filler * (size * 1024 // len(filler))
+        row = {"depois_s": round(time_call(lambda: split_thread(text), 1, 0)["mean_ms"] / 1000, 4)}
+        if size <= legacy_max_kb:
+            row["antes_s"] = round(time_call(lambda: legacy_split(text), 1, 0)["mean_ms"] / 1000, 3)
+        out[f"{size}_kb"] = row
+    return out
+
+
+def _signature() -> dict:
+    from app.nlp import preprocess
+    from app.threads import split_thread
+
+    first = synth.load_examples()[-1][1].strip() + " Podem confirmar o prazo?"
+    text = synth.reply_thread(6, signature=SIGNATURE, first=first)
+    return {
+        "sem_segmentar_assinatura_no_texto": "mariana" in preprocess(text)[0],
+        "segmentado_assinatura_no_texto": "mariana" in preprocess(split_thread(text).newest)[0],
+    }
+
+
+async def _e2e(fake: FakeOpenAI, sizes: list[int], repeats: int) -> dict:
+    import httpx
+    from app import main
+    from app.llm import close_client
+
+    out = {}
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for n in sizes:
+                text = synth.reply_thread(n)
+                row = {}
+                for label, enabled in (("antes", False), ("depois", True)):
+                    main.THREAD_STRIP_ENABLED = enabled
+                    calls, tokens, samples = fake.cfg.calls, fake.cfg.prompt_tokens, []
+                    for _ in range(repeats):
+                        t0 = time.perf_counter()
+                        r = await client.post("/process", data={"email_text": text, "no_cache": "true"})
+                        samples.append(time.perf_counter() - t0)
+                        r.raise_for_status()
+                    row[label] = {
+                        "prompt_tokens_por_email": (fake.cfg.prompt_tokens - tokens) // repeats,
+                        "llm_calls": fake.cfg.calls - calls,
+                        "categoria": r.json()["resultados"][0]["categoria"],
+                        **percentiles(samples),
+                    }
+                row["reducao_tokens"] = round(
+                    1 - row["depois"]["prompt_tokens_por_email"] / max(1, row["antes"]["prompt_tokens_por_email"]), 3)
+                out[f"thread_{n}"] = row
+    finally:
+        await close_client()
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 10, 20])
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--prompt-latency", type=float, default=0.4, help="segundos por 1k tokens de prompt no fake")
+    ap.add_argument("--cases", type=int, default=500, help="cabeçalhos aleatórios em volta dos limites")
+    ap.add_argument("--worst-kb", type=int, nargs="+", default=[200, 800])
+    ap.add_argument("--legacy-max-kb", type=int, default=200, help="maior texto medido com a regex antiga")
+    args = ap.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    os.environ.setdefault("REPLY_INDEX_ENABLED", "0")
+    os.environ.setdefault("DEDUP_ENABLED", "0")
+    report = {"cpu": _cpu(args.sizes, args.repeats * 4), "assinatura": _signature(), "paridade": _parity(args.cases),
+              "pior_caso": _worst_case(args.worst_kb, args.legacy_max_kb)}
+    with FakeOpenAI(latency=args.latency, prompt_latency=args.prompt_latency) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        report["e2e"] = asyncio.run(_e2e(fake, args.sizes, args.repeats))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if not report["assinatura"]["segmentado_assinatura_no_texto"] and not report["paridade"]["diferencas"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# bench/uploads.py
+"""
+Limite do corpo na recepção (_LimitBody): uploads multipart enviados em
+chunked (sem Content-Length) para /process, /process/stream e /jobs, contra
+um uvicorn de verdade. Para cada envio: status e quantos MB do corpo o app
+chegou a ler (antes, o Starlette lia e gravava o corpo inteiro no spool e só
+então os limites eram checados).
+
+    python -m bench.uploads --limit-mb 2 --sizes 1 10 40
+"""
+from __future__ import annotations
+import argparse, json, os, sys, time
+
+BOUNDARY = b"----b0undary"
+
+
+def _body(mb: int):
+    yield (b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="email_files"; filename="a.txt"\r\n'
+           b"Content-Type: text/plain\r\n\r\n")
+    line = b"status do chamado " * 3641 + b"\n"        # ~64 KB
+    for _ in range(mb * 16):
+        yield line
+    yield b"\r\n--" + BOUNDARY + b"--\r\n"
+
+
+def _counting(inner, seen: dict):
+    async def app(scope, receive, send):
+        async def counted():
+            message = await receive()
+            seen["bytes"] += len(message.get("body", b""))
+            return message
+        await inner(scope, counted, send)
+    return app
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--limit-mb", type=int, default=2, help="MAX_REQUEST_BYTES e JOBS_MAX_REQUEST_BYTES")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 40], help="MB enviados")
+    args = ap.parse_args()
+
+    limit = args.limit_mb * 2**20
+    os.environ.update(MAX_REQUEST_BYTES=str(limit), JOBS_MAX_REQUEST_BYTES=str(limit), MAX_FORM_OVERHEAD=str(2**20),
+                      OPENAI_API_KEY="", CACHE_ENABLED="0")
+    import httpx
+    from app.main import app
+    from .reply_stream import _Server
+
+    seen = {"bytes": 0}
+    headers = {"content-type": "multipart/form-data; boundary=" + BOUNDARY.decode()}
+    rows = []
+    with _Server(_counting(app, seen)) as server, httpx.Client(base_url=server.base_url, timeout=60) as client:
+        for path in ("/process", "/process/stream", "/jobs"):
+            for mb in args.sizes:
+                seen["bytes"] = 0
+                t0 = time.perf_counter()
+                try:
+                    status = client.post(path, content=_body(mb), headers=headers).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                rows.append({"rota": path, "enviado_mb": mb, "status": status,
+                             "lido_pelo_app_mb": round(seen["bytes"] / 2**20, 1), "s": round(time.perf_counter() - t0, 2)})
+    print(json.dumps({"limite_mb": args.limit_mb, "folga_multipart_mb": 1, "envios": rows}, indent=2, ensure_ascii=False))
+    over = [r for r in rows if r["enviado_mb"] > args.limit_mb + 1]
+    ok = all(r["status"] == 413 and r["lido_pelo_app_mb"] <= args.limit_mb + 2 for r in over)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())